@@ -0,0 +1,61 @@
+from typing import Dict, List, Mapping, Tuple
+from django.db import models
+from django.db.models import Avg, Count, Max, Min, Sum
+from rest_framework.exceptions import ValidationError
+
+from apps.schema_manager.models import FieldType
+from .filters import get_field_types
+
+GROUP_BY_PARAM = "group_by"
+COUNT_ALL = "*"
+AGGREGATE_SEPARATOR = "__"
+
+AGGREGATES: Dict[str, Tuple[type, Tuple[FieldType, ...]]] = {
+    "count": (Count, (FieldType.number, FieldType.string, FieldType.boolean)),
+    "sum": (Sum, (FieldType.number,)),
+    "avg": (Avg, (FieldType.number,)),
+    "min": (Min, (FieldType.number, FieldType.string)),
+    "max": (Max, (FieldType.number, FieldType.string)),
+}
+
+
+def get_row_aggregates(params: Mapping, model: models.Model) -> Tuple[List[str], Dict[str, models.Aggregate]]:
+    """
+    Compiles ``?group_by=f1&sum=f2,f3&count=*`` into the grouping columns and the aggregates to annotate.
+    ``count=*`` counts rows and is named ``count``, the other aggregates are named ``<function>__<field>``.
+    """
+    field_types = get_field_types(model)
+    errors: Dict[str, List[str]] = {}
+    group_by = split_param(params.get(GROUP_BY_PARAM))
+    unknown = [f for f in group_by if f not in field_types]
+    if unknown:
+        errors[GROUP_BY_PARAM] = [f"Unknown field '{f}'." for f in unknown]
+
+    annotations: Dict[str, models.Aggregate] = {}
+    for function, (aggregate_class, allowed_types) in AGGREGATES.items():
+        for field_name in split_param(params.get(function)):
+            if function == "count" and field_name == COUNT_ALL:
+                annotations["count"] = Count("*")
+            elif field_name not in field_types:
+                errors.setdefault(function, []).append(f"Unknown field '{field_name}'.")
+            elif field_types[field_name] not in allowed_types:
+                message = f"'{function}' is not supported for {field_types[field_name].value} fields."
+                errors.setdefault(function, []).append(message)
+            elif aggregate_class is Avg:
+                # The average of integers is a numeric, i.e. a Decimal, which would be rendered as a string.
+                annotations[f"{function}{AGGREGATE_SEPARATOR}{field_name}"] = Avg(
+                    field_name, output_field=models.FloatField()
+                )
+            else:
+                annotations[f"{function}{AGGREGATE_SEPARATOR}{field_name}"] = aggregate_class(field_name)
+    if errors:
+        raise ValidationError(errors)
+    if not group_by and not annotations:
+        raise ValidationError(f"Expected '{GROUP_BY_PARAM}' or one of {', '.join(AGGREGATES)}.")
+    return group_by, annotations
+
+
+def split_param(value) -> List[str]:
+    if not value:
+        return []
+    return list(dict.fromkeys(v.strip() for v in value.split(",") if v.strip()))
@@ -0,0 +1,114 @@
+"""
+Async versions of the row create and list endpoints, for ASGI deployments (``uvicorn datalex.asgi:application``).
+DRF views are sync only, so these are plain Django views returning the same payloads and error shapes.
+"""
+import json
+
+from typing import Tuple
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DataError, IntegrityError, models, transaction
+from django.http import JsonResponse
+from django.views import View
+from rest_framework.exceptions import APIException, ParseError, ValidationError
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import replace_query_param
+
+from apps.schema_manager.partitions import ensure_partitions_ahead
+from datalex.instrumentation import timed
+from .cache import rows_changed
+from .filters import ORDERING_PARAM, get_row_filter_lookups, get_row_ordering, get_row_projection, search_rows
+from .upserts import ConflictAction, get_conflict_action, upsert_row
+from .validators import row_validator_cache
+from .views import find_table_or_404
+
+PAGE_SIZE_QUERY_PARAM = "limit"
+AFTER_QUERY_PARAM = "after"
+
+
+class AsyncRowView(View):
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        view.csrf_exempt = True  # type: ignore[attr-defined]
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        except APIException as exc:
+            data = exc.detail if isinstance(exc.detail, (list, dict)) else {"detail": exc.detail}
+            return api_response(data, status=exc.status_code)
+
+
+class AsyncRowCreateView(AsyncRowView):
+    async def post(self, request, table_id: int):
+        model = await sync_to_async(find_table_or_404)(table_id)
+        try:
+            data = json.loads(request.body)
+        except ValueError as exc:
+            raise ParseError(f"JSON parse error - {exc}")
+
+        action = get_conflict_action(request.GET, model)
+        with timed("validation"):
+            row = row_validator_cache.get(table_id, model).validate(data)
+        if action is not None:
+            try:
+                data, created = await sync_to_async(upsert)(table_id, model, row, action)
+            except (IntegrityError, DataError) as exc:
+                raise ValidationError(str(exc))
+            return api_response(data, status=201 if created else 200)
+        try:
+            instance = await model.objects.acreate(**row)
+        except (IntegrityError, DataError) as exc:
+            raise ValidationError(str(exc))
+        await sync_to_async(rows_changed)(table_id)
+        await sync_to_async(ensure_partitions_ahead)(table_id, model, [instance])
+        return api_response({"id": instance.pk, **row}, status=201)
+
+
+def upsert(table_id: int, model: models.Model, row: dict, action: ConflictAction) -> Tuple[dict, bool]:
+    with transaction.atomic():
+        data, created = upsert_row(model, row, action)
+        rows_changed(table_id)
+        ensure_partitions_ahead(table_id, model, [model(**data)])
+    return data, created
+
+
+class AsyncRowListView(AsyncRowView):
+    """Keyset listing only: ``?after=<id>&limit=<n>`` plus the usual filters and projection."""
+
+    async def get(self, request, table_id: int):
+        model = await sync_to_async(find_table_or_404)(table_id)
+        params = request.GET
+        lookups = get_row_filter_lookups(params, model)
+        if get_row_ordering(params, model) != ("id",):
+            raise ValidationError({ORDERING_PARAM: "Async listing only supports ordering by 'id'."})
+        columns = get_row_projection(params, model) or [f.name for f in model._meta.concrete_fields]
+        after = get_int_query_param(params, AFTER_QUERY_PARAM, 0)
+        limit = get_int_query_param(params, PAGE_SIZE_QUERY_PARAM, settings.DATALEX_CURSOR_PAGE_SIZE)
+        if not 0 < limit <= settings.DATALEX_CURSOR_MAX_PAGE_SIZE:
+            raise ValidationError(
+                {PAGE_SIZE_QUERY_PARAM: f"Must be between 1 and {settings.DATALEX_CURSOR_MAX_PAGE_SIZE}."}
+            )
+
+        # The id is always fetched, the next page starts after the last one.
+        queryset = search_rows(model.objects.filter(id__gt=after, **lookups), params).order_by("id")
+        rows = [row async for row in queryset.values(*dict.fromkeys(["id", *columns]))[:limit]]
+        next_link = None
+        if len(rows) == limit:
+            next_link = replace_query_param(request.build_absolute_uri(), AFTER_QUERY_PARAM, rows[-1]["id"])
+        if "id" not in columns:
+            rows = [{c: row[c] for c in columns} for row in rows]
+        return api_response({"next": next_link, "results": rows})
+
+
+def api_response(data, status: int = 200) -> JsonResponse:
+    return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False)
+
+
+def get_int_query_param(params, name: str, default: int) -> int:
+    try:
+        return int(params.get(name, default))
+    except ValueError:
+        raise ValidationError({name: "A valid integer is required."})
@@ -0,0 +1,70 @@
+"""
+Optional read-through cache of row listings, enabled by pointing ``DATALEX_ROW_LIST_CACHE`` at one of ``CACHES``.
+Entries are keyed by table id, schema version, a per-table generation counter and the request, so they never have
+to be deleted: a write bumps the generation after commit and the old entries simply stop being read. The key digest
+doubles as the ETag of the listing.
+"""
+import hashlib
+import time
+
+from typing import Optional, Tuple
+from django.conf import settings
+from django.core.cache import BaseCache, caches
+from django.db import transaction
+from django.dispatch import receiver
+
+from apps.schema_manager.repositores import dynamic_table_repo_factory
+from apps.schema_manager.signals import dynamic_table_rows_changed
+
+ROWS_GENERATION_CACHE_KEY = "datalex:rows_generation:{table_id}"
+ROW_LIST_CACHE_KEY = "datalex:row_list:{table_id}:{digest}"
+
+
+def get_row_list_cache() -> Optional[BaseCache]:
+    if not settings.DATALEX_ROW_LIST_CACHE:
+        return None
+    return caches[settings.DATALEX_ROW_LIST_CACHE]
+
+
+def get_rows_generation(cache: BaseCache, table_id: int) -> int:
+    key = ROWS_GENERATION_CACHE_KEY.format(table_id=table_id)
+    generation = cache.get(key)
+    if generation is None:
+        # Never restart from a small number, entries of an evicted counter could otherwise be served again.
+        cache.add(key, time.time_ns(), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_rows_generation(table_id: int):
+    cache = get_row_list_cache()
+    if cache is None:
+        return
+    key = ROWS_GENERATION_CACHE_KEY.format(table_id=table_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+
+
+def rows_changed(table_id: int):
+    """To be called by every write to the rows of a table."""
+    transaction.on_commit(lambda: bump_rows_generation(table_id))
+
+
+def get_row_list_cache_key(request, table_id: int) -> Optional[Tuple[str, str]]:
+    """Returns the cache key and the ETag of a listing, or None when the cache is disabled."""
+    cache = get_row_list_cache()
+    if cache is None:
+        return None
+    version = dynamic_table_repo_factory().versions.get(table_id)
+    generation = get_rows_generation(cache, table_id)
+    request_key = (request.get_host(), request.accepted_renderer.format, sorted(request.query_params.lists()))
+    digest = hashlib.sha1(repr((table_id, version, generation, request_key)).encode()).hexdigest()
+    return ROW_LIST_CACHE_KEY.format(table_id=table_id, digest=digest), f'"{digest}"'
+
+
+# Not on dynamic_table_changed, which a model rebuilt after an eviction sends too: the schema version is in the key.
+@receiver(dynamic_table_rows_changed)
+def invalidate_row_lists(sender, table_id: int, **kwargs):
+    rows_changed(table_id)
@@ -0,0 +1,132 @@
+from typing import Dict, List, Mapping, Optional, Tuple
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import models
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from apps.schema_manager.models import RESERVED_NAME_PREFIX, FieldType
+from apps.schema_manager.repositores import get_field_type_for_model_field, get_search_vector
+
+LOOKUP_SEPARATOR = "__"
+ORDERING_PARAM = "order_by"
+PROJECTION_PARAM = "fields"
+# Confirms that an update or delete without filters is meant to change every row.
+ALL_ROWS_PARAM = "all"
+SEARCH_PARAM = "q"
+SEARCH_ANNOTATION = f"{RESERVED_NAME_PREFIX}search"
+RANK_ANNOTATION = f"{RESERVED_NAME_PREFIX}rank"
+# Query parameters owned by pagination, rendering, aggregation etc. which must never be taken for a row filter.
+RESERVED_QUERY_PARAMS = {"limit", "offset", "cursor", "after", "count", "format", ORDERING_PARAM, PROJECTION_PARAM}
+RESERVED_QUERY_PARAMS |= {"group_by", "sum", "avg", "min", "max", ALL_ROWS_PARAM, SEARCH_PARAM}
+
+ALLOWED_LOOKUPS: Dict[FieldType, Tuple[str, ...]] = {
+    FieldType.number: ("exact", "gt", "gte", "lt", "lte", "in"),
+    FieldType.string: ("exact", "startswith", "contains", "in"),
+    FieldType.boolean: ("exact",),
+}
+VALUE_FIELDS = {
+    FieldType.number: serializers.IntegerField(),
+    FieldType.string: serializers.CharField(trim_whitespace=False),
+    FieldType.boolean: serializers.BooleanField(),
+}
+
+
+class RowFilterBackend(BaseFilterBackend):
+    """
+    Compiles typed query parameters into a single filtered, ordered and projected query on the dynamic model:
+    ``?fnumber__gte=10&fstring__startswith=abc&fbool=true&order_by=-fnumber&fields=id,fstring``.
+    ``q=<text>`` keeps the full-text search matches, best ranked first unless ``order_by`` is given.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        queryset = queryset.filter(**get_row_filter_lookups(request.query_params, queryset.model))
+        queryset = search_rows(queryset, request.query_params)
+        projection = get_row_projection(request.query_params, queryset.model)
+        if projection is not None:
+            queryset = queryset.only(*projection)
+        return queryset.order_by(*self.get_ordering(request, queryset, view))
+
+    def get_ordering(self, request, queryset, view) -> Tuple[str, ...]:
+        params = request.query_params
+        if params.get(SEARCH_PARAM) and not params.get(ORDERING_PARAM):
+            return (f"-{RANK_ANNOTATION}", "id")
+        return get_row_ordering(params, queryset.model)
+
+
+def search_rows(queryset: models.QuerySet, params: Mapping) -> models.QuerySet:
+    """Keeps the rows matching ``q`` (web search syntax: ``"quoted phrase" or -excluded``), annotated with their rank."""
+    text = params.get(SEARCH_PARAM)
+    if not text:
+        return queryset
+    vector = get_search_vector(queryset.model)
+    if vector is None:
+        raise ValidationError({SEARCH_PARAM: "The table has no full-text searchable fields."})
+    query = SearchQuery(text, config=settings.DATALEX_SEARCH_CONFIG, search_type="websearch")
+    queryset = queryset.alias(**{SEARCH_ANNOTATION: vector, RANK_ANNOTATION: SearchRank(vector, query)})
+    return queryset.filter(**{SEARCH_ANNOTATION: query})
+
+
+def get_field_types(model: models.Model) -> Dict[str, FieldType]:
+    return {f.name: get_field_type_for_model_field(f) for f in model._meta.concrete_fields}
+
+
+def get_row_filter_lookups(params: Mapping, model: models.Model) -> Dict[str, object]:
+    field_types = get_field_types(model)
+    lookups, errors = {}, {}
+    for param, value in params.items():
+        if param in RESERVED_QUERY_PARAMS:
+            continue
+        field_name, _, lookup = param.partition(LOOKUP_SEPARATOR)
+        lookup = lookup or "exact"
+        if field_name not in field_types:
+            errors[param] = [f"Unknown field '{field_name}'."]
+            continue
+        field_type = field_types[field_name]
+        if lookup not in ALLOWED_LOOKUPS[field_type]:
+            errors[param] = [f"Lookup '{lookup}' is not supported for {field_type.value} fields."]
+            continue
+        try:
+            lookups[f"{field_name}{LOOKUP_SEPARATOR}{lookup}"] = parse_lookup_value(field_type, lookup, value)
+        except serializers.ValidationError as exc:
+            errors[param] = exc.detail
+    if errors:
+        raise ValidationError(errors)
+    return lookups
+
+
+def parse_lookup_value(field_type: FieldType, lookup: str, value):
+    value_field = VALUE_FIELDS[field_type]
+    if lookup == "in":
+        values = value.split(",") if isinstance(value, str) else value
+        if not isinstance(values, list):
+            raise serializers.ValidationError("Expected a comma separated string or a list of values.")
+        return [value_field.to_internal_value(v) for v in values]
+    return value_field.to_internal_value(value)
+
+
+def get_row_ordering(params: Mapping, model: models.Model) -> Tuple[str, ...]:
+    ordering_param = params.get(ORDERING_PARAM)
+    if not ordering_param:
+        return ("id",)
+    field_names = {f.name for f in model._meta.concrete_fields}
+    ordering = [o.strip() for o in ordering_param.split(",") if o.strip()]
+    unknown = [o for o in ordering if o.lstrip("-") not in field_names]
+    if unknown:
+        raise ValidationError({ORDERING_PARAM: [f"Unknown field '{o.lstrip('-')}'." for o in unknown]})
+    if not {"id", "-id"} & set(ordering):
+        ordering.append("id")
+    return tuple(ordering)
+
+
+def get_row_projection(params: Mapping, model: models.Model) -> Optional[List[str]]:
+    projection_param = params.get(PROJECTION_PARAM)
+    if not projection_param:
+        return None
+    field_names = [f.name for f in model._meta.concrete_fields]
+    projection = [f.strip() for f in projection_param.split(",") if f.strip()]
+    unknown = [f for f in projection if f not in field_names]
+    if unknown:
+        raise ValidationError({PROJECTION_PARAM: [f"Unknown field '{f}'." for f in unknown]})
+    return [f for f in field_names if f in projection]
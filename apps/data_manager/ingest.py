@@ -0,0 +1,209 @@
+"""
+Write-behind ingestion of single rows. A row sent with ``Prefer: respond-async`` is validated, queued in process and
+acknowledged with an ingest id, then a flusher thread inserts the queued rows of a table in batches of up to
+``DATALEX_INGEST_BATCH_SIZE`` rows, at the latest ``DATALEX_INGEST_FLUSH_INTERVAL`` seconds after they were queued.
+Queues are flushed on interpreter shutdown, but rows still queued when a worker is killed are lost.
+
+Ingest ids are ``<worker>.<sequence>``. Every worker queues the rows of a table in sequence order and flushes them in
+the same order, so the status of a row only takes the highest sequence committed for the table by its worker, plus
+the errors of the rows which could not be inserted, both kept in ``DATALEX_INGEST_CACHE``.
+"""
+import atexit
+import logging
+import threading
+import time
+import uuid
+
+from collections import deque
+from enum import Enum
+from typing import Deque, Dict, List, Optional, Tuple
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DatabaseError, connection, transaction
+
+from apps.schema_manager.partitions import ensure_partitions_ahead
+from apps.schema_manager.repositores import dynamic_table_repo_factory
+from datalex.instrumentation import metrics
+from .cache import rows_changed
+
+logger = logging.getLogger(__name__)
+
+WORKER_ID = uuid.uuid4().hex[:12]
+COMMITTED_CACHE_KEY = "datalex:ingest_committed:{table_id}:{worker}"
+FAILED_CACHE_KEY = "datalex:ingest_failed:{table_id}:{ingest_id}"
+RESPOND_ASYNC = "respond-async"
+# Seconds shutdown waits for the flusher to finish the batch it is writing.
+SHUTDOWN_TIMEOUT = 10
+
+QueuedRow = Tuple[int, float, dict]  # sequence, queued at, row
+
+
+class IngestStatus(str, Enum):
+    pending = "pending"
+    committed = "committed"
+    failed = "failed"
+
+
+class IngestQueueFull(Exception):
+    pass
+
+
+class IngestBuffer:
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.queues: Dict[int, Deque[QueuedRow]] = {}
+        self.sequence = 0
+        self.flusher: Optional[threading.Thread] = None
+        self.stopping = False
+        # Batches of a table must commit in sequence order for the committed watermark to hold.
+        self.flush_lock = threading.Lock()
+
+    def put(self, table_id: int, row: dict) -> str:
+        with self.condition:
+            queue = self.queues.setdefault(table_id, deque())
+            if len(queue) >= settings.DATALEX_INGEST_QUEUE_SIZE:
+                raise IngestQueueFull()
+            self.sequence += 1
+            queue.append((self.sequence, time.monotonic(), row))
+            if settings.DATALEX_INGEST_IN_BACKGROUND:
+                self.start_flusher()
+                if len(queue) in (1, settings.DATALEX_INGEST_BATCH_SIZE):
+                    self.condition.notify()
+            return f"{WORKER_ID}.{self.sequence}"
+
+    def start_flusher(self):
+        if self.flusher is None:
+            self.flusher = threading.Thread(target=self.run_flusher, name="datalex-ingest", daemon=True)
+            self.flusher.start()
+            atexit.register(self.shutdown)
+
+    def run_flusher(self):
+        try:
+            while True:
+                with self.condition:
+                    while not self.stopping and not (due := self.get_due_tables()):
+                        self.condition.wait(timeout=self.get_wait_time())
+                    if self.stopping:
+                        return
+                for table_id in due:
+                    try:
+                        self.flush(table_id)
+                    except Exception:
+                        # The thread has to outlive any failure, or the queues would only ever fill up.
+                        logger.exception("Flushing the rows queued for table %s failed.", table_id)
+                connection.close_if_unusable_or_obsolete()
+        finally:
+            connection.close()
+
+    def get_due_tables(self) -> List[int]:
+        deadline = time.monotonic() - settings.DATALEX_INGEST_FLUSH_INTERVAL
+        return [
+            table_id
+            for table_id, queue in self.queues.items()
+            if queue and (len(queue) >= settings.DATALEX_INGEST_BATCH_SIZE or queue[0][1] <= deadline)
+        ]
+
+    def get_wait_time(self) -> Optional[float]:
+        oldest = [queue[0][1] for queue in self.queues.values() if queue]
+        if not oldest:
+            return None
+        return max(min(oldest) + settings.DATALEX_INGEST_FLUSH_INTERVAL - time.monotonic(), 0)
+
+    def flush(self, table_id: int) -> int:
+        with self.flush_lock:
+            with self.condition:
+                queue = self.queues.get(table_id) or deque()
+                batch = [queue.popleft() for _ in range(min(len(queue), settings.DATALEX_INGEST_BATCH_SIZE))]
+            if batch:
+                write_batch(table_id, batch)
+            return len(batch)
+
+    def flush_all(self):
+        for table_id in list(self.queues):
+            while self.flush(table_id):
+                pass
+
+    def shutdown(self):
+        with self.condition:
+            self.stopping = True
+            self.condition.notify()
+        if self.flusher is not None:
+            self.flusher.join(timeout=SHUTDOWN_TIMEOUT)
+            if self.flusher.is_alive():
+                logger.warning("The ingest flusher is stuck, the rows still queued are lost.")
+                return
+        self.flush_all()
+
+
+def prefers_async(request) -> bool:
+    """Whether the request asks to be acknowledged before it is committed, i.e. ``Prefer: respond-async``."""
+    preferences = request.headers.get("Prefer", "")
+    return any(p.split(";")[0].strip().lower() == RESPOND_ASYNC for p in preferences.split(","))
+
+
+def write_batch(table_id: int, batch: List[QueuedRow]):
+    failed: Dict[int, str] = {}
+    try:
+        model = dynamic_table_repo_factory().get_by_id(table_id)
+    except KeyError:
+        model, failed = None, {sequence: "The table does not exist anymore." for sequence, _, _ in batch}
+    if model is not None:
+        instances = []
+        for sequence, _, row in batch:
+            try:
+                instances.append((sequence, model(**row)))
+            except (TypeError, ValueError) as exc:
+                # E.g. a column of the row was dropped since it was queued.
+                failed[sequence] = str(exc)
+        try:
+            with transaction.atomic():
+                model.objects.bulk_create([instance for _, instance in instances])
+                rows_changed(table_id)
+                ensure_partitions_ahead(table_id, model, [instance for _, instance in instances])
+        except DatabaseError:
+            # A single bad row fails the whole batch: insert the rows one by one to tell which.
+            for sequence, instance in instances:
+                try:
+                    with transaction.atomic():
+                        instance.save(force_insert=True)
+                        rows_changed(table_id)
+                        ensure_partitions_ahead(table_id, model, [instance])
+                except DatabaseError as exc:
+                    failed[sequence] = str(exc)
+
+    cache = caches[settings.DATALEX_INGEST_CACHE]
+    timeout = settings.DATALEX_INGEST_STATUS_TIMEOUT
+    if failed:
+        cache.set_many(
+            {
+                FAILED_CACHE_KEY.format(table_id=table_id, ingest_id=f"{WORKER_ID}.{sequence}"): error
+                for sequence, error in failed.items()
+            },
+            timeout=timeout,
+        )
+    cache.set(COMMITTED_CACHE_KEY.format(table_id=table_id, worker=WORKER_ID), batch[-1][0], timeout=timeout)
+
+
+def get_ingest_status(table_id: int, ingest_id: str) -> Optional[dict]:
+    """None for a malformed ingest id. Ids of rows lost by a killed worker, or expired, stay pending."""
+    worker, _, sequence = ingest_id.partition(".")
+    if not worker or not sequence.isdigit():
+        return None
+    cache = caches[settings.DATALEX_INGEST_CACHE]
+    error = cache.get(FAILED_CACHE_KEY.format(table_id=table_id, ingest_id=ingest_id))
+    if error is not None:
+        return {"ingest_id": ingest_id, "status": IngestStatus.failed.value, "error": error}
+    committed = cache.get(COMMITTED_CACHE_KEY.format(table_id=table_id, worker=worker))
+    if committed is not None and int(sequence) <= committed:
+        return {"ingest_id": ingest_id, "status": IngestStatus.committed.value}
+    return {"ingest_id": ingest_id, "status": IngestStatus.pending.value}
+
+
+ingest_buffer = IngestBuffer()
+
+
+@metrics.register_collector
+def collect_ingest_metrics():
+    for table_id, queue in list(ingest_buffer.queues.items()):
+        labels = (("table_id", str(table_id)),)
+        yield "datalex_ingest_queued_rows", "gauge", "Rows waiting to be flushed.", labels, len(queue)
@@ -0,0 +1,251 @@
+import json
+import platform
+import statistics
+import time
+
+from typing import Callable, Dict, List, Optional
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from rest_framework.test import APIRequestFactory
+
+from apps.data_manager.renderers import ColumnarJSONRenderer
+from apps.data_manager.serializers import model_serializer_class_factory
+from apps.data_manager.validators import RowValidator
+from apps.data_manager.views import RowBulkCreateView, RowCreateView, RowListView
+from apps.schema_manager.models import DynamicTable
+from apps.schema_manager.views import DynamicTableBulkCreateView, DynamicTableCreateView
+from apps.schema_manager.repositores import (
+    DynamicTableRepository,
+    compare_existing_table_to_new_schema,
+    dynamic_table_repo_factory,
+    get_dynamic_table_model,
+)
+from datalex.compression import compress, get_available_encodings
+
+FIELD_TYPES = ("number", "string", "boolean")
+
+
+def get_bench_fields(count: int) -> List[dict]:
+    return [{"name": f"f{i}", "field_type": FIELD_TYPES[i % len(FIELD_TYPES)]} for i in range(count)]
+
+
+def get_bench_row(fields: List[dict], i: int) -> dict:
+    values = {"number": i, "string": f"value {i}", "boolean": i % 2 == 0}
+    return {f["name"]: values[f["field_type"]] for f in fields}
+
+
+def measure(func: Callable[[], object], repeat: int, number: int = 1) -> dict:
+    """Runs ``func`` ``number`` times per sample, reports per call timings in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - started_at) / number * 1000)
+    return {
+        "median_ms": round(statistics.median(samples), 4),
+        "min_ms": round(min(samples), 4),
+        "mean_ms": round(statistics.mean(samples), 4),
+        "repeat": repeat,
+        "number": number,
+    }
+
+
+def compare_to_baseline(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> Dict[str, dict]:
+    comparison = {}
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result["median_ms"] / baseline[name]["median_ms"] if baseline[name]["median_ms"] else 1.0
+        comparison[name] = {
+            "baseline_median_ms": baseline[name]["median_ms"],
+            "median_ms": result["median_ms"],
+            "ratio": round(ratio, 3),
+            "regressed": ratio > 1 + threshold,
+        }
+    return comparison
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks the schema and row hot paths and prints the results as JSON. Everything is created inside a "
+        "transaction which is rolled back afterwards. With --baseline, the medians are compared to a previous run "
+        "and the command fails when one of them got slower by more than --threshold."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=5, help="Samples per benchmark.")
+        parser.add_argument("--fields", type=int, default=20, help="Fields per benchmark table.")
+        parser.add_argument("--tables", nargs="+", type=int, default=[100, 1000], help="init_repo table counts.")
+        parser.add_argument("--rows", type=int, default=100000, help="Rows of the pagination table.")
+        parser.add_argument("--depths", nargs="+", type=float, default=[0, 0.5, 0.99], help="Pagination depths.")
+        parser.add_argument("--only", nargs="+", help="Only run the benchmarks whose name starts with one of these.")
+        parser.add_argument("--output", help="Also write the results to this file.")
+        parser.add_argument("--baseline", help="Results file of a previous run to compare with.")
+        parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown ratio, 0.2 is +20%%.")
+
+    def handle(self, *args, **options):
+        self.options = options
+        # With an empty ALLOWED_HOSTS, Django only accepts localhost, and only while DEBUG is on.
+        host = next((h for h in settings.ALLOWED_HOSTS if h != "*" and not h.startswith(".")), "localhost")
+        self.factory = APIRequestFactory(SERVER_NAME=host)
+        self.results: Dict[str, dict] = {}
+        with transaction.atomic():
+            self.run_schema_benchmarks()
+            self.run_repository_benchmarks()
+            self.run_row_benchmarks()
+            transaction.set_rollback(True)
+
+        report = {
+            "meta": {
+                "vendor": connection.vendor,
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "options": {k: options[k] for k in ("repeat", "fields", "tables", "rows", "depths")},
+            },
+            "results": self.results,
+        }
+        regressed = []
+        if options["baseline"]:
+            with open(options["baseline"]) as baseline_file:
+                baseline = json.load(baseline_file)["results"]
+            report["comparison"] = compare_to_baseline(self.results, baseline, options["threshold"])
+            regressed = [name for name, c in report["comparison"].items() if c["regressed"]]
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as output_file:
+                output_file.write(output)
+        self.stdout.write(output)
+        if regressed:
+            raise CommandError(f"Slower than the baseline: {', '.join(regressed)}.")
+
+    def selected(self, name: str) -> bool:
+        return not self.options["only"] or any(name.startswith(prefix) for prefix in self.options["only"])
+
+    def bench(self, name: str, func: Callable[[], object], number: int = 1, repeat: Optional[int] = None):
+        if self.selected(name):
+            self.results[name] = measure(func, repeat or self.options["repeat"], number)
+
+    def create_table(self, name: str):
+        schema_model = DynamicTable.objects.create(name=name, fields=get_bench_fields(self.options["fields"]))
+        dynamic_table_repo_factory().add(schema_model)
+        return schema_model, dynamic_table_repo_factory().get_by_id(schema_model.pk)
+
+    def run_schema_benchmarks(self):
+        fields = get_bench_fields(self.options["fields"])
+        model = get_dynamic_table_model("bench_schema", fields)
+        altered = DynamicTable(
+            name="bench_schema",
+            fields=[{**f, "field_type": "string"} if i % 4 == 0 else f for i, f in enumerate(fields)][1:]
+            + [{"name": "new_field", "field_type": "number"}],
+        )
+        self.bench("get_dynamic_table_model", lambda: get_dynamic_table_model("bench_schema", fields), number=100)
+        self.bench("model_serializer_class_factory", lambda: model_serializer_class_factory(model), number=100)
+        row = get_bench_row(fields, 1)
+        serializer_class = model_serializer_class_factory(model)
+        validator = RowValidator.for_model(model)
+
+        def validate_with_serializer():
+            serializer = serializer_class(data=row)
+            serializer.is_valid(raise_exception=True)
+            return model(**serializer.validated_data)
+
+        self.bench("row_validation[serializer]", validate_with_serializer, number=1000)
+        self.bench("row_validation[compiled]", lambda: model(**validator.validate(row)), number=1000)
+        self.bench(
+            "compare_existing_table_to_new_schema",
+            lambda: compare_existing_table_to_new_schema(model, altered),
+            number=100,
+        )
+
+    def run_repository_benchmarks(self):
+        fields = get_bench_fields(self.options["fields"])
+        for tables_count in self.options["tables"]:
+            name = f"init_repo[{tables_count}]"
+            if not self.selected(name):
+                continue
+            with transaction.atomic():
+                DynamicTable.objects.bulk_create(
+                    [DynamicTable(name=f"bench_repo_{tables_count}_{i}", fields=fields) for i in range(tables_count)],
+                    batch_size=5000,
+                )
+                self.bench(name, lambda: DynamicTableRepository(max_tables=tables_count).init_repo(), repeat=3)
+                transaction.set_rollback(True)
+
+        counter = iter(range(10**9))
+
+        def create_tables(count: int):
+            tables = [{"name": f"bench_create_{next(counter)}", "fields": fields} for _ in range(count)]
+            if count == 1:
+                request = self.factory.post("/", tables[0], format="json")
+                DynamicTableCreateView.as_view()(request).render()
+            else:
+                request = self.factory.post("/", tables, format="json")
+                DynamicTableBulkCreateView.as_view()(request).render()
+
+        self.bench("table_create[single]", lambda: create_tables(1), number=20)
+        self.bench("table_create[bulk_100]", lambda: create_tables(100), repeat=3)
+
+    def run_row_benchmarks(self):
+        fields = get_bench_fields(self.options["fields"])
+        schema_model, model = self.create_table("bench_rows_insert")
+        counter = iter(range(10**9))
+
+        def create_row():
+            request = self.factory.post("/", get_bench_row(fields, next(counter)), format="json")
+            RowCreateView.as_view()(request, table_id=schema_model.pk).render()
+
+        def create_bulk():
+            rows = [get_bench_row(fields, next(counter)) for _ in range(1000)]
+            request = self.factory.post("/", rows, format="json")
+            RowBulkCreateView.as_view()(request, table_id=schema_model.pk).render()
+
+        self.bench("row_insert[single]", create_row, number=100)
+        self.bench("row_insert[bulk_1000]", create_bulk)
+
+        if not any(self.selected(prefix) for prefix in ("row_list[keyset", "row_list[offset", "row_list_10k[")):
+            return
+        schema_model, model = self.create_table("bench_rows_list")
+        rows_count = self.options["rows"]
+        model.objects.bulk_create([model(**get_bench_row(fields, i)) for i in range(rows_count)], batch_size=5000)
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {connection.ops.quote_name(model._meta.db_table)}")
+        ids = list(model.objects.order_by("id").values_list("id", flat=True))
+        for depth in self.options["depths"]:
+            position = min(int(rows_count * depth), rows_count - 1)
+            after = ids[position - 1] if position else 0
+            self.bench(f"row_list[keyset,depth={depth}]", self.get_list(schema_model.pk, f"after={after}&limit=100"))
+            self.bench(
+                f"row_list[offset,depth={depth}]", self.get_list(schema_model.pk, f"offset={position}&limit=100")
+            )
+        formats = {"json": "application/json", "columnar": ColumnarJSONRenderer.media_type}
+        for format_name, media_type in formats.items():
+            for encoding in [None, *get_available_encodings()]:
+                name = f"row_list_10k[{format_name},{encoding or 'identity'}]"
+                self.bench_list_format(name, schema_model.pk, media_type, encoding)
+
+    def bench_list_format(self, name: str, table_id: int, media_type: str, encoding: Optional[str]):
+        """Times a 10k rows page in the given format, compression included, and records its size in ``bytes``."""
+        sizes = []
+
+        def get():
+            request = self.factory.get("/?after=0&limit=10000", HTTP_ACCEPT=media_type)
+            content = RowListView.as_view()(request, table_id=table_id).render().content
+            if encoding is not None:
+                content = compress(content, encoding)
+            sizes.append(len(content))
+
+        self.bench(name, get)
+        if sizes:
+            self.results[name]["bytes"] = sizes[-1]
+
+    def get_list(self, table_id: int, query: str) -> Callable[[], object]:
+        def get():
+            request = self.factory.get(f"/?{query}")
+            RowListView.as_view()(request, table_id=table_id).render()
+
+        return get
@@ -0,0 +1,153 @@
+import asyncio
+import json
+import time
+
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from apps.schema_manager.models import DynamicTable, FieldType
+
+SAMPLE_VALUES = {FieldType.number: 1, FieldType.string: "load test", FieldType.boolean: True}
+URL_NAMES = {
+    ("sync", "list"): "row-list",
+    ("sync", "create"): "row-create",
+    ("async", "list"): "row-list-async",
+    ("async", "create"): "row-create-async",
+}
+
+
+class Stats:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.statuses: Dict[int, int] = {}
+        self.errors = 0
+
+    def report(self, seconds: float) -> dict:
+        latencies = sorted(self.latencies)
+        return {
+            "requests": len(latencies),
+            "errors": self.errors,
+            "statuses": self.statuses,
+            "req_per_s": round(len(latencies) / seconds, 1),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        }
+
+
+def percentile(values: List[float], pct: int) -> float:
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, len(values) * pct // 100)]
+
+
+def build_request(method: str, host: str, path: str, body: Optional[bytes]) -> bytes:
+    lines = [f"{method} {path} HTTP/1.1", f"Host: {host}", "Connection: keep-alive"]
+    if body is not None:
+        lines += ["Content-Type: application/json", f"Content-Length: {len(body)}"]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode() + (body or b"")
+
+
+async def read_response(reader: asyncio.StreamReader) -> Tuple[int, bool]:
+    """Reads one response, returns its status and whether the server keeps the connection open."""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("Connection closed by the server.")
+    status = int(status_line.split()[1])
+    headers = {}
+    while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip().lower()
+    if "content-length" in headers:
+        await reader.readexactly(int(headers["content-length"]))
+    elif headers.get("transfer-encoding") == "chunked":
+        while size := int((await reader.readline()).split(b";")[0], 16):
+            await reader.readexactly(size + 2)
+        await reader.readline()
+    else:
+        await reader.read()
+        return status, False
+    return status, headers.get("connection") != "close"
+
+
+async def run_client(host: str, port: int, request: bytes, deadline: float, stats: Stats):
+    loop = asyncio.get_running_loop()
+    writer = None
+    while loop.time() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            started_at = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            status, keep_alive = await read_response(reader)
+            stats.latencies.append(time.perf_counter() - started_at)
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError):
+            stats.errors += 1
+            keep_alive = False
+        if not keep_alive and writer is not None:
+            writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def run_load(url: str, method: str, body: Optional[bytes], clients: int, duration: float) -> dict:
+    parts = urlsplit(url)
+    if parts.hostname is None:
+        raise CommandError(f"'{url}' is not an absolute URL, e.g. http://localhost:8000.")
+    path = parts.path + (f"?{parts.query}" if parts.query else "")
+    request = build_request(method, parts.netloc, path, body)
+    stats = Stats()
+    started_at = time.perf_counter()
+    deadline = asyncio.get_running_loop().time() + duration
+    await asyncio.gather(
+        *(run_client(parts.hostname, parts.port or 80, request, deadline, stats) for _ in range(clients))
+    )
+    return stats.report(time.perf_counter() - started_at)
+
+
+class Command(BaseCommand):
+    help = (
+        "Drives the sync (DRF) and the async row endpoints of a running server with many concurrent keep-alive "
+        "clients and reports p50/p99 latency and throughput of each. Serve the project under ASGI to exercise the "
+        "async views, raise the open files limit (ulimit -n) for large --clients values."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--table", type=int, required=True, help="Id of an existing table.")
+        parser.add_argument("--scenario", choices=["list", "create"], default="list")
+        parser.add_argument("--stacks", nargs="+", choices=["sync", "async"], default=["sync", "async"])
+        parser.add_argument("--base-url", default="http://localhost:8000")
+        parser.add_argument("--async-base-url", help="Server of the async stack, when it is not the one at --base-url.")
+        parser.add_argument("--clients", type=int, default=1000)
+        parser.add_argument("--duration", type=float, default=30, help="Seconds per stack.")
+        parser.add_argument("--query", default="limit=100", help="Query string of the list scenario.")
+
+    def handle(self, *args, **options):
+        try:
+            schema_model = DynamicTable.objects.get(pk=options["table"])
+        except DynamicTable.DoesNotExist:
+            raise CommandError(f"Cannot find table with ID '{options['table']}'")
+
+        method, body, query = "GET", None, f"?{options['query']}"
+        if options["scenario"] == "create":
+            row = {f["name"]: SAMPLE_VALUES[FieldType(f["field_type"])] for f in schema_model.fields}
+            method, body, query = "POST", json.dumps(row).encode(), ""
+
+        results = {}
+        for stack in options["stacks"]:
+            base_url = (
+                options["async_base_url"] if stack == "async" and options["async_base_url"] else options["base_url"]
+            )
+            path = reverse(URL_NAMES[(stack, options["scenario"])], kwargs={"table_id": schema_model.pk})
+            url = base_url.rstrip("/") + path + query
+            results[stack] = {
+                "url": url,
+                **asyncio.run(run_load(url, method, body, options["clients"], options["duration"])),
+            }
+        self.stdout.write(
+            json.dumps({"scenario": options["scenario"], "clients": options["clients"], **results}, indent=2)
+        )
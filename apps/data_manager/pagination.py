@@ -0,0 +1,92 @@
+from typing import Optional
+from django.conf import settings
+from django.db import connection
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import Cursor, CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param
+
+
+class RowCursorPagination(CursorPagination):
+    """
+    Keyset pagination over the auto primary key: every page is a ``WHERE id > <position> ORDER BY id LIMIT n``
+    index range scan, so deep pages cost as much as the first one.
+
+    A listing is switched to this mode by either the opaque ``cursor`` taken from a ``next``/``previous`` link
+    or a plain ``after=<id>``: the rows listed after that id in the requested order, ``after=0`` being the first
+    page. ``count=exact|estimate`` adds a row count, the estimate being read from the planner statistics instead
+    of running ``COUNT(*)``.
+    """
+
+    ordering = "id"
+    page_size = settings.DATALEX_CURSOR_PAGE_SIZE
+    page_size_query_param = "limit"
+    max_page_size = settings.DATALEX_CURSOR_MAX_PAGE_SIZE
+    after_query_param = "after"
+    count_query_param = "count"
+
+    @classmethod
+    def is_requested(cls, request) -> bool:
+        return cls.cursor_query_param in request.query_params or cls.after_query_param in request.query_params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = self.get_count(queryset, request)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering not in (("id",), ("-id",)):
+            raise ValidationError({"order_by": "Keyset pagination only supports ordering by 'id' or '-id'."})
+        return ordering
+
+    def decode_cursor(self, request):
+        after = request.query_params.get(self.after_query_param)
+        if after is None or self.cursor_query_param in request.query_params:
+            return super().decode_cursor(request)
+        try:
+            position = int(after)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if position == 0:
+            # The first page in either order, i.e. from the highest id with ``-id``.
+            return None
+        return Cursor(offset=0, reverse=False, position=str(position))
+
+    def _get_position_from_instance(self, instance, ordering):
+        if isinstance(instance, tuple):
+            # A values_list() row of the columnar format, which starts with the id.
+            return str(instance[0])
+        return super()._get_position_from_instance(instance, ordering)
+
+    def encode_cursor(self, cursor):
+        return remove_query_param(super().encode_cursor(cursor), self.after_query_param)
+
+    def get_count(self, queryset, request) -> Optional[int]:
+        count_mode = request.query_params.get(self.count_query_param)
+        if count_mode is None:
+            return None
+        if count_mode == "exact":
+            return queryset.count()
+        if count_mode == "estimate":
+            return get_estimated_count(queryset)
+        raise ValidationError({self.count_query_param: "Must be either 'exact' or 'estimate'."})
+
+    def get_paginated_response(self, data):
+        response_data = {"next": self.get_next_link(), "previous": self.get_previous_link(), "results": data}
+        if self.count is not None:
+            response_data = {"count": self.count, **response_data}
+        return Response(response_data)
+
+
+def get_estimated_count(queryset) -> Optional[int]:
+    if connection.vendor != "postgresql":
+        return queryset.count()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [queryset.model._meta.db_table]
+        )
+        row = cursor.fetchone()
+    # reltuples is -1 until the table has been vacuumed or analyzed for the first time.
+    if row is None or row[0] < 0:
+        return None
+    return row[0]
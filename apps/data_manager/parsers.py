@@ -0,0 +1,102 @@
+import io
+import json
+import shutil
+import tempfile
+
+from typing import Callable, Iterable, Iterator, Union
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Optional, only needed by the Arrow and Parquet formats.
+    pyarrow = None
+
+
+class NDJSONParser(BaseParser):
+    """
+    Newline delimited JSON: one row per line. Rows are decoded lazily while the request body
+    is consumed, so an upload of any size is never held in memory at once.
+    """
+
+    media_type = "application/x-ndjson"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        return iter_ndjson_rows(stream, encoding)
+
+
+def iter_ndjson_rows(stream, encoding: str) -> Iterator[Union[dict, ParseError]]:
+    if stream is None:
+        return
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line.decode(encoding))
+        except ValueError as exc:
+            yield ParseError(f"NDJSON parse error - {exc}")
+
+
+class ReadableStream(io.RawIOBase):
+    """Request stream as a raw readable file, which pyarrow requires (Django's ``LimitedStream`` is not one)."""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self.stream.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+
+class ArrowStreamParser(BaseParser):
+    """Arrow IPC stream, read one record batch at a time."""
+
+    media_type = "application/vnd.apache.arrow.stream"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if stream is None:
+            return iter(())
+        return iter_record_batch_rows(lambda: pyarrow.ipc.open_stream(io.BufferedReader(ReadableStream(stream))))
+
+
+class ParquetParser(BaseParser):
+    """
+    Parquet keeps its metadata at the end of the file, so the upload is first spooled to a temporary file
+    (on disk past ``FILE_UPLOAD_MAX_MEMORY_SIZE``), then read in batches of ``DATALEX_RECORD_BATCH_SIZE`` rows.
+    """
+
+    media_type = "application/vnd.apache.parquet"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if stream is None:
+            return iter(())
+        return iter_parquet_rows(stream)
+
+
+def iter_parquet_rows(stream) -> Iterator[Union[dict, ParseError]]:
+    with tempfile.SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE) as file:
+        shutil.copyfileobj(stream, file)
+        file.seek(0)
+        yield from iter_record_batch_rows(
+            lambda: pyarrow.parquet.ParquetFile(file).iter_batches(batch_size=settings.DATALEX_RECORD_BATCH_SIZE)
+        )
+
+
+def iter_record_batch_rows(open_batches: Callable[[], Iterable]) -> Iterator[Union[dict, ParseError]]:
+    try:
+        for batch in open_batches():
+            yield from batch.to_pylist()
+    except (pyarrow.ArrowException, OSError) as exc:
+        yield ParseError(f"Arrow parse error - {exc}")
+
+
+COLUMNAR_PARSERS = [ArrowStreamParser, ParquetParser] if pyarrow is not None else []
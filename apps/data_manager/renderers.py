@@ -0,0 +1,203 @@
+import csv
+import json
+
+from itertools import chain, islice
+from typing import Iterable, Iterator, List, Optional, Sequence, Union
+from django.conf import settings
+from rest_framework.renderers import BaseRenderer
+
+from apps.schema_manager.models import FieldType
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Optional, only needed by the Arrow and Parquet formats.
+    pyarrow = None
+
+try:
+    import orjson
+except ImportError:  # Optional, the columnar JSON format falls back to the json module.
+    orjson = None  # type: ignore[assignment]
+
+
+class Echo:
+    """File-like object which hands back whatever is written to it, for use with ``csv.writer``."""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+class RowStreamRenderer(BaseRenderer):
+    """
+    Base class for renderers which encode rows straight from ``values_list`` tuples into text chunks
+    suitable for a ``StreamingHttpResponse``, or into bytes for binary formats (``charset`` None).
+    ``render`` is only used for error responses.
+    """
+
+    charset: Optional[str] = "utf-8"
+    rows_per_chunk = 500
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data).encode(self.charset)
+
+    def render_rows(
+        self, columns: List[str], rows: Iterable[Sequence], field_types: Optional[List[FieldType]] = None
+    ) -> Iterator[Union[str, bytes]]:
+        buffer = [self.render_header(columns)]
+        for row in rows:
+            buffer.append(self.render_row(columns, row))
+            if len(buffer) >= self.rows_per_chunk:
+                yield "".join(buffer)
+                buffer = []
+        if buffer:
+            yield "".join(buffer)
+
+    def render_header(self, columns: List[str]) -> str:
+        return ""
+
+    def render_row(self, columns: List[str], row: Sequence) -> str:
+        raise NotImplementedError()
+
+
+class NDJSONRenderer(RowStreamRenderer):
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+
+    def render_row(self, columns: List[str], row: Sequence) -> str:
+        return json.dumps(dict(zip(columns, row))) + "\n"
+
+
+class ChangeFeedRenderer(NDJSONRenderer):
+    """
+    One line per changed row, ``{"op": "upsert", "row": {...}}``, then per deleted row, ``{"op": "delete", "id": 1}``.
+    The last line, ``{"op": "watermark", "watermark": 123}``, tells the stream is complete.
+    """
+
+    def render_changes(
+        self, columns: List[str], rows: Iterable[Sequence], deleted_ids: Iterable[int], watermark: int
+    ) -> Iterator[str]:
+        lines = chain(
+            (json.dumps({"op": "upsert", "row": dict(zip(columns, row))}) + "\n" for row in rows),
+            (json.dumps({"op": "delete", "id": row_id}) + "\n" for row_id in deleted_ids),
+            [json.dumps({"op": "watermark", "watermark": watermark}) + "\n"],
+        )
+        while chunk := "".join(islice(lines, self.rows_per_chunk)):
+            yield chunk
+
+
+class CSVRenderer(RowStreamRenderer):
+    media_type = "text/csv"
+    format = "csv"
+
+    def __init__(self):
+        self.writer = csv.writer(Echo())
+
+    def render_header(self, columns: List[str]) -> str:
+        return self.writer.writerow(columns)
+
+    def render_row(self, columns: List[str], row: Sequence) -> str:
+        return self.writer.writerow(row)
+
+
+class ColumnarJSONRenderer(BaseRenderer):
+    """
+    Row listings with the column names given once and every row as an array, ``{"columns": ["id", "f1"], "rows":
+    [[1, true]]}``, from ``values_list`` tuples instead of serialized dicts. Encoded with orjson when installed.
+    """
+
+    media_type = "application/vnd.datalex.columnar+json"
+    format = "columnar"
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if orjson is not None:
+            return orjson.dumps(data)
+        return json.dumps(data, separators=(",", ":")).encode()
+
+
+class ChunkSink:
+    """Binary file-like object keeping what pyarrow writes to it until ``pop``."""
+
+    closed = False
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def pop(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+def get_arrow_schema(columns: List[str], field_types: List[FieldType]):
+    arrow_types = {
+        FieldType.string: pyarrow.string(),
+        FieldType.number: pyarrow.int32(),
+        FieldType.boolean: pyarrow.bool_(),
+    }
+    return pyarrow.schema([(column, arrow_types[field_type]) for column, field_type in zip(columns, field_types)])
+
+
+class ColumnarRenderer(RowStreamRenderer):
+    """
+    Encodes rows into record batches of ``DATALEX_RECORD_BATCH_SIZE`` rows, typed after the table fields.
+    Every batch is sent as soon as it is written, so only one of them is held in memory.
+    """
+
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data).encode()
+
+    def render_rows(
+        self, columns: List[str], rows: Iterable[Sequence], field_types: Optional[List[FieldType]] = None
+    ) -> Iterator[bytes]:
+        schema = get_arrow_schema(columns, field_types or [])
+        sink = ChunkSink()
+        writer = self.open_writer(sink, schema)
+        rows = iter(rows)
+        while batch := list(islice(rows, settings.DATALEX_RECORD_BATCH_SIZE)):
+            arrays = [pyarrow.array(values, type=field.type) for values, field in zip(zip(*batch), schema)]
+            writer.write_batch(pyarrow.RecordBatch.from_arrays(arrays, schema=schema))
+            yield sink.pop()
+        writer.close()
+        yield sink.pop()
+
+    def open_writer(self, sink: ChunkSink, schema):
+        raise NotImplementedError()
+
+
+class ArrowRenderer(ColumnarRenderer):
+    """Arrow IPC streaming format."""
+
+    media_type = "application/vnd.apache.arrow.stream"
+    format = "arrow"
+
+    def open_writer(self, sink: ChunkSink, schema):
+        return pyarrow.ipc.new_stream(sink, schema)
+
+
+class ParquetRenderer(ColumnarRenderer):
+    """Parquet, one row group per record batch."""
+
+    media_type = "application/vnd.apache.parquet"
+    format = "parquet"
+
+    def open_writer(self, sink: ChunkSink, schema):
+        return pyarrow.parquet.ParquetWriter(sink, schema)
+
+
+COLUMNAR_RENDERERS = [ArrowRenderer, ParquetRenderer] if pyarrow is not None else []
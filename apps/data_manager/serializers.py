@@ -1,10 +1,72 @@
+from typing import Dict, Optional, Sequence, Tuple, Type
 from django.db import models
+from django.dispatch import receiver
 from rest_framework.serializers import ModelSerializer
 
+from apps.schema_manager.repositores import get_natural_key
+from apps.schema_manager.signals import dynamic_table_changed, dynamic_table_evicted
+from datalex.instrumentation import metrics, timed
 
-def model_serializer_class_factory(model: models.Model):
+
+def model_serializer_class_factory(model: models.Model, fields: Optional[Sequence[str]] = None):
     serializer_class = type(model._meta.model_name, (ModelSerializer,), {})
-    fields_list = [f.name for f in model._meta.get_fields()]
+    fields_list = list(fields) if fields is not None else [f.name for f in model._meta.get_fields()]
     extra_kwargs = {fname: {"required": True} for fname in fields_list if fname != "id"}
     serializer_class.Meta = type("Meta", (), {"model": model, "fields": fields_list, "extra_kwargs": extra_kwargs})  # type: ignore[attr-defined]
     return serializer_class
+
+
+def get_model_fingerprint(model: models.Model) -> tuple:
+    return (
+        model._meta.db_table,
+        tuple((f.column, f.get_internal_type()) for f in model._meta.concrete_fields),
+        tuple(get_natural_key(model)),
+    )
+
+
+class SerializerClassCache:
+    """Keeps one generated serializer class per table, rebuilt only when the table schema changes."""
+
+    def __init__(self):
+        self.classes: Dict[int, Tuple[tuple, Dict[Optional[tuple], Type[ModelSerializer]]]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, table_id: int, model: models.Model, fields: Optional[Sequence[str]] = None) -> Type[ModelSerializer]:
+        fingerprint = get_model_fingerprint(model)
+        projection = tuple(fields) if fields is not None else None
+        cached = self.classes.get(table_id)
+        if cached is None or cached[0] != fingerprint:
+            cached = self.classes[table_id] = (fingerprint, {})
+        serializer_class = cached[1].get(projection)
+        if serializer_class is not None:
+            self.hits += 1
+            return serializer_class
+        self.misses += 1
+        with timed("serializer_class"):
+            serializer_class = cached[1][projection] = model_serializer_class_factory(model, projection)
+        return serializer_class
+
+    def invalidate(self, table_id: int):
+        self.classes.pop(table_id, None)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": sum(len(c[1]) for c in self.classes.values())}
+
+
+serializer_class_cache = SerializerClassCache()
+
+
+@receiver([dynamic_table_changed, dynamic_table_evicted])
+def invalidate_serializer_class(sender, table_id: int, **kwargs):
+    serializer_class_cache.invalidate(table_id)
+
+
+@metrics.register_collector
+def collect_serializer_cache_metrics():
+    stats = serializer_class_cache.stats()
+    yield "datalex_serializer_cache_hits_total", "counter", "Serializer classes served from the cache.", (), stats[
+        "hits"
+    ]
+    yield "datalex_serializer_cache_misses_total", "counter", "Serializer classes built.", (), stats["misses"]
+    yield "datalex_serializer_cache_size", "gauge", "Serializer classes in the cache.", (), stats["size"]
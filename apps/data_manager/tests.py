@@ -1,6 +1,31 @@
+import gzip
+import itertools
+import json
+import tempfile
+import threading
+import time
+
+from io import BytesIO, StringIO
+from typing import Any, List
+from unittest import mock, skipUnless
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.http import HttpResponse, QueryDict, StreamingHttpResponse
+from django.test import RequestFactory, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from rest_framework.test import APIClient
 
+from datalex.compression import CompressionMiddleware, zstandard
+from datalex.instrumentation import InstrumentationMiddleware
 from datalex.test_utils import ApiTestCase, dynamic_table_factory
+from apps.schema_manager.repositores import SEARCH_INDEX_PREFIX, dynamic_table_repo_factory, get_dynamic_table_model
+from .filters import search_rows
+from .ingest import IngestBuffer, ingest_buffer
+from .renderers import ColumnarJSONRenderer, pyarrow
+from .serializers import model_serializer_class_factory, serializer_class_cache
+from .validators import RowValidator, row_validator_cache
 
 
 def schema_factory() -> dict:
@@ -45,6 +70,66 @@ class TestRowCreate(ApiTestCase):
         self.assertEqual(resp.status_code, 400)
 
 
+class TestRowBulkCreate(ApiTestCase):
+    def test_no_schema_with_this_id(self):
+        resp = self.api_client.post(reverse("row-bulk-create", kwargs={"table_id": 132}), [], format="json")
+        self.assertEqual(resp.status_code, 404)
+
+    def test_json_array(self):
+        schema = schema_factory()
+        table_id, table = dynamic_table_factory(schema["name"], schema["fields"])
+        rows = [{"fnumber": i, "fstring": f"row {i}", "fbool": i % 2 == 0} for i in range(25)]
+        url = reverse("row-bulk-create", kwargs={"table_id": table_id}) + "?batch_size=10"
+        resp = self.api_client.post(url, rows, format="json")
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(resp.data, {"created": 25, "errors": []})
+        self.assertEqual(table.objects.count(), 25)
+        self.assertEqual(table.objects.get(fnumber=7).fstring, "row 7")
+
+    def test_errors_reported_by_index(self):
+        schema = schema_factory()
+        table_id, table = dynamic_table_factory(schema["name"], schema["fields"])
+        rows = [
+            {"fnumber": 1, "fstring": "ok", "fbool": True},
+            {"fnumber": "not a number", "fstring": "bad", "fbool": True},
+            {"fnumber": 3, "fbool": False},
+            {"fnumber": 4, "fstring": "ok", "fbool": False},
+        ]
+        resp = self.api_client.post(reverse("row-bulk-create", kwargs={"table_id": table_id}), rows, format="json")
+        self.assertEqual(resp.status_code, 207)
+        self.assertEqual(resp.data["created"], 2)
+        self.assertEqual([e["index"] for e in resp.data["errors"]], [1, 2])
+        self.assertIn("fnumber", resp.data["errors"][0]["errors"])
+        self.assertIn("fstring", resp.data["errors"][1]["errors"])
+        self.assertEqual(table.objects.count(), 2)
+
+        resp = self.api_client.post(reverse("row-bulk-create", kwargs={"table_id": table_id}), rows[1:3], format="json")
+        self.assertEqual(resp.status_code, 400)
+
+    def test_ndjson(self):
+        schema = schema_factory()
+        table_id, table = dynamic_table_factory(schema["name"], schema["fields"])
+        lines = [json.dumps({"fnumber": i, "fstring": "nd", "fbool": True}) for i in range(3)]
+        body = "\n".join(lines[:2] + ["{broken", lines[2]]) + "\n"
+        resp = self.api_client.post(
+            reverse("row-bulk-create", kwargs={"table_id": table_id}),
+            body,
+            content_type="application/x-ndjson",
+        )
+        self.assertEqual(resp.status_code, 207)
+        self.assertEqual(resp.data["created"], 3)
+        self.assertEqual([e["index"] for e in resp.data["errors"]], [2])
+        self.assertEqual(table.objects.count(), 3)
+
+    def test_bad_batch_size(self):
+        schema = schema_factory()
+        table_id, _ = dynamic_table_factory(schema["name"], schema["fields"])
+        url = reverse("row-bulk-create", kwargs={"table_id": table_id})
+        for batch_size in ("0", "abc", "1000000"):
+            resp = self.api_client.post(url + f"?batch_size={batch_size}", [], format="json")
+            self.assertEqual(resp.status_code, 400)
+
+
 class TestRowList(ApiTestCase):
     def test_no_schema_with_this_id(self):
         resp = self.api_client.get(reverse("row-list", kwargs={"table_id": 132}), format="json")
@@ -72,3 +157,1104 @@ class TestRowList(ApiTestCase):
         self.assertEqual(resp.status_code, 200)
         print(resp.data)
         self.assertEqual(len(resp.data["results"]), 1)
+
+    def test_cursor_pagination(self):
+        schema = schema_factory()
+        table_id, table = dynamic_table_factory(schema["name"], schema["fields"])
+        rows = [{"fnumber": i, "fstring": f"row {i}", "fbool": True} for i in range(5)]
+        self.api_client.post(reverse("row-bulk-create", kwargs={"table_id": table_id}), rows, format="json")
+        ids = list(table.objects.order_by("id").values_list("id", flat=True))
+        url = reverse("row-list", kwargs={"table_id": table_id})
+
+        resp = self.api_client.get(url + "?after=0&limit=2")
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotIn("count", resp.data)
+        self.assertEqual([r["id"] for r in resp.data["results"]], ids[:2])
+        self.assertNotIn("after=", resp.data["next"])
+
+        resp = self.api_client.get(resp.data["next"])
+        self.assertEqual([r["id"] for r in resp.data["results"]], ids[2:4])
+        resp = self.api_client.get(resp.data["next"])
+        self.assertEqual([r["id"] for r in resp.data["results"]], ids[4:])
+        self.assertIsNone(resp.data["next"])
+
+        resp = self.api_client.get(url + f"?after={ids[2]}&limit=10&count=exact")
+        self.assertEqual([r["id"] for r in resp.data["results"]], ids[3:])
+        self.assertEqual(resp.data["count"], 5)
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {table._meta.db_table}")
+        resp = self.api_client.get(url + "?after=0&count=estimate")
+        self.assertEqual(resp.data["count"], 5)
+
+        self.assertEqual(self.api_client.get(url + "?after=abc").status_code, 404)
+        self.assertEqual(self.api_client.get(url + "?after=0&count=maybe").status_code, 400)
+
+
+class TestRowListFilters(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        schema = schema_factory()
+        self.table_id, self.table = dynamic_table_factory(schema["name"], schema["fields"])
+        rows = [
+            {"fnumber": 10, "fstring": "apple", "fbool": True},
+            {"fnumber": 20, "fstring": "apricot", "fbool": False},
+            {"fnumber": 30, "fstring": "banana", "fbool": True},
+            {"fnumber": 40, "fstring": "cherry", "fbool": False},
+        ]
+        self.api_client.post(reverse("row-bulk-create", kwargs={"table_id": self.table_id}), rows, format="json")
+        self.url = reverse("row-list", kwargs={"table_id": self.table_id})
+
+    def get_numbers(self, query: str) -> list:
+        resp = self.api_client.get(self.url + query)
+        self.assertEqual(resp.status_code, 200, resp.data)
+        return [row["fnumber"] for row in resp.data]
+
+    def test_lookups(self):
+        self.assertEqual(self.get_numbers("?fnumber=20"), [20])
+        self.assertEqual(self.get_numbers("?fnumber__gte=20&fnumber__lt=40"), [20, 30])
+        self.assertEqual(self.get_numbers("?fnumber__in=10,40,50"), [10, 40])
+        self.assertEqual(self.get_numbers("?fstring__startswith=ap"), [10, 20])
+        self.assertEqual(self.get_numbers("?fstring__contains=an"), [30])
+        self.assertEqual(self.get_numbers("?fbool=true&fstring__startswith=a"), [10])
+
+    def test_ordering_and_projection(self):
+        self.assertEqual(self.get_numbers("?order_by=-fnumber"), [40, 30, 20, 10])
+        self.assertEqual(self.get_numbers("?order_by=fbool,-fstring"), [40, 20, 30, 10])
+
+        resp = self.api_client.get(self.url + "?fields=fstring,fnumber&fbool=false&limit=1&offset=1")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data["count"], 2)
+        self.assertEqual(resp.data["results"], [{"fnumber": 40, "fstring": "cherry"}])
+
+        ids = list(self.table.objects.order_by("id").values_list("id", flat=True))
+        for ordering, expected in (("id", ids), ("-id", ids[::-1])):
+            resp = self.api_client.get(self.url + f"?after=0&limit=3&order_by={ordering}&fields=id")
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual([row["id"] for row in resp.data["results"]], expected[:3])
+            resp = self.api_client.get(resp.data["next"])
+            self.assertEqual([row["id"] for row in resp.data["results"]], expected[3:])
+            resp = self.api_client.get(self.url + f"?after={expected[0]}&limit=3&order_by={ordering}&fields=id")
+            self.assertEqual([row["id"] for row in resp.data["results"]], expected[1:4])
+        resp = self.api_client.get(self.url + "?after=0&order_by=fnumber")
+        self.assertEqual(resp.status_code, 400)
+
+    def test_invalid_parameters(self):
+        for query in (
+            "?unknown=1",
+            "?fnumber=abc",
+            "?fnumber__in=1,x",
+            "?fbool__gt=true",
+            "?fstring__lte=a",
+            "?fbool=maybe",
+            "?order_by=unknown",
+            "?fields=fstring,unknown",
+        ):
+            resp = self.api_client.get(self.url + query)
+            self.assertEqual(resp.status_code, 400, query)
+
+    def test_export_filters(self):
+        resp = self.api_client.get(
+            reverse("row-export", kwargs={"table_id": self.table_id}) + "?format=csv&fnumber__gt=20&fields=fnumber"
+        )
+        self.assertEqual(b"".join(resp.streaming_content).decode().splitlines(), ["fnumber", "30", "40"])
+
+
+class TestRowUpsert(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.table_id, self.table = dynamic_table_factory(
+            "upserted",
+            [
+                {"name": "source", "field_type": "string", "natural_key": True},
+                {"name": "seq", "field_type": "number", "natural_key": True},
+                {"name": "payload", "field_type": "string"},
+            ],
+        )
+        self.url = reverse("row-create", kwargs={"table_id": self.table_id})
+        self.bulk_url = reverse("row-bulk-create", kwargs={"table_id": self.table_id})
+
+    def test_single_upsert(self):
+        row = {"source": "a", "seq": 1, "payload": "first"}
+        resp = self.api_client.post(self.url + "?on_conflict=update", row, format="json")
+        self.assertEqual(resp.status_code, 201, resp.data)
+        row_id = resp.data["id"]
+
+        resp = self.api_client.post(self.url + "?on_conflict=update", {**row, "payload": "second"}, format="json")
+        self.assertEqual(resp.status_code, 200, resp.data)
+        self.assertEqual(resp.data, {"id": row_id, **row, "payload": "second"})
+
+        resp = self.api_client.post(self.url + "?on_conflict=ignore", {**row, "payload": "third"}, format="json")
+        self.assertEqual(resp.status_code, 200, resp.data)
+        self.assertEqual(resp.data, {"id": row_id, **row, "payload": "second"})
+        self.assertEqual(list(self.table.objects.values_list("payload", flat=True)), ["second"])
+
+        # Without on_conflict, the natural key is still unique.
+        resp = self.api_client.post(self.url, row, format="json")
+        self.assertEqual(resp.status_code, 400)
+
+    def test_bulk_upsert(self):
+        rows = [{"source": "a", "seq": i, "payload": "first"} for i in range(5)]
+        resp = self.api_client.post(self.bulk_url + "?on_conflict=ignore", rows, format="json")
+        self.assertEqual(resp.data, {"created": 5, "errors": [], "ignored": 0})
+
+        rows = [{"source": "a", "seq": i, "payload": "second"} for i in range(3, 8)]
+        rows.append({"source": "a", "seq": 7, "payload": "third"})
+        resp = self.api_client.post(self.bulk_url + "?on_conflict=ignore&batch_size=4", rows, format="json")
+        self.assertEqual(resp.status_code, 201, resp.data)
+        self.assertEqual(resp.data, {"created": 3, "errors": [], "ignored": 3})
+        self.assertEqual(
+            dict(self.table.objects.values_list("seq", "payload")),
+            {0: "first", 1: "first", 2: "first", 3: "first", 4: "first", 5: "second", 6: "second", 7: "second"},
+        )
+
+        rows = [{"source": "a", "seq": i, "payload": "fourth"} for i in range(6, 10)]
+        rows.append({"source": "a", "seq": 9, "payload": "fifth"})
+        resp = self.api_client.post(self.bulk_url + "?on_conflict=update", rows, format="json")
+        self.assertEqual(resp.data, {"created": 2, "errors": [], "updated": 3})
+        self.assertEqual(
+            dict(self.table.objects.filter(seq__gte=5).values_list("seq", "payload")),
+            {5: "second", 6: "fourth", 7: "fourth", 8: "fourth", 9: "fifth"},
+        )
+
+    def test_bad_upsert(self):
+        resp = self.api_client.post(self.url + "?on_conflict=replace", {}, format="json")
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("on_conflict", resp.data)
+        resp = self.api_client.post(
+            self.url + "?on_conflict=update", {"source": None, "seq": 1, "payload": "x"}, format="json"
+        )
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.data, {"source": ["This field may not be null."]})
+
+        table_id, _ = dynamic_table_factory("no_natural_key", [{"name": "f1", "field_type": "number"}])
+        resp = self.api_client.post(
+            reverse("row-create", kwargs={"table_id": table_id}) + "?on_conflict=update", {"f1": 1}, format="json"
+        )
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("on_conflict", resp.data)
+
+
+@override_settings(DATALEX_INGEST_IN_BACKGROUND=False, DATALEX_INGEST_BATCH_SIZE=3)
+class TestRowIngest(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.table_id, self.table = dynamic_table_factory(
+            "ingested",
+            [{"name": "seq", "field_type": "number", "natural_key": True}, {"name": "payload", "field_type": "string"}],
+        )
+        self.url = reverse("row-create", kwargs={"table_id": self.table_id})
+
+    def tearDown(self):
+        ingest_buffer.queues.clear()
+        super().tearDown()
+
+    def post_async(self, row: dict):
+        return self.api_client.post(self.url, row, format="json", HTTP_PREFER="respond-async")
+
+    def get_status(self, ingest_id: str) -> dict:
+        resp = self.api_client.get(reverse("row-ingest", kwargs={"table_id": self.table_id, "ingest_id": ingest_id}))
+        self.assertEqual(resp.status_code, 200)
+        return resp.data
+
+    def test_acknowledged_then_committed(self):
+        ingest_ids = []
+        for i in range(5):
+            resp = self.post_async({"seq": i, "payload": "x"})
+            self.assertEqual(resp.status_code, 202, resp.data)
+            self.assertEqual(resp.data["status"], "pending")
+            self.assertEqual(resp["Preference-Applied"], "respond-async")
+            ingest_ids.append(resp.data["ingest_id"])
+        self.assertEqual(self.table.objects.count(), 0)
+        self.assertEqual(self.get_status(ingest_ids[0])["status"], "pending")
+
+        self.assertEqual(ingest_buffer.flush(self.table_id), 3)
+        self.assertEqual(self.table.objects.count(), 3)
+        self.assertEqual([self.get_status(i)["status"] for i in ingest_ids], ["committed"] * 3 + ["pending"] * 2)
+
+        ingest_buffer.flush_all()
+        self.assertEqual(sorted(self.table.objects.values_list("seq", flat=True)), [0, 1, 2, 3, 4])
+        self.assertEqual({self.get_status(i)["status"] for i in ingest_ids}, {"committed"})
+
+    def test_failed_rows_are_isolated(self):
+        self.post_async({"seq": 1, "payload": "x"})
+        duplicate_id = self.post_async({"seq": 1, "payload": "y"}).data["ingest_id"]
+        last_id = self.post_async({"seq": 2, "payload": "z"}).data["ingest_id"]
+        ingest_buffer.flush_all()
+
+        self.assertEqual(dict(self.table.objects.values_list("seq", "payload")), {1: "x", 2: "z"})
+        status = self.get_status(duplicate_id)
+        self.assertEqual(status["status"], "failed")
+        self.assertIn("error", status)
+        self.assertEqual(self.get_status(last_id)["status"], "committed")
+
+    def test_dropped_column(self):
+        ingest_id = self.post_async({"seq": 1, "payload": "x"}).data["ingest_id"]
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.api_client.put(
+                reverse("table-update", kwargs={"pk": self.table_id}),
+                {"fields": [{"name": "seq", "field_type": "number", "natural_key": True}]},
+                format="json",
+            )
+        self.assertEqual(resp.status_code, 200, resp.data)
+        last_id = self.post_async({"seq": 2}).data["ingest_id"]
+        ingest_buffer.flush_all()
+
+        self.assertEqual(self.get_status(ingest_id)["status"], "failed")
+        self.assertEqual(self.get_status(last_id)["status"], "committed")
+
+    def test_validated_before_acknowledged(self):
+        resp = self.post_async({"seq": "one"})
+        self.assertEqual(resp.status_code, 400)
+        resp = self.api_client.post(
+            self.url + "?on_conflict=update", {"seq": 1, "payload": "x"}, format="json", HTTP_PREFER="respond-async"
+        )
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(ingest_buffer.queues.get(self.table_id))
+
+    @override_settings(DATALEX_INGEST_QUEUE_SIZE=2)
+    def test_full_queue(self):
+        self.assertEqual(self.post_async({"seq": 1, "payload": "x"}).status_code, 202)
+        self.assertEqual(self.post_async({"seq": 2, "payload": "x"}).status_code, 202)
+        resp = self.post_async({"seq": 3, "payload": "x"})
+        self.assertEqual(resp.status_code, 429)
+        self.assertEqual(resp["Retry-After"], "1")
+
+        ingest_buffer.flush_all()
+        self.assertEqual(self.post_async({"seq": 3, "payload": "x"}).status_code, 202)
+
+    def test_unknown_ingest_id(self):
+        url = reverse("row-ingest", kwargs={"table_id": self.table_id, "ingest_id": "nonsense"})
+        self.assertEqual(self.api_client.get(url).status_code, 404)
+
+
+@override_settings(DATALEX_INGEST_FLUSH_INTERVAL=0.01)
+class TestIngestFlusher(TransactionTestCase):
+    def test_flushed_in_background(self):
+        table_id, table = dynamic_table_factory("flushed", [{"name": "seq", "field_type": "number"}])
+        buffer = IngestBuffer()
+        try:
+            for i in range(10):
+                buffer.put(table_id, {"seq": i})
+            deadline = time.monotonic() + 5
+            while table.objects.count() < 10 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(table.objects.count(), 10)
+        finally:
+            buffer.shutdown()
+
+    def test_flusher_survives_failures(self):
+        table_id, table = dynamic_table_factory("survivor", [{"name": "seq", "field_type": "number"}])
+        buffer = IngestBuffer()
+        try:
+            with mock.patch("apps.data_manager.ingest.write_batch", side_effect=RuntimeError):
+                with self.assertLogs("apps.data_manager.ingest", "ERROR"):
+                    buffer.put(table_id, {"seq": 1})
+                    deadline = time.monotonic() + 5
+                    while buffer.queues[table_id] and time.monotonic() < deadline:
+                        time.sleep(0.01)
+            buffer.put(table_id, {"seq": 2})
+            deadline = time.monotonic() + 5
+            while not table.objects.exists() and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(list(table.objects.values_list("seq", flat=True)), [2])
+            self.assertTrue(buffer.flusher.is_alive())
+        finally:
+            buffer.shutdown()
+
+    def test_shutdown_never_flushes_alongside_the_flusher(self):
+        table_id, table = dynamic_table_factory("stuck", [{"name": "seq", "field_type": "number"}])
+        buffer = IngestBuffer()
+        writing, release = threading.Event(), threading.Event()
+        calls = []
+
+        def write_slowly(*args):
+            calls.append(args)
+            writing.set()
+            release.wait(5)
+
+        with mock.patch("apps.data_manager.ingest.write_batch", side_effect=write_slowly):
+            buffer.put(table_id, {"seq": 1})
+            self.assertTrue(writing.wait(5))
+            buffer.put(table_id, {"seq": 2})
+            with mock.patch("apps.data_manager.ingest.SHUTDOWN_TIMEOUT", 0.1):
+                with self.assertLogs("apps.data_manager.ingest", "WARNING"):
+                    buffer.shutdown()
+            self.assertEqual(len(calls), 1)
+            release.set()
+            buffer.flusher.join(5)
+        self.assertFalse(buffer.flusher.is_alive())
+
+    def test_flushed_on_shutdown(self):
+        table_id, table = dynamic_table_factory("shut_down", [{"name": "seq", "field_type": "number"}])
+        buffer = IngestBuffer()
+        with override_settings(DATALEX_INGEST_FLUSH_INTERVAL=60):
+            buffer.put(table_id, {"seq": 1})
+            buffer.shutdown()
+        self.assertEqual(table.objects.count(), 1)
+
+
+class TestChangeFeed(TransactionTestCase):
+    def setUp(self):
+        self.api_client = APIClient()
+
+    def get_changes(self, table_id: int, since=None):
+        url = reverse("row-changes", kwargs={"table_id": table_id})
+        resp = self.api_client.get(url if since is None else f"{url}?since={since}")
+        self.assertEqual(resp.status_code, 200)
+        lines = [json.loads(line) for line in b"".join(resp.streaming_content).splitlines()]
+        self.assertEqual(lines[-1]["op"], "watermark")
+        rows = {line["row"]["id"]: line["row"] for line in lines if line["op"] == "upsert"}
+        return rows, [line["id"] for line in lines if line["op"] == "delete"], lines[-1]["watermark"]
+
+    def sync(self, table_id: int, table):
+        table.objects.bulk_create([table(seq=i, name=f"r{i}") for i in range(5)])
+        ids = list(table.objects.order_by("id").values_list("id", flat=True))
+        rows, deleted, watermark = self.get_changes(table_id)
+        self.assertEqual(sorted(rows), ids)
+        self.assertEqual(deleted, [])
+
+        rows, deleted, watermark = self.get_changes(table_id, since=watermark)
+        self.assertEqual((rows, deleted), ({}, []))
+
+        url = reverse("row-list", kwargs={"table_id": table_id})
+        self.api_client.patch(f"{url}?seq=1", {"name": "changed"}, format="json")
+        self.api_client.delete(f"{url}?seq__gte=3")
+        new_row = self.api_client.post(
+            reverse("row-create", kwargs={"table_id": table_id}), {"seq": 10, "name": "new"}, format="json"
+        ).data
+        rows, deleted, _ = self.get_changes(table_id, since=watermark)
+        self.assertEqual(rows, {ids[1]: {"id": ids[1], "seq": 1, "name": "changed"}, new_row["id"]: new_row})
+        self.assertEqual(sorted(deleted), ids[3:])
+        return watermark
+
+    def test_sync(self):
+        fields = [{"name": "seq", "field_type": "number"}, {"name": "name", "field_type": "string"}]
+        table_id, table = dynamic_table_factory("feed", fields)
+        watermark = self.sync(table_id, table)
+
+        call_command("prune_row_tombstones", days=-1, stdout=StringIO())
+        resp = self.api_client.get(reverse("row-changes", kwargs={"table_id": table_id}) + f"?since={watermark}")
+        self.assertEqual(resp.status_code, 410)
+        _, _, watermark = self.get_changes(table_id)
+        self.assertEqual(self.get_changes(table_id, since=watermark)[:2], ({}, []))
+
+    def test_sync_partitioned(self):
+        resp = self.api_client.post(
+            reverse("table-create"),
+            {
+                "name": "feed_partitioned",
+                "fields": [{"name": "seq", "field_type": "number"}, {"name": "name", "field_type": "string"}],
+                "partitioning": {"strategy": "range", "column": "seq", "interval": 2, "premake": 1},
+            },
+            format="json",
+        )
+        self.assertEqual(resp.status_code, 201, resp.data)
+        self.sync(resp.data["id"], dynamic_table_repo_factory().get_by_id(resp.data["id"]))
+
+    def test_bad_since(self):
+        table_id, _ = dynamic_table_factory("feed_bad", [{"name": "seq", "field_type": "number"}])
+        resp = self.api_client.get(reverse("row-changes", kwargs={"table_id": table_id}) + "?since=x")
+        self.assertEqual(resp.status_code, 400)
+
+
+@override_settings(DATALEX_ROW_CHANGE_CHUNK_SIZE=3)
+class TestRowUpdateDelete(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        schema = schema_factory()
+        self.table_id, self.table = dynamic_table_factory(schema["name"], schema["fields"])
+        self.table.objects.bulk_create([self.table(fnumber=i, fstring=f"row {i}", fbool=i % 2 == 0) for i in range(10)])
+        self.url = reverse("row-list", kwargs={"table_id": self.table_id})
+
+    def test_update(self):
+        resp = self.api_client.patch(self.url + "?fbool=true", {"fstring": "even", "fnumber": "-1"}, format="json")
+        self.assertEqual(resp.status_code, 200, resp.data)
+        self.assertEqual(resp.data, {"updated": 5})
+        self.assertEqual(
+            sorted(self.table.objects.values_list("fnumber", "fstring").distinct()),
+            [(-1, "even")] + [(i, f"row {i}") for i in range(1, 10, 2)],
+        )
+
+        # The filtered column itself may be assigned.
+        resp = self.api_client.patch(self.url + "?fnumber__lt=0", {"fnumber": None}, format="json")
+        self.assertEqual(resp.data, {"updated": 5})
+        self.assertEqual(self.table.objects.filter(fnumber__isnull=True).count(), 5)
+
+    def test_bad_update(self):
+        for payload in ({}, [], {"fnumber": "abc"}, {"missing": 1}, {"id": 1}):
+            resp = self.api_client.patch(self.url + "?fbool=true", payload, format="json")
+            self.assertEqual(resp.status_code, 400, payload)
+        resp = self.api_client.patch(self.url + "?fbool=maybe", {"fnumber": 1}, format="json")
+        self.assertEqual(resp.status_code, 400)
+        resp = self.api_client.patch(self.url, {"fnumber": 1}, format="json")
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(self.table.objects.filter(fnumber=1).count(), 1)
+
+    def test_delete(self):
+        resp = self.api_client.delete(self.url + "?fnumber__gte=2&fnumber__lt=9")
+        self.assertEqual(resp.status_code, 200, resp.data)
+        self.assertEqual(resp.data, {"deleted": 7})
+        self.assertEqual(sorted(self.table.objects.values_list("fnumber", flat=True)), [0, 1, 9])
+
+        resp = self.api_client.delete(self.url)
+        self.assertEqual(resp.status_code, 400)
+        resp = self.api_client.delete(self.url + "?all=true")
+        self.assertEqual(resp.data, {"deleted": 3})
+        self.assertFalse(self.table.objects.exists())
+
+    def test_changes_are_chunked(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.api_client.patch(self.url + "?fnumber__lt=8", {"fbool": None}, format="json")
+        updates = [q["sql"] for q in queries if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 3)
+
+    @override_settings(DATALEX_ROW_LIST_CACHE="default")
+    def test_listing_cache_is_invalidated(self):
+        list_url = self.url + "?limit=20&offset=0"
+        self.assertEqual(self.api_client.get(list_url).data["count"], 10)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.api_client.delete(self.url + "?fnumber=0")
+        self.assertEqual(self.api_client.get(list_url).data["count"], 9)
+
+
+class TestRowSearch(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        fields = [
+            {"name": "title", "field_type": "string", "search": True},
+            {"name": "body", "field_type": "string", "search": True},
+            {"name": "views", "field_type": "number"},
+        ]
+        self.table_id, self.table = dynamic_table_factory("articles", fields)
+        rows = [
+            {"title": "Quick brown fox", "body": "The fox jumps over the dog", "views": 1},
+            {"title": "Lazy dog", "body": "The dog sleeps all day", "views": 2},
+            {"title": "Foxes", "body": "A fox is not a dog", "views": 3},
+            {"title": "Cats", "body": "Nothing to see here", "views": 4},
+        ]
+        self.api_client.post(reverse("row-bulk-create", kwargs={"table_id": self.table_id}), rows, format="json")
+        self.url = reverse("row-list", kwargs={"table_id": self.table_id})
+
+    def search(self, query: str) -> list:
+        resp = self.api_client.get(self.url + query)
+        self.assertEqual(resp.status_code, 200, resp.data)
+        return [row["views"] for row in resp.data["results"]]
+
+    def test_ranked_matches(self):
+        self.assertEqual(self.search("?q=fox&limit=10&offset=0"), [1, 3])
+        self.assertEqual(self.search("?q=dog&limit=10&offset=0"), [2, 1, 3])
+        self.assertEqual(self.search("?q=dog%20-fox&limit=10&offset=0"), [2])
+        self.assertEqual(self.search('?q="fox is"&limit=10&offset=0'), [3])
+        self.assertEqual(self.search("?q=dog&order_by=-views&limit=10&offset=0"), [3, 2, 1])
+        self.assertEqual(self.search("?q=dog&views__gt=1&limit=10&offset=0"), [2, 3])
+        self.assertEqual(self.search("?q=dog&after=0&order_by=id&limit=10"), [1, 2, 3])
+
+    def test_other_endpoints(self):
+        resp = self.api_client.get(self.url + "?q=fox&limit=10&offset=0", HTTP_ACCEPT=ColumnarJSONRenderer.media_type)
+        page = json.loads(resp.content)["results"]
+        views = page["columns"].index("views")
+        self.assertEqual([row[views] for row in page["rows"]], [1, 3])
+
+        resp = self.api_client.get(reverse("row-aggregate", kwargs={"table_id": self.table_id}) + "?q=dog&sum=views")
+        self.assertEqual(resp.data, [{"sum__views": 6}])
+
+        resp = self.api_client.patch(self.url + "?q=fox", {"views": 0}, format="json")
+        self.assertEqual(resp.data, {"updated": 2})
+        resp = self.api_client.delete(self.url + "?q=fox")
+        self.assertEqual(resp.data, {"deleted": 2})
+        self.assertEqual(sorted(self.table.objects.values_list("views", flat=True)), [2, 4])
+
+    def test_search_uses_index(self):
+        queryset = search_rows(self.table.objects.all(), {"q": "fox"})
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        self.assertIn(SEARCH_INDEX_PREFIX, queryset.explain())
+
+    def test_not_searchable(self):
+        schema = schema_factory()
+        table_id, _ = dynamic_table_factory(schema["name"], schema["fields"])
+        resp = self.api_client.get(reverse("row-list", kwargs={"table_id": table_id}) + "?q=fox")
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("q", resp.data)
+
+
+class TestRowAggregate(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        schema = schema_factory()
+        self.table_id, _ = dynamic_table_factory(schema["name"], schema["fields"])
+        rows = [
+            {"fnumber": 10, "fstring": "apple", "fbool": True},
+            {"fnumber": 20, "fstring": "apricot", "fbool": False},
+            {"fnumber": 30, "fstring": "banana", "fbool": True},
+            {"fnumber": None, "fstring": "cherry", "fbool": True},
+        ]
+        self.api_client.post(reverse("row-bulk-create", kwargs={"table_id": self.table_id}), rows, format="json")
+        self.url = reverse("row-aggregate", kwargs={"table_id": self.table_id})
+
+    def get_aggregates(self, query: str) -> list:
+        with self.assertNumQueries(1):
+            resp = self.api_client.get(self.url + query)
+        self.assertEqual(resp.status_code, 200, resp.data)
+        return resp.data
+
+    def test_aggregates(self):
+        self.assertEqual(
+            self.get_aggregates("?count=*,fnumber&sum=fnumber&avg=fnumber&min=fstring&max=fnumber"),
+            [
+                {
+                    "count": 4,
+                    "count__fnumber": 3,
+                    "sum__fnumber": 60,
+                    "avg__fnumber": 20.0,
+                    "min__fstring": "apple",
+                    "max__fnumber": 30,
+                }
+            ],
+        )
+
+    def test_group_by_with_filters(self):
+        self.assertEqual(
+            self.get_aggregates("?group_by=fbool&count=*&sum=fnumber"),
+            [
+                {"fbool": False, "count": 1, "sum__fnumber": 20},
+                {"fbool": True, "count": 3, "sum__fnumber": 40},
+            ],
+        )
+        self.assertEqual(
+            self.get_aggregates("?group_by=fbool&count=*&fstring__startswith=a"),
+            [{"fbool": False, "count": 1}, {"fbool": True, "count": 1}],
+        )
+        self.assertEqual(self.get_aggregates("?sum=fnumber&fnumber__gt=100"), [{"sum__fnumber": None}])
+
+    def test_bad_aggregates(self):
+        for query, param in (
+            ("", "non_field_errors"),
+            ("?sum=fstring", "sum"),
+            ("?avg=fbool", "avg"),
+            ("?max=fbool", "max"),
+            ("?count=missing", "count"),
+            ("?group_by=missing&count=*", "group_by"),
+            ("?count=*&missing=1", "missing"),
+        ):
+            resp = self.api_client.get(self.url + query)
+            self.assertEqual(resp.status_code, 400, query)
+            self.assertIn(param, resp.data if isinstance(resp.data, dict) else {"non_field_errors": resp.data})
+
+    @override_settings(DATALEX_AGGREGATE_MAX_GROUPS=2)
+    def test_too_many_groups(self):
+        resp = self.api_client.get(self.url + "?group_by=fstring&count=*")
+        self.assertEqual(resp.status_code, 400)
+
+
+class TestRowExport(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        schema = schema_factory()
+        self.table_id, _ = dynamic_table_factory(schema["name"], schema["fields"])
+        self.rows = [
+            {"fnumber": 1, "fstring": "first, with comma", "fbool": True},
+            {"fnumber": 2, "fstring": "second", "fbool": False},
+        ]
+        self.api_client.post(reverse("row-bulk-create", kwargs={"table_id": self.table_id}), self.rows, format="json")
+        self.url = reverse("row-export", kwargs={"table_id": self.table_id})
+
+    def test_no_schema_with_this_id(self):
+        resp = self.api_client.get(reverse("row-export", kwargs={"table_id": 132}))
+        self.assertEqual(resp.status_code, 404)
+
+    def test_ndjson(self):
+        resp = self.api_client.get(self.url + "?format=ndjson")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["Content-Type"], "application/x-ndjson")
+        lines = b"".join(resp.streaming_content).decode().splitlines()
+        exported = [json.loads(line) for line in lines]
+        self.assertEqual([{k: v for k, v in row.items() if k != "id"} for row in exported], self.rows)
+
+    def test_csv(self):
+        resp = self.api_client.get(self.url, HTTP_ACCEPT="text/csv")
+        self.assertEqual(resp.status_code, 200)
+        lines = b"".join(resp.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], "id,fnumber,fstring,fbool")
+        self.assertTrue(lines[1].endswith(',1,"first, with comma",True'))
+        self.assertEqual(len(lines), 3)
+
+    def test_unknown_format(self):
+        resp = self.api_client.get(self.url + "?format=xml")
+        self.assertEqual(resp.status_code, 404)
+
+
+@skipUnless(pyarrow, "pyarrow is not installed")
+class TestColumnarFormats(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        schema = schema_factory()
+        self.table_id, self.table = dynamic_table_factory(schema["name"], schema["fields"])
+        self.rows = [{"fnumber": i, "fstring": f"row {i}", "fbool": i % 2 == 0} for i in range(25)]
+        self.rows.append({"fnumber": None, "fstring": None, "fbool": None})
+        self.table.objects.bulk_create([self.table(**row) for row in self.rows])
+        self.export_url = reverse("row-export", kwargs={"table_id": self.table_id})
+        self.import_url = reverse("row-bulk-create", kwargs={"table_id": self.table_id})
+
+    def export(self, export_format: str) -> bytes:
+        with override_settings(DATALEX_RECORD_BATCH_SIZE=10):
+            resp = self.api_client.get(f"{self.export_url}?format={export_format}&fields=fnumber,fstring,fbool")
+            self.assertEqual(resp.status_code, 200)
+            return b"".join(resp.streaming_content)
+
+    def test_arrow_round_trip(self):
+        data = self.export("arrow")
+        reader = pyarrow.ipc.open_stream(data)
+        self.assertEqual([str(field.type) for field in reader.schema], ["int32", "string", "bool"])
+        batches = list(reader)
+        self.assertEqual([batch.num_rows for batch in batches], [10, 10, 6])
+        self.assertEqual(sorted(pyarrow.Table.from_batches(batches).to_pylist(), key=repr), sorted(self.rows, key=repr))
+
+        resp = self.api_client.post(self.import_url, data, content_type="application/vnd.apache.arrow.stream")
+        self.assertEqual(resp.status_code, 201, resp.data)
+        self.assertEqual(resp.data["created"], 26)
+        self.assertEqual(self.table.objects.count(), 52)
+
+    def test_parquet_round_trip(self):
+        data = self.export("parquet")
+        parquet_file = pyarrow.parquet.ParquetFile(BytesIO(data))
+        self.assertEqual(parquet_file.metadata.num_row_groups, 3)
+        self.assertEqual(sorted(parquet_file.read().to_pylist(), key=repr), sorted(self.rows, key=repr))
+
+        self.table.objects.all().delete()
+        resp = self.api_client.post(self.import_url, data, content_type="application/vnd.apache.parquet")
+        self.assertEqual(resp.status_code, 201, resp.data)
+        self.assertEqual(
+            sorted(self.table.objects.values("fnumber", "fstring", "fbool"), key=repr), sorted(self.rows, key=repr)
+        )
+
+    def test_bad_import(self):
+        resp = self.api_client.post(self.import_url, b"not arrow", content_type="application/vnd.apache.parquet")
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("Arrow parse error", resp.data["errors"][0]["errors"]["non_field_errors"][0])
+
+        sink = BytesIO()
+        with pyarrow.ipc.new_stream(sink, pyarrow.schema([("fnumber", pyarrow.string())])) as writer:
+            writer.write_batch(pyarrow.record_batch([pyarrow.array(["1", "x"])], names=["fnumber"]))
+        resp = self.api_client.post(
+            self.import_url, sink.getvalue(), content_type="application/vnd.apache.arrow.stream"
+        )
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual([error["index"] for error in resp.data["errors"]], [0, 1])
+
+
+class TestColumnarJSON(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        schema = schema_factory()
+        self.table_id, self.table = dynamic_table_factory(schema["name"], schema["fields"])
+        self.table.objects.bulk_create([self.table(fnumber=i, fstring=f"s{i}", fbool=i % 2 == 0) for i in range(5)])
+        self.ids = list(self.table.objects.order_by("id").values_list("id", flat=True))
+        self.url = reverse("row-list", kwargs={"table_id": self.table_id})
+
+    def get_columnar(self, query: str = "") -> dict:
+        resp = self.api_client.get(f"{self.url}?{query}", HTTP_ACCEPT=ColumnarJSONRenderer.media_type)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["Content-Type"], ColumnarJSONRenderer.media_type)
+        return json.loads(resp.content)
+
+    def test_columnar_list(self):
+        data = self.get_columnar("fnumber__lt=2")
+        self.assertEqual(data["columns"], ["id", "fnumber", "fstring", "fbool"])
+        self.assertEqual(data["rows"], [[self.ids[0], 0, "s0", True], [self.ids[1], 1, "s1", False]])
+
+        data = self.get_columnar("limit=2&offset=1&fields=fstring")
+        self.assertEqual(data["count"], 5)
+        self.assertEqual(data["results"], {"columns": ["fstring"], "rows": [["s1"], ["s2"]]})
+
+    def test_columnar_keyset_pages(self):
+        rows, query = [], "after=0&limit=2&fields=fnumber"
+        while query is not None:
+            data = self.get_columnar(query)
+            self.assertEqual(data["results"]["columns"], ["fnumber"])
+            rows.extend(data["results"]["rows"])
+            query = data["next"].partition("?")[2] if data["next"] else None
+        self.assertEqual(rows, [[i] for i in range(5)])
+
+    def test_same_rows_as_json(self):
+        json_rows = self.api_client.get(f"{self.url}?after=0&limit=10").data["results"]
+        data = self.get_columnar("after=0&limit=10")
+        self.assertEqual([dict(zip(data["results"]["columns"], row)) for row in data["results"]["rows"]], json_rows)
+
+
+@override_settings(DATALEX_COMPRESSION_MIN_SIZE=100)
+class TestCompression(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        schema = schema_factory()
+        self.table_id, self.table = dynamic_table_factory(schema["name"], schema["fields"])
+        self.table.objects.bulk_create([self.table(fnumber=i, fstring="x" * 50, fbool=True) for i in range(50)])
+        self.url = reverse("row-list", kwargs={"table_id": self.table_id})
+
+    def test_gzip(self):
+        plain = self.api_client.get(self.url)
+        resp = self.api_client.get(self.url, HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(resp["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", resp["Vary"])
+        self.assertLess(len(resp.content), len(plain.content))
+        self.assertEqual(gzip.decompress(resp.content), plain.content)
+
+    @skipUnless(zstandard, "zstandard is not installed")
+    def test_zstd(self):
+        plain = self.api_client.get(self.url)
+        resp = self.api_client.get(self.url, HTTP_ACCEPT_ENCODING="gzip, zstd")
+        self.assertEqual(resp["Content-Encoding"], "zstd")
+        self.assertEqual(zstandard.ZstdDecompressor().decompressobj().decompress(resp.content), plain.content)
+
+        resp = self.client.get(reverse("row-export", kwargs={"table_id": self.table_id}), HTTP_ACCEPT_ENCODING="zstd")
+        self.assertEqual(resp["Content-Encoding"], "zstd")
+        content = zstandard.ZstdDecompressor().decompressobj().decompress(b"".join(resp.streaming_content))
+        self.assertEqual(len(content.splitlines()), 50)
+
+    def test_not_compressed(self):
+        self.assertNotIn("Content-Encoding", self.api_client.get(self.url, HTTP_ACCEPT_ENCODING="gzip;q=0"))
+        self.assertNotIn("Content-Encoding", self.api_client.get(self.url, HTTP_ACCEPT_ENCODING="br"))
+        with override_settings(DATALEX_COMPRESSION_MIN_SIZE=10**6):
+            self.assertNotIn("Content-Encoding", self.api_client.get(self.url, HTTP_ACCEPT_ENCODING="gzip"))
+
+    async def test_async_streaming(self):
+        async def chunks():
+            for i in range(100):
+                yield f"line {i}\n".encode()
+
+        async def get_response(request):
+            return StreamingHttpResponse(chunks())
+
+        middleware = CompressionMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        resp = await middleware(RequestFactory().get("/", HTTP_ACCEPT_ENCODING="gzip"))
+        self.assertEqual(resp["Content-Encoding"], "gzip")
+        content = b"".join([chunk async for chunk in resp.streaming_content])
+        self.assertEqual(gzip.decompress(content).splitlines()[-1], b"line 99")
+
+    @override_settings(DATALEX_ROW_LIST_CACHE="default")
+    def test_weak_etag(self):
+        resp = self.api_client.get(self.url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertTrue(resp["ETag"].startswith('W/"'))
+        resp = self.api_client.get(self.url, HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=resp["ETag"])
+        self.assertEqual(resp.status_code, 304)
+
+
+@override_settings(DATALEX_ROW_LIST_CACHE="default")
+class TestRowListCache(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.schema = schema_factory()
+        self.table_id, self.table = dynamic_table_factory(self.schema["name"], self.schema["fields"])
+        self.url = reverse("row-list", kwargs={"table_id": self.table_id}) + "?limit=10&offset=0"
+        self.create_row(1)
+
+    def create_row(self, fnumber: int):
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.api_client.post(
+                reverse("row-create", kwargs={"table_id": self.table_id}),
+                {"fnumber": fnumber, "fstring": "row", "fbool": True},
+                format="json",
+            )
+        self.assertEqual(resp.status_code, 201)
+
+    def test_cached_until_rows_change(self):
+        resp = self.api_client.get(self.url)
+        self.assertEqual(resp.data["count"], 1)
+        etag = resp["ETag"]
+        with self.assertNumQueries(0):
+            resp = self.api_client.get(self.url)
+        self.assertEqual(resp["ETag"], etag)
+        self.assertEqual(resp.data["count"], 1)
+        self.assertNotEqual(self.api_client.get(self.url + "&fbool=true")["ETag"], etag)
+
+        self.create_row(2)
+        resp = self.api_client.get(self.url)
+        self.assertNotEqual(resp["ETag"], etag)
+        self.assertEqual(resp.data["count"], 2)
+
+    def test_not_modified(self):
+        etag = self.api_client.get(self.url)["ETag"]
+        with self.assertNumQueries(0):
+            resp = self.api_client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp.content, b"")
+        self.assertEqual(resp["ETag"], etag)
+
+        self.create_row(2)
+        resp = self.api_client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data["count"], 2)
+
+    def test_schema_change_invalidates(self):
+        etag = self.api_client.get(self.url)["ETag"]
+        self.schema["fields"].append({"name": "fextra", "field_type": "number"})
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.api_client.put(
+                reverse("table-update", kwargs={"pk": self.table_id}), self.schema, format="json"
+            )
+        self.assertEqual(resp.status_code, 200)
+        resp = self.api_client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn("fextra", resp.data["results"][0])
+
+    def test_kept_when_the_model_is_rebuilt(self):
+        etag = self.api_client.get(self.url)["ETag"]
+        repo = dynamic_table_repo_factory()
+        with self.captureOnCommitCallbacks(execute=True):
+            repo.refresh_from_db(self.table_id)
+        resp = self.api_client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+
+    @override_settings(DATALEX_ROW_LIST_CACHE=None)
+    def test_disabled(self):
+        resp = self.api_client.get(self.url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotIn("ETag", resp)
+
+
+class TestSerializerClassCache(ApiTestCase):
+    def test_reused_until_schema_changes(self):
+        schema = schema_factory()
+        table_id, _ = dynamic_table_factory(schema["name"], schema["fields"])
+        payload = {"fnumber": 1, "fstring": "value", "fbool": True}
+        url = reverse("row-list", kwargs={"table_id": table_id})
+
+        self.api_client.get(url)
+        hits, misses = serializer_class_cache.hits, serializer_class_cache.misses
+        self.api_client.get(url)
+        self.api_client.get(url)
+        self.assertEqual(serializer_class_cache.hits, hits + 2)
+        self.assertEqual(serializer_class_cache.misses, misses)
+
+        self.api_client.post(reverse("row-create", kwargs={"table_id": table_id}), payload, format="json")
+        self.assertIn(table_id, row_validator_cache.validators)
+        schema["fields"].append({"name": "fextra", "field_type": "number"})
+        resp = self.api_client.put(reverse("table-update", kwargs={"pk": table_id}), schema, format="json")
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotIn(table_id, serializer_class_cache.classes)
+        self.assertNotIn(table_id, row_validator_cache.validators)
+        resp = self.api_client.post(
+            reverse("row-create", kwargs={"table_id": table_id}), {**payload, "fextra": 5}, format="json"
+        )
+        self.assertEqual(resp.status_code, 201)
+        self.api_client.get(url)
+        self.assertEqual(serializer_class_cache.misses, misses + 1)
+
+
+class TestRowValidator(ApiTestCase):
+    VALUES: List[Any] = [
+        None,
+        "",
+        " ",
+        " x ",
+        "1",
+        "1.0",
+        "1.5",
+        "1_000",
+        0,
+        1,
+        1.0,
+        1.5,
+        True,
+        False,
+        [],
+        {},
+        "true",
+        "off",
+        "null",
+        "y" * 255,
+        "y" * 256,
+        "\x00",
+        "a\ud800",
+        "9" * 1001,
+        2**31 - 1,
+        2**31,
+        -(2**31) - 1,
+    ]
+
+    def test_same_rules_as_the_model_serializer(self):
+        model = get_dynamic_table_model("validated", schema_factory()["fields"])
+        serializer_class = model_serializer_class_factory(model)
+        validator = RowValidator.for_model(model)
+        missing = object()
+        valid_row = {"fnumber": 1, "fstring": "a", "fbool": True}
+        rows = [
+            {**{k: v for k, v in valid_row.items() if k != column}, **({} if value is missing else {column: value})}
+            for column in valid_row
+            for value in self.VALUES + [missing]
+        ]
+        rows += [dict(zip(valid_row, values)) for values in itertools.product(self.VALUES[:8], repeat=3)]
+        rows += [QueryDict("fnumber=&fstring=&fbool="), QueryDict("fnumber=1&fstring=a"), None, [], "row"]
+        for row in rows:
+            serializer = serializer_class(data=row)
+            expected = (serializer.validated_data, None) if serializer.is_valid() else (None, serializer.errors)
+            self.assertEqual(validator.check(row), expected, row)
+
+    def test_create_errors(self):
+        schema = schema_factory()
+        table_id, _ = dynamic_table_factory(schema["name"], schema["fields"])
+        url = reverse("row-create", kwargs={"table_id": table_id})
+        resp = self.api_client.post(url, {"fnumber": 2**31, "fstring": "x" * 256}, format="json")
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(
+            resp.json(),
+            {
+                "fnumber": ["Ensure this value is less than or equal to 2147483647."],
+                "fstring": ["Ensure this field has no more than 255 characters."],
+                "fbool": ["This field is required."],
+            },
+        )
+
+
+class TestAsyncRowEndpoints(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        schema = schema_factory()
+        self.table_id, self.table = dynamic_table_factory(schema["name"], schema["fields"])
+
+    async def test_create(self):
+        url = reverse("row-create-async", kwargs={"table_id": self.table_id})
+        payload = {"fnumber": 1, "fstring": "one", "fbool": True}
+        resp = await self.async_client.post(url, payload, content_type="application/json")
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(resp.json(), {"id": resp.json()["id"], **payload})
+        self.assertEqual(await self.table.objects.acount(), 1)
+
+        resp = await self.async_client.post(url, {"fnumber": "one"}, content_type="application/json")
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(set(resp.json()), {"fnumber", "fstring", "fbool"})
+        resp = await self.async_client.post(url, "{", content_type="application/json")
+        self.assertEqual(resp.status_code, 400)
+        resp = await self.async_client.post(reverse("row-create-async", kwargs={"table_id": 132}), payload)
+        self.assertEqual(resp.status_code, 404)
+        self.assertIn("detail", resp.json())
+
+    async def test_upsert(self):
+        table_id, table = await sync_to_async(dynamic_table_factory)(
+            "async_upserted",
+            [{"name": "key", "field_type": "string", "natural_key": True}, {"name": "value", "field_type": "number"}],
+        )
+        url = reverse("row-create-async", kwargs={"table_id": table_id})
+        resp = await self.async_client.post(url + "?on_conflict=update", {"key": "a", "value": 1}, "application/json")
+        self.assertEqual(resp.status_code, 201)
+        row_id = resp.json()["id"]
+        resp = await self.async_client.post(url + "?on_conflict=update", {"key": "a", "value": 2}, "application/json")
+        self.assertEqual((resp.status_code, resp.json()), (200, {"id": row_id, "key": "a", "value": 2}))
+        resp = await self.async_client.post(url + "?on_conflict=ignore", {"key": "a", "value": 3}, "application/json")
+        self.assertEqual((resp.status_code, resp.json()), (200, {"id": row_id, "key": "a", "value": 2}))
+        self.assertEqual(await table.objects.acount(), 1)
+
+        resp = await self.async_client.post(url + "?on_conflict=merge", {"key": "a", "value": 3}, "application/json")
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("on_conflict", resp.json())
+        url = reverse("row-create-async", kwargs={"table_id": self.table_id})
+        payload = {"fnumber": 1, "fstring": "one", "fbool": True}
+        resp = await self.async_client.post(url + "?on_conflict=update", payload, "application/json")
+        self.assertEqual(resp.status_code, 400)
+
+    async def test_list(self):
+        await self.table.objects.abulk_create(
+            [self.table(fnumber=i, fstring=f"row {i}", fbool=i % 2 == 0) for i in range(5)]
+        )
+        ids = [pk async for pk in self.table.objects.order_by("id").values_list("id", flat=True)]
+        url = reverse("row-list-async", kwargs={"table_id": self.table_id})
+
+        resp = await self.async_client.get(url, {"limit": 2})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([r["id"] for r in resp.json()["results"]], ids[:2])
+        resp = await self.async_client.get(resp.json()["next"])
+        self.assertEqual([r["id"] for r in resp.json()["results"]], ids[2:4])
+
+        resp = await self.async_client.get(url, {"after": ids[0], "fbool": "true", "fields": "fnumber"})
+        self.assertEqual(resp.json(), {"next": None, "results": [{"fnumber": 2}, {"fnumber": 4}]})
+
+        for params in ({"limit": 0}, {"after": "abc"}, {"order_by": "-fnumber"}, {"unknown": 1}):
+            resp = await self.async_client.get(url, params)
+            self.assertEqual(resp.status_code, 400, params)
+
+
+class TestBenchmarkCommand(ApiTestCase):
+    def run_benchmark(self, *args) -> dict:
+        with tempfile.NamedTemporaryFile("r", suffix=".json") as output:
+            call_command(
+                "benchmark",
+                "--repeat=1",
+                "--tables=10",
+                "--rows=50",
+                "--output",
+                output.name,
+                *args,
+                stdout=StringIO(),
+            )
+            return json.load(output)
+
+    def test_results_and_baseline(self):
+        report = self.run_benchmark()
+        self.assertEqual(report["meta"]["vendor"], connection.vendor)
+        self.assertIn("init_repo[10]", report["results"])
+        self.assertIn("row_list[keyset,depth=0.99]", report["results"])
+        self.assertGreater(report["results"]["row_insert[single]"]["median_ms"], 0)
+
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as baseline:
+            fast = {
+                name: {**result, "median_ms": result["median_ms"] / 100} for name, result in report["results"].items()
+            }
+            json.dump({"results": fast}, baseline)
+            baseline.flush()
+            with self.assertRaisesMessage(CommandError, "get_dynamic_table_model"):
+                self.run_benchmark("--only", "get_dynamic_table_model", "--baseline", baseline.name)
+
+
+class TestInstrumentation(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        schema = schema_factory()
+        self.table_id, self.table = dynamic_table_factory(schema["name"], schema["fields"])
+        self.row = {"fnumber": 1, "fstring": "one", "fbool": True}
+
+    def test_metrics(self):
+        self.api_client.post(reverse("row-create", kwargs={"table_id": self.table_id}), self.row, format="json")
+        self.api_client.get(reverse("row-list", kwargs={"table_id": self.table_id}))
+
+        resp = self.client.get(reverse("metrics"))
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp["Content-Type"].startswith("text/plain; version=0.0.4"))
+        body = resp.content.decode()
+        labels = f'endpoint="row-create",table_id="{self.table_id}"'
+        self.assertIn(f'datalex_requests_total{{{labels},method="POST",status="201"}} 1', body)
+        self.assertIn(f"datalex_request_duration_seconds_count{{{labels}}} 1", body)
+        for stage in ("schema_lookup", "validation", "sql", "render"):
+            self.assertIn(f'datalex_stage_duration_seconds_count{{{labels},stage="{stage}"}} 1', body)
+        self.assertIn(f"datalex_sql_queries_total{{{labels}}}", body)
+        self.assertIn("# TYPE datalex_model_cache_hits_total counter", body)
+        self.assertIn("# TYPE datalex_serializer_cache_size gauge", body)
+
+    def test_unknown_tables_are_not_labeled(self):
+        url = reverse("row-list", kwargs={"table_id": 987654})
+        self.assertEqual(self.api_client.get(url).status_code, 404)
+        body = self.client.get(reverse("metrics")).content.decode()
+        self.assertNotIn('table_id="987654"', body)
+        self.assertIn('datalex_requests_total{endpoint="row-list",table_id="",method="GET",status="404"}', body)
+
+    async def test_async_views_are_not_adapted(self):
+        async def get_response(request):
+            return HttpResponse()
+
+        self.assertTrue(iscoroutinefunction(InstrumentationMiddleware(get_response)))
+        self.assertTrue(iscoroutinefunction(CompressionMiddleware(get_response)))
+
+        url = reverse("row-list-async", kwargs={"table_id": self.table_id})
+        resp = await self.async_client.get(url, {"limit": 1})
+        self.assertEqual(resp.status_code, 200)
+        body = (await self.async_client.get(reverse("metrics"))).content.decode()
+        labels = f'endpoint="row-list-async",table_id="{self.table_id}"'
+        self.assertIn(f'datalex_stage_duration_seconds_count{{{labels},stage="sql"}}', body)
+
+    def test_server_timing_is_opt_in(self):
+        url = reverse("row-list", kwargs={"table_id": self.table_id})
+        self.assertNotIn("Server-Timing", self.api_client.get(url))
+        with override_settings(DATALEX_SERVER_TIMING=True):
+            resp = self.api_client.get(url)
+        self.assertRegex(resp["Server-Timing"], r"schema_lookup;dur=[\d.]+, .*sql;dur=[\d.]+.*total;dur=[\d.]+$")
@@ -0,0 +1,86 @@
+"""
+Idempotent inserts into tables declaring a natural key: ``INSERT ... ON CONFLICT (<natural key>) DO UPDATE`` (the
+row sent last wins) or ``DO NOTHING`` (the stored row wins), so that producers may retry without duplicating rows.
+"""
+from enum import Enum
+from typing import Dict, List, Mapping, Optional, Tuple
+from django.db import connection, models
+from rest_framework.exceptions import ValidationError
+
+from apps.schema_manager.repositores import get_natural_key
+
+ON_CONFLICT_PARAM = "on_conflict"
+
+
+class ConflictAction(str, Enum):
+    update = "update"
+    ignore = "ignore"
+
+
+def get_conflict_action(params: Mapping, model: models.Model) -> Optional[ConflictAction]:
+    """The ``?on_conflict=update|ignore`` of an insert, None for a plain insert."""
+    value = params.get(ON_CONFLICT_PARAM)
+    if not value:
+        return None
+    try:
+        action = ConflictAction(value)
+    except ValueError:
+        choices = ", ".join(a.value for a in ConflictAction)
+        raise ValidationError({ON_CONFLICT_PARAM: f"Must be one of: {choices}."})
+    if not get_natural_key(model):
+        raise ValidationError({ON_CONFLICT_PARAM: "The table has no natural key to detect conflicts with."})
+    return action
+
+
+def upsert_rows(model: models.Model, rows: List[dict], action: ConflictAction) -> Tuple[Dict[int, int], int]:
+    """
+    Upserts validated rows with a single statement. Returns the ids of the rows inserted or updated, by position
+    in ``rows``, and how many rows were inserted. Of rows sharing a key, only the last (update) or the first
+    (ignore) one is written.
+    """
+    natural_key = get_natural_key(model)
+    by_key: Dict[tuple, int] = {}
+    for position, row in enumerate(rows):
+        key = tuple(row[name] for name in natural_key)
+        if action == ConflictAction.update or key not in by_key:
+            by_key[key] = position
+    positions = sorted(by_key.values())
+    if not positions:
+        return {}, 0
+
+    quote_name = connection.ops.quote_name
+    columns = list(rows[0])
+    db_columns = [quote_name(model._meta.get_field(name).column) for name in columns]
+    key_columns = ", ".join(quote_name(model._meta.get_field(name).column) for name in natural_key)
+    updates = [f"{c} = EXCLUDED.{c}" for name, c in zip(columns, db_columns) if name not in natural_key]
+    if action == ConflictAction.update and updates:
+        conflict = f"ON CONFLICT ({key_columns}) DO UPDATE SET {', '.join(updates)}"
+    else:
+        conflict = f"ON CONFLICT ({key_columns}) DO NOTHING"
+    placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    # xmax is only set on a row version written by an update, it tells inserted rows from updated ones.
+    sql = (
+        f"INSERT INTO {quote_name(model._meta.db_table)} ({', '.join(db_columns)}) "
+        f"VALUES {', '.join([placeholders] * len(positions))} {conflict} "
+        f"RETURNING {quote_name(model._meta.pk.column)}, {key_columns}, xmax = 0"
+    )
+    params = [rows[position][name] for position in positions for name in columns]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        returned = cursor.fetchall()
+
+    ids, inserted = {}, 0
+    for pk, *key, is_insert in returned:
+        ids[by_key[tuple(key)]] = pk
+        inserted += is_insert
+    return ids, inserted
+
+
+def upsert_row(model: models.Model, row: dict, action: ConflictAction) -> Tuple[dict, bool]:
+    """Upserts a validated row, returns the stored row and whether it was inserted."""
+    ids, inserted = upsert_rows(model, [row], action)
+    if 0 not in ids:
+        # Ignored on conflict: the stored row is returned instead.
+        stored = model.objects.filter(**{name: row[name] for name in get_natural_key(model)}).values().get()
+        return stored, False
+    return {"id": ids[0], **row}, bool(inserted)
@@ -0,0 +1,195 @@
+"""
+Compiled row validators. A row is a flat dict checked against the ``string``/``number``/``boolean`` columns of its
+table, so instead of running it through a generated ``ModelSerializer`` (field binding, validator chains, model
+instance) every column gets a plain function applying the very same rules and messages as the DRF field the
+serializer would have built for it. The validated dict is passed straight to the insert.
+"""
+from collections.abc import Mapping
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from django.db import models
+from django.dispatch import receiver
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.settings import api_settings
+from rest_framework.utils import html
+
+from apps.schema_manager.models import FieldType
+from apps.schema_manager.repositores import CHARFIELD_MAX_LENGHT, get_field_type_for_model_field, get_natural_key
+from apps.schema_manager.signals import dynamic_table_changed, dynamic_table_evicted
+from .serializers import get_model_fingerprint
+
+# Bounds of the Postgres integer column backing a number field.
+INTEGER_MIN_VALUE = -2147483648
+INTEGER_MAX_VALUE = 2147483647
+
+MISSING = object()
+REQUIRED_MESSAGE = serializers.Field.default_error_messages["required"]
+NULL_MESSAGE = serializers.Field.default_error_messages["null"]
+NOT_A_DICT_MESSAGE = serializers.Serializer.default_error_messages["invalid"]
+NO_DATA_MESSAGE = "No data provided"
+STRING_MESSAGES = serializers.CharField.default_error_messages
+INTEGER_MESSAGES = serializers.IntegerField.default_error_messages
+BOOLEAN_MESSAGES = serializers.BooleanField.default_error_messages
+NULL_CHARACTERS_MESSAGE = "Null characters are not allowed."
+SURROGATE_CHARACTERS_MESSAGE = "Surrogate characters are not allowed: U+{code_point:X}."
+
+
+class FieldError(Exception):
+    def __init__(self, messages: List[str]):
+        self.messages = messages
+
+
+def validate_string(value):
+    if value is None:
+        return None
+    if value == "" or str(value).strip() == "":
+        return ""
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        raise FieldError([STRING_MESSAGES["invalid"]])
+    value = str(value).strip()
+    errors = []
+    if len(value) > CHARFIELD_MAX_LENGHT:
+        errors.append(STRING_MESSAGES["max_length"].format(max_length=CHARFIELD_MAX_LENGHT))
+    if "\x00" in value:
+        errors.append(NULL_CHARACTERS_MESSAGE)
+    surrogate = next((ch for ch in value if 0xD800 <= ord(ch) <= 0xDFFF), None)
+    if surrogate is not None:
+        errors.append(SURROGATE_CHARACTERS_MESSAGE.format(code_point=ord(surrogate)))
+    if errors:
+        raise FieldError(errors)
+    return value
+
+
+def validate_number(value):
+    if value is None:
+        return None
+    if isinstance(value, str) and len(value) > serializers.IntegerField.MAX_STRING_LENGTH:
+        raise FieldError([INTEGER_MESSAGES["max_string_length"]])
+    try:
+        value = int(serializers.IntegerField.re_decimal.sub("", str(value)))
+    except (ValueError, TypeError):
+        raise FieldError([INTEGER_MESSAGES["invalid"]])
+    if value > INTEGER_MAX_VALUE:
+        raise FieldError([INTEGER_MESSAGES["max_value"].format(max_value=INTEGER_MAX_VALUE)])
+    if value < INTEGER_MIN_VALUE:
+        raise FieldError([INTEGER_MESSAGES["min_value"].format(min_value=INTEGER_MIN_VALUE)])
+    return value
+
+
+def validate_boolean(value):
+    try:
+        if value in serializers.BooleanField.TRUE_VALUES:
+            return True
+        if value in serializers.BooleanField.FALSE_VALUES:
+            return False
+        if value in serializers.BooleanField.NULL_VALUES:
+            return None
+    except TypeError:  # Unhashable input
+        pass
+    raise FieldError([BOOLEAN_MESSAGES["invalid"]])
+
+
+VALIDATORS: Dict[FieldType, Callable] = {
+    FieldType.string: validate_string,
+    FieldType.number: validate_number,
+    FieldType.boolean: validate_boolean,
+}
+# What a form encoded request means by a missing column, booleans being unchecked checkboxes.
+EMPTY_HTML_VALUES = {FieldType.string: MISSING, FieldType.number: MISSING, FieldType.boolean: False}
+
+
+class RowValidator:
+    def __init__(self, field_types: Dict[str, FieldType], natural_key: Sequence[str] = ()):
+        self.columns: List[Tuple[str, FieldType, Callable]] = [
+            (name, field_type, VALIDATORS[field_type]) for name, field_type in field_types.items()
+        ]
+        # Nulls never conflict in a unique index, a row with a null key could not be upserted.
+        self.not_null = set(natural_key)
+
+    @classmethod
+    def for_model(cls, model: models.Model) -> "RowValidator":
+        return cls(
+            {f.name: get_field_type_for_model_field(f) for f in model._meta.concrete_fields if not f.primary_key},
+            get_natural_key(model),
+        )
+
+    def check(self, data) -> Tuple[Optional[dict], Optional[dict]]:
+        """Returns either the validated row or the errors, shaped like ``serializer.errors``."""
+        if data is None:
+            return None, {api_settings.NON_FIELD_ERRORS_KEY: [NO_DATA_MESSAGE]}
+        if not isinstance(data, Mapping):
+            message = NOT_A_DICT_MESSAGE.format(datatype=type(data).__name__)
+            return None, {api_settings.NON_FIELD_ERRORS_KEY: [message]}
+
+        is_html_input = html.is_html_input(data)
+        validated, errors = {}, {}
+        for name, field_type, validate in self.columns:
+            if is_html_input:
+                value = data[name] if name in data else EMPTY_HTML_VALUES[field_type]
+                if value == "" and field_type != FieldType.string:
+                    value = None
+            else:
+                value = data.get(name, MISSING)
+            if value is MISSING:
+                errors[name] = [REQUIRED_MESSAGE]
+                continue
+            try:
+                validated[name] = validate(value)
+            except FieldError as exc:
+                errors[name] = exc.messages
+                continue
+            if validated[name] is None and name in self.not_null:
+                errors[name] = [NULL_MESSAGE]
+        if errors:
+            return None, errors
+        return validated, None
+
+    def validate(self, data) -> dict:
+        validated, errors = self.check(data)
+        if validated is None:
+            raise ValidationError(errors)
+        return validated
+
+    def validate_partial(self, data) -> dict:
+        """Validates the columns present in ``data`` only, e.g. the assignments of an update. None may be unknown."""
+        if not isinstance(data, Mapping) or not data:
+            raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: ["Expected a JSON object of column values."]})
+        columns = {name: validate for name, _, validate in self.columns}
+        validated, errors = {}, {}
+        for name, value in data.items():
+            if name not in columns:
+                errors[name] = [f"Unknown field '{name}'."]
+                continue
+            try:
+                validated[name] = columns[name](value)
+            except FieldError as exc:
+                errors[name] = exc.messages
+                continue
+            if validated[name] is None and name in self.not_null:
+                errors[name] = [NULL_MESSAGE]
+        if errors:
+            raise ValidationError(errors)
+        return validated
+
+
+class RowValidatorCache:
+    def __init__(self):
+        self.validators: Dict[int, Tuple[tuple, RowValidator]] = {}
+
+    def get(self, table_id: int, model: models.Model) -> RowValidator:
+        fingerprint = get_model_fingerprint(model)
+        cached = self.validators.get(table_id)
+        if cached is None or cached[0] != fingerprint:
+            cached = self.validators[table_id] = (fingerprint, RowValidator.for_model(model))
+        return cached[1]
+
+    def invalidate(self, table_id: int):
+        self.validators.pop(table_id, None)
+
+
+row_validator_cache = RowValidatorCache()
+
+
+@receiver([dynamic_table_changed, dynamic_table_evicted])
+def invalidate_row_validator(sender, table_id: int, **kwargs):
+    row_validator_cache.invalidate(table_id)
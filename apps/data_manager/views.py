@@ -1,29 +1,215 @@
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List
 from rest_framework import generics, mixins, status
 from rest_framework.response import Response
-from rest_framework.exceptions import NotFound
-from django.db import models
+from rest_framework.exceptions import APIException, NotFound, ParseError, Throttled, ValidationError
+from rest_framework.parsers import JSONParser
+from rest_framework.settings import api_settings
+from django.conf import settings
+from django.db import DatabaseError, DataError, IntegrityError, connection, models, transaction
+from django.db.models.expressions import RawSQL
+from django.http import StreamingHttpResponse
+from django.urls import reverse
+from django.utils.http import parse_etags
 
-from apps.schema_manager.repositores import dynamic_table_repo_factory
-from .serializers import model_serializer_class_factory
+from apps.schema_manager.changes import get_change_watermark, is_change_tracking_supported
+from apps.schema_manager.models import CHANGE_COLUMN, DynamicTable, RowTombstone
+from apps.schema_manager.partitions import ensure_partitions_ahead
+from apps.schema_manager.repositores import dynamic_table_repo_factory, get_field_type_for_model_field
+from datalex.instrumentation import timed
+from .aggregates import get_row_aggregates
+from .cache import get_row_list_cache, get_row_list_cache_key, rows_changed
+from .filters import (
+    ALL_ROWS_PARAM,
+    SEARCH_PARAM,
+    RowFilterBackend,
+    get_row_filter_lookups,
+    get_row_projection,
+    search_rows,
+)
+from .ingest import IngestQueueFull, IngestStatus, RESPOND_ASYNC, get_ingest_status, ingest_buffer, prefers_async
+from .pagination import RowCursorPagination
+from .parsers import COLUMNAR_PARSERS, NDJSONParser
+from .renderers import COLUMNAR_RENDERERS, ChangeFeedRenderer, ColumnarJSONRenderer, CSVRenderer, NDJSONRenderer
+from .serializers import serializer_class_cache
+from .upserts import ConflictAction, get_conflict_action, upsert_row, upsert_rows
+from .validators import row_validator_cache
+
+SINCE_PARAM = "since"
 
 
 class RowCreateView(mixins.CreateModelMixin, generics.GenericAPIView):
     def post(self, request, table_id: int):
         model = find_table_or_404(table_id)
+        action = get_conflict_action(request.query_params, model)
+
+        with timed("validation"):
+            row = row_validator_cache.get(table_id, model).validate(request.data)
+        if prefers_async(request):
+            return self.create_later(table_id, row, action)
+        try:
+            with transaction.atomic():
+                if action is None:
+                    instance = model.objects.create(**row)
+                    data, created = {"id": instance.pk, **row}, True
+                else:
+                    data, created = upsert_row(model, row, action)
+                    instance = model(**data)
+                rows_changed(table_id)
+                ensure_partitions_ahead(table_id, model, [instance])
+        except (IntegrityError, DataError) as exc:
+            raise ValidationError(str(exc))
+        if not created:
+            return Response(data)
+        headers = self.get_success_headers(data)
+        return Response(data, status=status.HTTP_201_CREATED, headers=headers)
+
+    def create_later(self, table_id: int, row: dict, action):
+        if action is not None:
+            raise ValidationError("Upserts cannot be acknowledged before they are committed.")
+        try:
+            ingest_id = ingest_buffer.put(table_id, row)
+        except IngestQueueFull:
+            raise Throttled(wait=1, detail="Too many rows waiting to be written to the table, retry later.")
+        location = reverse("row-ingest", kwargs={"table_id": table_id, "ingest_id": ingest_id})
+        return Response(
+            {"ingest_id": ingest_id, "status": IngestStatus.pending.value},
+            status=status.HTTP_202_ACCEPTED,
+            headers={"Location": location, "Preference-Applied": RESPOND_ASYNC},
+        )
+
+
+class RowIngestView(generics.GenericAPIView):
+    def get(self, request, table_id: int, ingest_id: str):
+        find_table_or_404(table_id)
+        ingest = get_ingest_status(table_id, ingest_id)
+        if ingest is None:
+            raise NotFound()
+        return Response(ingest)
+
+
+class RowBulkCreateView(generics.GenericAPIView):
+    parser_classes = [JSONParser, NDJSONParser, *COLUMNAR_PARSERS]
+
+    def post(self, request, table_id: int):
+        model = find_table_or_404(table_id)
+        action = get_conflict_action(request.query_params, model)
+        validator = row_validator_cache.get(table_id, model)
+        batch_size = get_bulk_batch_size(request)
+        rows = request.data
+        if not isinstance(rows, Iterable) or isinstance(rows, (dict, str)):
+            raise ValidationError("Expected a JSON array or NDJSON stream of rows.")
+
+        created, not_created, errors = 0, 0, []
+        for batch in iter_batches(enumerate(rows), batch_size):
+            valid_rows, indexes = [], []
+            with timed("validation"):
+                for index, row in batch:
+                    if isinstance(row, ParseError):
+                        errors.append({"index": index, "errors": {"non_field_errors": [str(row.detail)]}})
+                        continue
+                    validated, row_errors = validator.check(row)
+                    if validated is None:
+                        errors.append({"index": index, "errors": row_errors})
+                        continue
+                    valid_rows.append(validated)
+                    indexes.append(index)
+            try:
+                with transaction.atomic():
+                    if action is None:
+                        instances = model.objects.bulk_create([model(**row) for row in valid_rows])
+                        inserted = len(instances)
+                    else:
+                        ids, inserted = upsert_rows(model, valid_rows, action)
+                        instances = [model(id=pk, **valid_rows[position]) for position, pk in ids.items()]
+                    rows_changed(table_id)
+                    ensure_partitions_ahead(table_id, model, instances)
+            except DatabaseError as exc:
+                errors.extend({"index": index, "errors": {"non_field_errors": [str(exc)]}} for index in indexes)
+                continue
+            created += inserted
+            not_created += len(valid_rows) - inserted
 
-        serializer = model_serializer_class_factory(model)(data=request.data)
-        serializer.is_valid(raise_exception=True)
-        self.perform_create(serializer)
-        headers = self.get_success_headers(serializer.data)
-        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+        if not errors:
+            response_status = status.HTTP_201_CREATED
+        elif created or not_created:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        data = {"created": created, "errors": errors}
+        if action is not None:
+            # Rows conflicting with a stored one (or another one of the request) were written over it, or skipped.
+            data["updated" if action == ConflictAction.update else "ignored"] = not_created
+        return Response(data, status=response_status)
 
 
 class RowListView(mixins.ListModelMixin, generics.GenericAPIView):
+    filter_backends = [RowFilterBackend]
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, ColumnarJSONRenderer]
+
+    @property
+    def pagination_class(self):
+        if RowCursorPagination.is_requested(self.request):
+            return RowCursorPagination
+        return api_settings.DEFAULT_PAGINATION_CLASS
+
     def get(self, request, table_id: int):
         return self.list(request, table_id)
 
+    def patch(self, request, table_id: int):
+        model = find_table_or_404(table_id)
+        with timed("validation"):
+            assignments = row_validator_cache.get(table_id, model).validate_partial(request.data)
+        return self.change_rows(table_id, model, "updated", lambda chunk: chunk.update(**assignments))
+
+    def delete(self, request, table_id: int):
+        model = find_table_or_404(table_id)
+        return self.change_rows(table_id, model, "deleted", lambda chunk: chunk.delete()[0])
+
+    def change_rows(
+        self, table_id: int, model: models.Model, result: str, change: Callable[[models.QuerySet], int]
+    ) -> Response:
+        """
+        Applies ``change`` to the rows matching the filters, chunk by chunk of ``DATALEX_ROW_CHANGE_CHUNK_SIZE``
+        rows, each in its own transaction, so that no statement holds row locks for long on a large table.
+        """
+        params = self.request.query_params
+        lookups = get_row_filter_lookups(params, model)
+        if not lookups and not params.get(SEARCH_PARAM) and params.get(ALL_ROWS_PARAM) not in ("1", "true"):
+            raise ValidationError(f"Filter the rows to change, or pass {ALL_ROWS_PARAM}=true to change all of them.")
+        queryset = search_rows(model.objects.filter(**lookups), params)
+        changed = 0
+        try:
+            for chunk in iter_id_range_chunks(queryset, settings.DATALEX_ROW_CHANGE_CHUNK_SIZE):
+                with transaction.atomic():
+                    changed += change(chunk)
+                    rows_changed(table_id)
+        except (IntegrityError, DataError) as exc:
+            # The chunks changed until then are kept.
+            return Response({result: changed, "error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({result: changed})
+
     def list(self, request, table_id: int):
+        find_table_or_404(table_id)
+        row_list_cache = get_row_list_cache()
+        cache_key = get_row_list_cache_key(request, table_id)
+        if row_list_cache is None or cache_key is None:
+            return self.list_rows(table_id)
+
+        key, etag = cache_key
+        # Weak comparison: the ETag of a compressed response is weakened by the compression middleware.
+        if etag in (e.removeprefix("W/") for e in parse_etags(request.headers.get("If-None-Match", ""))):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        data = row_list_cache.get(key)
+        if data is None:
+            data = self.list_rows(table_id).data
+            row_list_cache.set(key, data, timeout=settings.DATALEX_ROW_LIST_CACHE_TIMEOUT)
+        return Response(data, headers={"ETag": etag})
+
+    def list_rows(self, table_id: int) -> Response:
         queryset = self.filter_queryset(self.get_queryset(table_id))
+        if isinstance(self.request.accepted_renderer, ColumnarJSONRenderer):
+            return self.list_columnar_rows(queryset)
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = self.get_serializer(queryset.model, page, many=True)
@@ -32,6 +218,22 @@ class RowListView(mixins.ListModelMixin, generics.GenericAPIView):
         serializer = self.get_serializer(queryset.model, queryset, many=True)
         return Response(serializer.data)
 
+    def list_columnar_rows(self, queryset: models.QuerySet) -> Response:
+        """The page as ``values_list`` tuples, skipping model instances and serializers altogether."""
+        model = queryset.model
+        columns = get_row_projection(self.request.query_params, model) or [f.name for f in model._meta.concrete_fields]
+        # Keyset pages are positioned by the id of their rows, which comes first whenever it is fetched.
+        with_id = "id" not in columns and isinstance(self.paginator, RowCursorPagination)
+        rows = queryset.values_list(*(["id", *columns] if with_id else columns))
+        page = self.paginate_queryset(rows)
+        rows = page if page is not None else list(rows)
+        if with_id:
+            rows = [row[1:] for row in rows]
+        data = {"columns": columns, "rows": rows}
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
     def get_queryset(self, table_id: int):
         model = find_table_or_404(table_id)
         return model.objects.all()
@@ -42,11 +244,129 @@ class RowListView(mixins.ListModelMixin, generics.GenericAPIView):
         return serializer_class(page, *args, **kwargs)
 
     def get_serializer_class(self, model: models.Model):
-        return model_serializer_class_factory(model)
+        projection = get_row_projection(self.request.query_params, model)
+        return serializer_class_cache.get(self.kwargs["table_id"], model, projection)
+
+
+class RowAggregateView(generics.GenericAPIView):
+    """``?group_by=f1&count=*&sum=f2``, along with the usual filters, computed by a single GROUP BY query."""
+
+    def get(self, request, table_id: int):
+        model = find_table_or_404(table_id)
+        group_by, annotations = get_row_aggregates(request.query_params, model)
+        queryset = search_rows(
+            model.objects.filter(**get_row_filter_lookups(request.query_params, model)), request.query_params
+        )
+        if not group_by:
+            return Response([queryset.aggregate(**annotations)])
+
+        max_groups = settings.DATALEX_AGGREGATE_MAX_GROUPS
+        groups = list(queryset.values(*group_by).annotate(**annotations).order_by(*group_by)[: max_groups + 1])
+        if len(groups) > max_groups:
+            raise ValidationError({"group_by": f"More than {max_groups} groups, narrow the query down with filters."})
+        return Response(groups)
+
+
+class RowExportView(generics.GenericAPIView):
+    renderer_classes = [NDJSONRenderer, CSVRenderer, *COLUMNAR_RENDERERS]
+    filter_backends = [RowFilterBackend]
+
+    def get(self, request, table_id: int):
+        model = find_table_or_404(table_id)
+        columns = get_row_projection(request.query_params, model) or [f.name for f in model._meta.concrete_fields]
+        queryset = self.filter_queryset(model.objects.all())
+        rows = queryset.values_list(*columns).iterator(chunk_size=settings.DATALEX_EXPORT_CHUNK_SIZE)
+        field_types = [get_field_type_for_model_field(model._meta.get_field(c)) for c in columns]
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.render_rows(columns, rows, field_types), content_type=renderer.media_type
+        )
+        response["Content-Disposition"] = f'attachment; filename="{model._meta.db_table}.{renderer.format}"'
+        return response
+
+
+class RowChangesView(generics.GenericAPIView):
+    renderer_classes = [ChangeFeedRenderer]
+
+    def get(self, request, table_id: int):
+        model = find_table_or_404(table_id)
+        if not is_change_tracking_supported():
+            raise ValidationError("The change feed is only supported on PostgreSQL.")
+        since = request.query_params.get(SINCE_PARAM)
+        if since is not None:
+            try:
+                since = int(since)
+            except ValueError:
+                raise ValidationError({SINCE_PARAM: "A valid integer is required."})
+            pruned_upto = DynamicTable.objects.values_list("tombstones_pruned_upto", flat=True).get(pk=table_id)
+            if pruned_upto and since <= pruned_upto:
+                raise Gone()
+
+        # Taken before reading the changes, anything the reads below miss is newer than it.
+        watermark = get_change_watermark()
+        columns = [f.name for f in model._meta.concrete_fields]
+        rows = model.objects.all()
+        deleted_ids = RowTombstone.objects.none()
+        if since is not None:
+            quote_name = connection.ops.quote_name
+            change = RawSQL(
+                f"{quote_name(model._meta.db_table)}.{quote_name(CHANGE_COLUMN)}",
+                (),
+                output_field=models.BigIntegerField(),
+            )
+            rows = rows.alias(change=change).filter(change__gte=since)
+            deleted_ids = RowTombstone.objects.filter(table_id=table_id, change__gte=since)
+        renderer = request.accepted_renderer
+        return StreamingHttpResponse(
+            renderer.render_changes(
+                columns,
+                rows.values_list(*columns).iterator(chunk_size=settings.DATALEX_EXPORT_CHUNK_SIZE),
+                deleted_ids.values_list("row_id", flat=True).iterator(chunk_size=settings.DATALEX_EXPORT_CHUNK_SIZE),
+                watermark,
+            ),
+            content_type=renderer.media_type,
+        )
+
+
+class Gone(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = "Changes this old are not kept anymore, sync the table again from scratch."
+    default_code = "gone"
 
 
 def find_table_or_404(table_id):
     try:
-        return dynamic_table_repo_factory().get_by_id(table_id)
+        with timed("schema_lookup"):
+            return dynamic_table_repo_factory().get_by_id(table_id)
     except KeyError:
         raise NotFound(f"Cannot find table with ID '{table_id}'")
+
+
+def get_bulk_batch_size(request) -> int:
+    batch_size = request.query_params.get("batch_size", settings.DATALEX_BULK_BATCH_SIZE)
+    try:
+        batch_size = int(batch_size)
+    except (TypeError, ValueError):
+        raise ValidationError({"batch_size": "A valid integer is required."})
+    if not 0 < batch_size <= settings.DATALEX_BULK_MAX_BATCH_SIZE:
+        raise ValidationError({"batch_size": f"Must be between 1 and {settings.DATALEX_BULK_MAX_BATCH_SIZE}."})
+    return batch_size
+
+
+def iter_id_range_chunks(queryset: models.QuerySet, size: int) -> Iterator[models.QuerySet]:
+    """Splits the rows of ``queryset`` into consecutive ``id`` ranges holding at most ``size`` of them each."""
+    lower = None
+    while True:
+        remaining = queryset if lower is None else queryset.filter(id__gt=lower)
+        upper = list(remaining.order_by("id").values_list("id", flat=True)[size - 1 : size])
+        if not upper:
+            yield remaining
+            return
+        yield remaining.filter(id__lte=upper[0])
+        lower = upper[0]
+
+
+def iter_batches(iterable: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
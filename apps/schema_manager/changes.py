@@ -0,0 +1,70 @@
+"""
+Change tracking of dynamic tables, for mirrors to sync in time proportional to what changed. On PostgreSQL every
+table has a hidden ``CHANGE_COLUMN`` holding the id of the transaction which last inserted or updated the row, set by
+its default and an update trigger, and a statement trigger records the deleted rows as ``RowTombstone``.
+
+A watermark is the oldest transaction still running when a sync starts (``pg_snapshot_xmin``): every write the sync
+does not see was made by that transaction or a later one, so the next sync from the watermark cannot miss it, even
+though transactions commit in any order. Rows written by transactions which were running are sent again.
+"""
+from typing import List
+from django.db import connection
+from django.db.backends.utils import names_digest
+
+from .models import CHANGE_COLUMN, RowTombstone
+
+CHANGE_INDEX_PREFIX = "dlxchg_"
+CURRENT_CHANGE_SQL = "pg_current_xact_id()::text::bigint"
+
+CREATE_TRIGGER_FUNCTIONS_SQL = f"""
+CREATE OR REPLACE FUNCTION datalex_row_changed() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.{CHANGE_COLUMN} := {CURRENT_CHANGE_SQL};
+    RETURN NEW;
+END $$;
+CREATE OR REPLACE FUNCTION datalex_rows_deleted() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO {RowTombstone._meta.db_table} (table_id, row_id, change, deleted_at)
+    SELECT TG_ARGV[0]::integer, id, {CURRENT_CHANGE_SQL}, now() FROM deleted_rows;
+    RETURN NULL;
+END $$;
+"""
+# Drops the triggers using the functions too.
+DROP_TRIGGER_FUNCTIONS_SQL = (
+    "DROP FUNCTION datalex_row_changed() CASCADE; DROP FUNCTION datalex_rows_deleted() CASCADE;"
+)
+
+
+def get_change_tracking_sql(db_table: str, table_id: int, has_rows: bool = False) -> List[str]:
+    """
+    Statements adding change tracking to a table. Existing rows of ``has_rows`` tables get a change of 0 rather
+    than the volatile default, which would rewrite the table.
+    """
+    quote_name = connection.ops.quote_name
+    table, column = quote_name(db_table), quote_name(CHANGE_COLUMN)
+    index = quote_name(f"{CHANGE_INDEX_PREFIX}{names_digest(db_table, length=16)}")
+    if has_rows:
+        columns = [
+            f"ALTER TABLE {table} ADD COLUMN {column} bigint NOT NULL DEFAULT 0",
+            f"ALTER TABLE {table} ALTER COLUMN {column} SET DEFAULT {CURRENT_CHANGE_SQL}",
+        ]
+    else:
+        columns = [f"ALTER TABLE {table} ADD COLUMN {column} bigint NOT NULL DEFAULT {CURRENT_CHANGE_SQL}"]
+    return [
+        *columns,
+        f"CREATE INDEX {index} ON {table} ({column})",
+        f"CREATE TRIGGER datalex_row_changed BEFORE UPDATE ON {table} "
+        "FOR EACH ROW EXECUTE FUNCTION datalex_row_changed()",
+        f"CREATE TRIGGER datalex_rows_deleted AFTER DELETE ON {table} REFERENCING OLD TABLE AS deleted_rows "
+        f"FOR EACH STATEMENT EXECUTE FUNCTION datalex_rows_deleted('{table_id:d}')",
+    ]
+
+
+def is_change_tracking_supported() -> bool:
+    return connection.vendor == "postgresql"
+
+
+def get_change_watermark() -> int:
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+        return cursor.fetchone()[0]
@@ -0,0 +1,89 @@
+import gc
+import json
+import os
+import time
+import tracemalloc
+
+from typing import Callable
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.schema_manager.models import DynamicTable
+from apps.schema_manager.repositores import DynamicTableRepository
+
+
+def get_rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return 0
+
+
+def measure(startup: Callable[[], DynamicTableRepository]) -> dict:
+    gc.collect()
+    rss_before = get_rss_bytes()
+    tracemalloc.start()
+    started_at = time.perf_counter()
+    repo = startup()
+    elapsed = time.perf_counter() - started_at
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    result = {
+        "seconds": round(elapsed, 4),
+        "allocated_bytes": allocated,
+        "rss_delta_bytes": get_rss_bytes() - rss_before,
+        "models_built": len(repo.tables),
+    }
+    del repo
+    return result
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares repository cold start (time to serve the first table) with eager and lazy model loading. "
+        "Schema rows are created inside a transaction which is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tables", nargs="+", type=int, default=[100, 10000, 50000])
+        parser.add_argument(
+            "--eager-limit",
+            type=int,
+            default=50000,
+            help="Skip the eager measurement above this number of tables.",
+        )
+
+    def handle(self, *args, **options):
+        results = []
+        for tables_count in options["tables"]:
+            with transaction.atomic():
+                first_table = self.create_schemas(tables_count)
+                lazy = measure(lambda: self.lazy_startup(first_table.pk))
+                eager = None
+                if tables_count <= options["eager_limit"]:
+                    eager = measure(lambda: self.eager_startup(first_table.pk))
+                transaction.set_rollback(True)
+            results.append({"tables": tables_count, "lazy": lazy, "eager": eager})
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def create_schemas(self, tables_count: int) -> DynamicTable:
+        fields = [
+            {"name": f"f{i}", "field_type": field_type} for i, field_type in enumerate(("string", "number", "boolean"))
+        ]
+        DynamicTable.objects.bulk_create(
+            [DynamicTable(name=f"bench_startup_{tables_count}_{i}", fields=fields) for i in range(tables_count)],
+            batch_size=5000,
+        )
+        return DynamicTable.objects.get(name=f"bench_startup_{tables_count}_0")
+
+    def lazy_startup(self, table_id: int) -> DynamicTableRepository:
+        repo = DynamicTableRepository()
+        repo.get_by_id(table_id)
+        return repo
+
+    def eager_startup(self, table_id: int) -> DynamicTableRepository:
+        repo = DynamicTableRepository(max_tables=DynamicTable.objects.count())
+        repo.init_repo()
+        repo.get_by_id(table_id)
+        return repo
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from apps.schema_manager.models import DynamicTable, PartitionStrategy, Partitioning
+from apps.schema_manager.partitions import ensure_range_partitions, forget_range_upper_bound
+from apps.schema_manager.repositores import dynamic_table_repo_factory
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates the range partitions of every range partitioned table ahead of its highest value, as the row "
+        "writes do. Meant to be run periodically, so that writes rarely have to create partitions themselves."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--table", type=int, help="Only manage the table with this id.")
+
+    def handle(self, *args, **options):
+        schema_models = DynamicTable.objects.filter(partitioning__strategy=PartitionStrategy.range.value).order_by("id")
+        if options["table"] is not None:
+            schema_models = schema_models.filter(pk=options["table"])
+        for schema_model in schema_models:
+            partitioning = Partitioning(**schema_model.partitioning)
+            model = dynamic_table_repo_factory().get_by_id(schema_model.pk)
+            highest = model.objects.aggregate(highest=Max(partitioning.column))["highest"] or 0
+            upto = (highest // partitioning.range_interval + 1 + partitioning.premake) * partitioning.range_interval
+            created = ensure_range_partitions(model, partitioning, upto)
+            forget_range_upper_bound(schema_model.pk)
+            self.stdout.write(f"{schema_model.pk} {schema_model.name}: {len(created)} partition(s) created")
@@ -0,0 +1,28 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from apps.schema_manager.models import DynamicTable, RowTombstone
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes the tombstones of rows deleted more than --days ago. Mirrors syncing from before the pruned "
+        "tombstones get a 410 from the change feed and have to sync again from scratch."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=7, help="Keep the tombstones of the last days.")
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options["days"])
+        pruned = RowTombstone.objects.filter(deleted_at__lt=before).values("table_id").annotate(upto=Max("change"))
+        for table_id, upto in pruned.values_list("table_id", "upto"):
+            with transaction.atomic():
+                DynamicTable.objects.filter(pk=table_id, tombstones_pruned_upto__lt=upto).update(
+                    tombstones_pruned_upto=upto
+                )
+                deleted, _ = RowTombstone.objects.filter(table_id=table_id, change__lte=upto).delete()
+            self.stdout.write(f"{table_id}: {deleted} tombstone(s) pruned")
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from apps.schema_manager.models import SchemaMigrationJob
+from apps.schema_manager.online_migrations import run_schema_migration_job
+from apps.schema_manager.repositores import ACTIVE_MIGRATION_JOB_STATUSES
+
+
+class Command(BaseCommand):
+    help = "Runs, or resumes after a restart, the pending and interrupted online column migrations."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--job", type=int, help="Only run the job with this id.")
+
+    def handle(self, *args, **options):
+        jobs = SchemaMigrationJob.objects.filter(status__in=ACTIVE_MIGRATION_JOB_STATUSES).order_by("id")
+        if options["job"] is not None:
+            jobs = jobs.filter(pk=options["job"])
+        for job_id in jobs.values_list("id", flat=True):
+            job = run_schema_migration_job(job_id)
+            self.stdout.write(f"{job.pk} {job.table_id}.{job.field_name}: {job.status} {job.error}".rstrip())
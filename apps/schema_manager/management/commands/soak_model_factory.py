@@ -0,0 +1,46 @@
+import gc
+import json
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.schema_manager.repositores import DynamicTableRepository, get_dynamic_table_model
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the model of one table over and over, the way a schema update does, "
+        "and reports traced memory along the way. Memory must stay flat."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=100000)
+        parser.add_argument("--samples", type=int, default=10)
+        parser.add_argument(
+            "--max-growth",
+            type=int,
+            default=1024 * 1024,
+            help="Fail if traced memory grows by more than this many bytes between the first and the last sample.",
+        )
+
+    def handle(self, *args, **options):
+        schemas = [
+            [{"name": "f1", "field_type": "number"}, {"name": "f2", "field_type": "string"}],
+            [{"name": "f1", "field_type": "boolean"}, {"name": "f3", "field_type": "number"}],
+        ]
+        repo = DynamicTableRepository(max_tables=1)
+        sample_every = max(options["iterations"] // options["samples"], 1)
+        samples = []
+
+        tracemalloc.start()
+        for i in range(options["iterations"]):
+            repo.cache_model(1, get_dynamic_table_model("soak_table", schemas[i % 2]), i + 1)
+            if (i + 1) % sample_every == 0:
+                gc.collect()
+                samples.append({"iteration": i + 1, "traced_bytes": tracemalloc.get_traced_memory()[0]})
+        tracemalloc.stop()
+
+        growth = samples[-1]["traced_bytes"] - samples[0]["traced_bytes"]
+        self.stdout.write(json.dumps({"samples": samples, "growth_bytes": growth}, indent=2))
+        if growth > options["max_growth"]:
+            raise CommandError(f"Memory grew by {growth} bytes over {options['iterations']} model rebuilds.")
@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("schema_manager", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dynamictable",
+            name="version",
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
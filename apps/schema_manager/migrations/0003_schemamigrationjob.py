@@ -0,0 +1,76 @@
+# Generated by Django 4.2 on 2026-10-18 18:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("schema_manager", "0002_dynamictable_version"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SchemaMigrationJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("field_name", models.CharField(max_length=255)),
+                (
+                    "old_field_type",
+                    models.CharField(
+                        choices=[
+                            ("string", "string"),
+                            ("number", "number"),
+                            ("boolean", "boolean"),
+                        ],
+                        max_length=16,
+                    ),
+                ),
+                (
+                    "new_field_type",
+                    models.CharField(
+                        choices=[
+                            ("string", "string"),
+                            ("number", "number"),
+                            ("boolean", "boolean"),
+                        ],
+                        max_length=16,
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("running", "Running"),
+                            ("done", "Done"),
+                            ("failed", "Failed"),
+                        ],
+                        default="pending",
+                        max_length=16,
+                    ),
+                ),
+                ("last_id", models.BigIntegerField(default=0)),
+                ("rows_done", models.BigIntegerField(default=0)),
+                ("error", models.TextField(blank=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "table",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="migration_jobs",
+                        to="schema_manager.dynamictable",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-18 18:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("schema_manager", "0003_schemamigrationjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dynamictable",
+            name="partitioning",
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 4.2 on 2026-10-18 21:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from apps.schema_manager.changes import (
+    CREATE_TRIGGER_FUNCTIONS_SQL,
+    DROP_TRIGGER_FUNCTIONS_SQL,
+    get_change_tracking_sql,
+    is_change_tracking_supported,
+)
+from apps.schema_manager.models import CHANGE_COLUMN
+from apps.schema_manager.repositores import get_dynamic_table_model
+
+
+def get_db_tables(apps):
+    for table_id, name, fields in apps.get_model("schema_manager", "DynamicTable").objects.values_list(
+        "pk", "name", "fields"
+    ):
+        yield table_id, get_dynamic_table_model(name, fields)._meta.db_table
+
+
+def add_change_tracking(apps, schema_editor):
+    if not is_change_tracking_supported():
+        return
+    schema_editor.execute(CREATE_TRIGGER_FUNCTIONS_SQL)
+    for table_id, db_table in get_db_tables(apps):
+        for statement in get_change_tracking_sql(db_table, table_id, has_rows=True):
+            schema_editor.execute(statement)
+
+
+def remove_change_tracking(apps, schema_editor):
+    if not is_change_tracking_supported():
+        return
+    schema_editor.execute(DROP_TRIGGER_FUNCTIONS_SQL)
+    for _, db_table in get_db_tables(apps):
+        quote_name = schema_editor.quote_name
+        schema_editor.execute(f"ALTER TABLE {quote_name(db_table)} DROP COLUMN {quote_name(CHANGE_COLUMN)}")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("schema_manager", "0004_dynamictable_partitioning"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dynamictable",
+            name="tombstones_pruned_upto",
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name="RowTombstone",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("row_id", models.BigIntegerField()),
+                ("change", models.BigIntegerField()),
+                ("deleted_at", models.DateTimeField()),
+                (
+                    "table",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="tombstones",
+                        to="schema_manager.dynamictable",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [models.Index(fields=["table", "change"], name="schema_mana_table_i_5174ba_idx")],
+            },
+        ),
+        migrations.RunPython(add_change_tracking, remove_change_tracking),
+    ]
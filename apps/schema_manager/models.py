@@ -1,11 +1,15 @@
 import re
 
-from typing import List
+from typing import List, Optional
 from django.db import models
 from pydantic import BaseModel, validator
 from enum import Enum
 
 NAME_MAX_LENGTH = 255
+# Prefix of the hidden columns and query annotations of dynamic tables, which field names cannot start with.
+RESERVED_NAME_PREFIX = "_dlx_"
+# Hidden column of every dynamic table, holding the id of the transaction which last wrote the row, see ``changes``.
+CHANGE_COLUMN = f"{RESERVED_NAME_PREFIX}change"
 
 
 class FieldType(str, Enum):
@@ -14,17 +18,125 @@ class FieldType(str, Enum):
     boolean = "boolean"
 
 
+class IndexType(str, Enum):
+    btree = "btree"
+    unique = "unique"
+    trigram = "trigram"
+
+
 class Field(BaseModel):
     name: str
     field_type: FieldType
+    index: Optional[IndexType] = None
+    # Part of the unique natural key of the table, which rows can be upserted by.
+    natural_key: bool = False
+    # Part of the full-text search of the table, see ``?q=`` of the row listing.
+    search: bool = False
 
     @validator("name")
     def validate_name(cls, value):
         if not re.match(r"^\w+$", value):
             raise ValueError("my_field must contain only [A-Za-z_0-9] symbols.")
+        if value.startswith(RESERVED_NAME_PREFIX):
+            raise ValueError(f"Names starting with {RESERVED_NAME_PREFIX} are reserved.")
+        return value
+
+    @validator("index")
+    def validate_index(cls, value, values):
+        if value == IndexType.trigram and values.get("field_type") != FieldType.string:
+            raise ValueError("trigram index is only available for string fields.")
+        return value
+
+    @validator("search")
+    def validate_search(cls, value, values):
+        if value and values.get("field_type") != FieldType.string:
+            raise ValueError("full-text search is only available for string fields.")
+        return value
+
+
+class PartitionStrategy(str, Enum):
+    range = "range"
+    hash = "hash"
+
+
+class Partitioning(BaseModel):
+    strategy: PartitionStrategy
+    column: str = "id"
+    # range: width of each partition, in values of the partitioning column.
+    interval: Optional[int] = None
+    # range: partitions kept created ahead of the highest value written.
+    premake: int = 4
+    # hash: number of partitions.
+    partitions: Optional[int] = None
+
+    @validator("interval", always=True)
+    def validate_interval(cls, value, values):
+        if values.get("strategy") == PartitionStrategy.range and (value is None or value < 1):
+            raise ValueError("range partitioning needs a positive interval.")
+        return value
+
+    @validator("premake")
+    def validate_premake(cls, value):
+        if value < 1:
+            raise ValueError("premake must be at least 1.")
+        return value
+
+    @validator("partitions", always=True)
+    def validate_partitions(cls, value, values):
+        if values.get("strategy") == PartitionStrategy.hash and (value is None or not 2 <= value <= 1024):
+            raise ValueError("hash partitioning needs between 2 and 1024 partitions.")
         return value
 
+    @property
+    def range_interval(self) -> int:
+        """``interval``, which the validation guarantees for range partitioning."""
+        assert self.interval is not None, "Only range partitioning has an interval."
+        return self.interval
+
+    @property
+    def hash_partitions(self) -> int:
+        """``partitions``, which the validation guarantees for hash partitioning."""
+        assert self.partitions is not None, "Only hash partitioning has partitions."
+        return self.partitions
+
 
 class DynamicTable(models.Model):
     name = models.CharField(max_length=NAME_MAX_LENGTH, unique=True)
     fields = models.JSONField()
+    version = models.PositiveIntegerField(default=1)
+    partitioning = models.JSONField(null=True, blank=True)
+    # Highest change of the tombstones pruned so far, the change feed cannot be read from before it.
+    tombstones_pruned_upto = models.BigIntegerField(default=0)
+
+
+class SchemaMigrationJob(models.Model):
+    """Background change of a column type: shadow column, batched backfill, then swap."""
+
+    class Status(models.TextChoices):
+        pending = "pending"
+        running = "running"
+        done = "done"
+        failed = "failed"
+
+    table = models.ForeignKey(DynamicTable, on_delete=models.CASCADE, related_name="migration_jobs")
+    field_name = models.CharField(max_length=NAME_MAX_LENGTH)
+    old_field_type = models.CharField(max_length=16, choices=[(t.value, t.value) for t in FieldType])
+    new_field_type = models.CharField(max_length=16, choices=[(t.value, t.value) for t in FieldType])
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.pending)
+    last_id = models.BigIntegerField(default=0)
+    rows_done = models.BigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class RowTombstone(models.Model):
+    """A row deleted from a dynamic table, written by a trigger for the change feed."""
+
+    table = models.ForeignKey(DynamicTable, on_delete=models.CASCADE, related_name="tombstones")
+    row_id = models.BigIntegerField()
+    change = models.BigIntegerField()
+    deleted_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [models.Index(fields=["table", "change"])]
@@ -0,0 +1,155 @@
+"""
+Online column type changes. Instead of an ALTER COLUMN ... TYPE which rewrites the table under an ACCESS EXCLUSIVE
+lock, a job:
+1. adds a nullable shadow column of the new type, kept in sync with the original one by a trigger,
+2. backfills the shadow column in short transactions of DATALEX_ONLINE_MIGRATION_BATCH_SIZE rows,
+3. swaps the columns (drop the original one, rename the shadow one) in one short transaction.
+Every step is idempotent, so an interrupted job can be resumed with ``manage.py run_schema_migrations``.
+"""
+import threading
+
+from typing import List
+from django.conf import settings
+from django.db import DatabaseError, connection, models, transaction
+from django.db.backends.utils import names_digest
+from django.db.models import F
+
+from .exceptions import DynamicTableRepositoryException
+from .models import DynamicTable, FieldType, SchemaMigrationJob
+from .repositores import (
+    build_user_indexes,
+    dynamic_table_repo_factory,
+    get_existing_user_index_names,
+    get_model_field_for_field_type,
+    get_user_indexes,
+    publish_schema_version,
+)
+
+
+def start_schema_migration_jobs(job_ids: List[int]):
+    if settings.DATALEX_SCHEMA_JOBS_IN_BACKGROUND:
+        threading.Thread(target=run_schema_migration_jobs_in_thread, args=(job_ids,), daemon=True).start()
+    else:
+        for job_id in job_ids:
+            run_schema_migration_job(job_id)
+
+
+def run_schema_migration_jobs_in_thread(job_ids: List[int]):
+    try:
+        for job_id in job_ids:
+            run_schema_migration_job(job_id)
+    finally:
+        connection.close()
+
+
+def run_schema_migration_job(job_id: int) -> SchemaMigrationJob:
+    job = SchemaMigrationJob.objects.get(pk=job_id)
+    if job.status in (SchemaMigrationJob.Status.done, SchemaMigrationJob.Status.failed):
+        return job
+    job.status = SchemaMigrationJob.Status.running
+    job.save(update_fields=["status", "updated_at"])
+
+    model = dynamic_table_repo_factory().get_by_id(job.table_id)
+    try:
+        prepare_shadow_column(model, job)
+        backfill_shadow_column(model, job)
+        new_model = swap_shadow_column(model, job)
+    except DatabaseError as exc:
+        drop_shadow_column(model, job)
+        job.status, job.error = SchemaMigrationJob.Status.failed, str(exc)
+        job.save(update_fields=["status", "error", "updated_at"])
+        return job
+
+    job.status = SchemaMigrationJob.Status.done
+    try:
+        rebuild_missing_indexes(new_model)
+    except DynamicTableRepositoryException as exc:
+        job.error = str(exc)
+    job.save(update_fields=["status", "error", "updated_at"])
+    return job
+
+
+def get_shadow_names(model: models.Model, job: SchemaMigrationJob) -> dict:
+    digest = names_digest(model._meta.db_table, job.field_name, str(job.pk), length=16)
+    quote_name = connection.ops.quote_name
+    new_field = get_model_field_for_field_type(FieldType(job.new_field_type))
+    return {
+        "table": quote_name(model._meta.db_table),
+        "column": quote_name(model._meta.get_field(job.field_name).column),
+        "shadow": quote_name(f"dlx_shadow_{digest}"),
+        "function": quote_name(f"dlx_sync_{digest}"),
+        "trigger": quote_name(f"dlx_sync_{digest}"),
+        "type": new_field.db_type(connection),
+    }
+
+
+def prepare_shadow_column(model: models.Model, job: SchemaMigrationJob):
+    names = get_shadow_names(model, job)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("ALTER TABLE %(table)s ADD COLUMN IF NOT EXISTS %(shadow)s %(type)s NULL" % names)
+        # Rows written while the job runs get their shadow value from the trigger. A value which cannot be cast
+        # to the new type makes the write fail, just as it would once the column has been swapped.
+        cursor.execute(
+            "CREATE OR REPLACE FUNCTION %(function)s() RETURNS trigger AS $$ "
+            "BEGIN NEW.%(shadow)s := NEW.%(column)s::%(type)s; RETURN NEW; END $$ LANGUAGE plpgsql" % names
+        )
+        cursor.execute("DROP TRIGGER IF EXISTS %(trigger)s ON %(table)s" % names)
+        cursor.execute(
+            "CREATE TRIGGER %(trigger)s BEFORE INSERT OR UPDATE ON %(table)s "
+            "FOR EACH ROW EXECUTE FUNCTION %(function)s()" % names
+        )
+
+
+def backfill_shadow_column(model: models.Model, job: SchemaMigrationJob):
+    names = get_shadow_names(model, job)
+    # Rows inserted after this point are already covered by the trigger.
+    max_id = model.objects.aggregate(max_id=models.Max("id"))["max_id"] or 0
+    while job.last_id < max_id:
+        upper_id = job.last_id + settings.DATALEX_ONLINE_MIGRATION_BATCH_SIZE
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                "UPDATE %(table)s SET %(shadow)s = %(column)s::%(type)s WHERE id > %%s AND id <= %%s" % names,
+                [job.last_id, upper_id],
+            )
+            job.rows_done += cursor.rowcount
+            job.last_id = upper_id
+            job.save(update_fields=["last_id", "rows_done", "updated_at"])
+
+
+def swap_shadow_column(model: models.Model, job: SchemaMigrationJob) -> models.Model:
+    names = get_shadow_names(model, job)
+    repo = dynamic_table_repo_factory()
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("LOCK TABLE %(table)s IN ACCESS EXCLUSIVE MODE" % names)
+            cursor.execute("DROP TRIGGER IF EXISTS %(trigger)s ON %(table)s" % names)
+            cursor.execute("DROP FUNCTION IF EXISTS %(function)s()" % names)
+            cursor.execute("ALTER TABLE %(table)s DROP COLUMN %(column)s" % names)
+            cursor.execute("ALTER TABLE %(table)s RENAME COLUMN %(shadow)s TO %(column)s" % names)
+
+        schema_model = DynamicTable.objects.select_for_update().get(pk=job.table_id)
+        schema_model.fields = [
+            {**f, "field_type": job.new_field_type} if f["name"] == job.field_name else f for f in schema_model.fields
+        ]
+        schema_model.version = F("version") + 1
+        schema_model.save(update_fields=["fields", "version"])
+        new_model = repo.refresh_from_db(job.table_id)
+        version = repo.versions[job.table_id]
+        transaction.on_commit(lambda: publish_schema_version(job.table_id, version))
+    return new_model
+
+
+def rebuild_missing_indexes(model: models.Model):
+    # Indexes on the original column went away with it.
+    existing_indexes = get_existing_user_index_names(model)
+    missing_indexes = [index for name, index in get_user_indexes(model).items() if name not in existing_indexes]
+    if missing_indexes:
+        build_user_indexes(model, missing_indexes)
+
+
+def drop_shadow_column(model: models.Model, job: SchemaMigrationJob):
+    names = get_shadow_names(model, job)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("DROP TRIGGER IF EXISTS %(trigger)s ON %(table)s" % names)
+        cursor.execute("DROP FUNCTION IF EXISTS %(function)s()" % names)
+        cursor.execute("ALTER TABLE %(table)s DROP COLUMN IF EXISTS %(shadow)s" % names)
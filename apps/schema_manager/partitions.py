@@ -0,0 +1,225 @@
+"""
+Declarative PostgreSQL partitioning of dynamic tables. A table is partitioned by range of ``id`` or of a number
+column, or by hash, from its creation on. Range partitions are created ahead of the rows being written: every write
+checks the highest value it wrote against the partitions known to exist, and once fewer than half of ``premake``
+partitions are left above it, more are created after commit. Rows falling outside of every range land in the
+default partition, and are moved out when a partition covering them gets created. Retention drops whole partitions,
+which is a catalog change instead of a large DELETE.
+"""
+import re
+
+from typing import Dict, Iterable, List, Optional
+from django.db import DatabaseError, connection, models, transaction
+from django.db.backends.utils import names_digest
+
+from .exceptions import DynamicTableRepositoryException
+from .models import DynamicTable, Field, FieldType, IndexType, PartitionStrategy, Partitioning
+
+DEFAULT_PARTITION_SUFFIX = "default"
+RANGE_BOUND_RE = re.compile(r"^FOR VALUES FROM \('?(-?\d+)'?\) TO \('?(-?\d+)'?\)$")
+HASH_BOUND_RE = re.compile(r"^FOR VALUES WITH \(modulus (\d+), remainder (\d+)\)$")
+# Most range partitions created at once, when a value is written far above the existing partitions.
+MAX_NEW_RANGE_PARTITIONS = 64
+
+# Partitioning of a table never changes, and the range partitions only grow between retention runs.
+table_partitionings: Dict[int, Optional[Partitioning]] = {}
+range_upper_bounds: Dict[int, int] = {}
+
+
+def check_partitioning(partitioning: Partitioning, fields: List[dict]):
+    if connection.vendor != "postgresql":
+        raise DynamicTableRepositoryException("Partitioning is only supported on PostgreSQL.")
+    typed_fields = {f.name: f for f in (Field(**f) for f in fields)}
+    column = typed_fields.get(partitioning.column)
+    if partitioning.column != "id" and (column is None or column.field_type != FieldType.number):
+        raise DynamicTableRepositoryException("Tables can only be partitioned by 'id' or a number field.")
+    for field in typed_fields.values():
+        # Unique constraints of a partitioned table must include the partitioning column.
+        if field.index == IndexType.unique and field.name != partitioning.column:
+            raise DynamicTableRepositoryException(
+                f"Field '{field.name}' cannot have a unique index, the table is partitioned by "
+                f"'{partitioning.column}'."
+            )
+    natural_key = [field.name for field in typed_fields.values() if field.natural_key]
+    if natural_key and partitioning.column not in natural_key:
+        raise DynamicTableRepositoryException(
+            f"The natural key must include '{partitioning.column}', the table is partitioned by it."
+        )
+
+
+def get_partition_name(db_table: str, suffix: str) -> str:
+    name = f"{db_table}_{suffix}"
+    max_length = connection.ops.max_name_length()
+    if len(name) <= max_length:
+        return name
+    digest = names_digest(db_table, length=8)
+    return f"{db_table[: max_length - len(suffix) - len(digest) - 2]}_{digest}_{suffix}"
+
+
+def get_range_partition_name(db_table: str, partitioning: Partitioning, lower: int) -> str:
+    number = lower // partitioning.range_interval
+    return get_partition_name(db_table, f"p{number}" if number >= 0 else f"m{-number}")
+
+
+def create_partitioned_model(schema_editor, model: models.Model, partitioning: Partitioning):
+    """``schema_editor.create_model`` for a partitioned table, along with its first partitions."""
+    quote_name = schema_editor.quote_name
+    sql, params = schema_editor.table_sql(model)
+    column = quote_name(model._meta.get_field(partitioning.column).column)
+    if partitioning.column != "id":
+        # The primary key of a partitioned table has to include the partitioning column.
+        sql = sql.replace(" PRIMARY KEY", "", 1)
+        sql = f'{sql[:-1]}, PRIMARY KEY ({quote_name("id")}, {column}))'
+    schema_editor.execute(f"{sql} PARTITION BY {partitioning.strategy.value.upper()} ({column})", params or None)
+    schema_editor.deferred_sql.extend(schema_editor._model_indexes_sql(model))
+
+    table = quote_name(model._meta.db_table)
+    if partitioning.strategy == PartitionStrategy.hash:
+        for remainder in range(partitioning.hash_partitions):
+            name = quote_name(get_partition_name(model._meta.db_table, f"h{remainder}"))
+            schema_editor.execute(
+                f"CREATE TABLE {name} PARTITION OF {table} "
+                f"FOR VALUES WITH (MODULUS {partitioning.hash_partitions}, REMAINDER {remainder})"
+            )
+        return
+    default = quote_name(get_partition_name(model._meta.db_table, DEFAULT_PARTITION_SUFFIX))
+    schema_editor.execute(f"CREATE TABLE {default} PARTITION OF {table} DEFAULT")
+    for i in range(partitioning.premake):
+        create_range_partition(schema_editor, model, partitioning, i * partitioning.range_interval)
+
+
+def create_range_partition(schema_editor, model: models.Model, partitioning: Partitioning, lower: int):
+    quote_name = schema_editor.quote_name
+    upper = lower + partitioning.range_interval
+    table = quote_name(model._meta.db_table)
+    name = quote_name(get_range_partition_name(model._meta.db_table, partitioning, lower))
+    default = quote_name(get_partition_name(model._meta.db_table, DEFAULT_PARTITION_SUFFIX))
+    column = quote_name(model._meta.get_field(partitioning.column).column)
+    in_range = f"{column} >= {lower:d} AND {column} < {upper:d}"
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"SELECT 1 FROM {default} WHERE {in_range} LIMIT 1")
+        has_default_rows = cursor.fetchone() is not None
+    if not has_default_rows:
+        schema_editor.execute(f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES FROM ({lower:d}) TO ({upper:d})")
+        return
+    # Creating the partition would fail while the default partition holds rows of its range: move them first.
+    schema_editor.execute(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    schema_editor.execute(
+        f"WITH moved AS (DELETE FROM {default} WHERE {in_range} RETURNING *) INSERT INTO {name} SELECT * FROM moved"
+    )
+    schema_editor.execute(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM ({lower:d}) TO ({upper:d})")
+
+
+def get_partitions(model: models.Model) -> List[dict]:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples::bigint "
+            "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = %s::regclass",
+            [connection.ops.quote_name(model._meta.db_table)],
+        )
+        rows = cursor.fetchall()
+
+    partitions = []
+    for name, bound, estimate in rows:
+        partition: dict = {"name": name}
+        if match := RANGE_BOUND_RE.match(bound):
+            partition.update({"from": int(match[1]), "to": int(match[2])})
+        elif match := HASH_BOUND_RE.match(bound):
+            partition.update({"modulus": int(match[1]), "remainder": int(match[2])})
+        else:
+            partition["default"] = True
+        partition["rows_estimate"] = estimate if estimate >= 0 else None
+        partitions.append(partition)
+    return sorted(partitions, key=lambda p: (p.get("from", p.get("remainder", float("-inf"))), p["name"]))
+
+
+def get_range_upper_bound(model: models.Model) -> Optional[int]:
+    return max((p["to"] for p in get_partitions(model) if "to" in p), default=None)
+
+
+def ensure_range_partitions(model: models.Model, partitioning: Partitioning, upto: int) -> List[str]:
+    """
+    Creates the missing range partitions between the highest existing one and ``upto``, at most
+    ``MAX_NEW_RANGE_PARTITIONS`` of them. Rows of a gap left below them stay in the default partition.
+    Without any range partition, they start at the lowest value of the default partition, or 0.
+    """
+    interval = partitioning.range_interval
+    upper = get_range_upper_bound(model)
+    if upper is None:
+        # No range partition left (e.g. all dropped by retention): start at the lowest value actually stored.
+        lowest = get_lowest_default_value(model, partitioning)
+        upper = lowest // interval * interval if lowest is not None else 0
+    lower = max(upto - MAX_NEW_RANGE_PARTITIONS * interval, upper)
+    created = []
+    with transaction.atomic(), connection.schema_editor() as schema_editor:
+        while lower < upto:
+            create_range_partition(schema_editor, model, partitioning, lower)
+            created.append(get_range_partition_name(model._meta.db_table, partitioning, lower))
+            lower += interval
+    return created
+
+
+def get_lowest_default_value(model: models.Model, partitioning: Partitioning) -> Optional[int]:
+    quote_name = connection.ops.quote_name
+    default = quote_name(get_partition_name(model._meta.db_table, DEFAULT_PARTITION_SUFFIX))
+    column = quote_name(model._meta.get_field(partitioning.column).column)
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT MIN({column}) FROM {default}")
+        return cursor.fetchone()[0]
+
+
+def drop_range_partitions(model: models.Model, before: int) -> List[str]:
+    """Drops the range partitions holding only values below ``before``, rows included."""
+    dropped = []
+    with transaction.atomic(), connection.schema_editor() as schema_editor:
+        table = schema_editor.quote_name(model._meta.db_table)
+        for partition in get_partitions(model):
+            if "to" not in partition or partition["to"] > before:
+                continue
+            name = schema_editor.quote_name(partition["name"])
+            schema_editor.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+            schema_editor.execute(f"DROP TABLE {name}")
+            dropped.append(partition["name"])
+    return dropped
+
+
+def get_table_partitioning(table_id: int) -> Optional[Partitioning]:
+    if table_id not in table_partitionings:
+        partitioning = DynamicTable.objects.filter(pk=table_id).values_list("partitioning", flat=True).first()
+        table_partitionings[table_id] = Partitioning(**partitioning) if partitioning else None
+    return table_partitionings[table_id]
+
+
+def ensure_partitions_ahead(table_id: int, model: models.Model, instances: Iterable[models.Model]):
+    """To be called by every insert, creates range partitions ahead of the written values after commit."""
+    partitioning = get_table_partitioning(table_id)
+    if partitioning is None or partitioning.strategy != PartitionStrategy.range:
+        return
+    attname = model._meta.get_field(partitioning.column).attname
+    highest = max((v for v in (getattr(i, attname) for i in instances) if v is not None), default=None)
+    if highest is None:
+        return
+    if table_id not in range_upper_bounds:
+        range_upper_bounds[table_id] = get_range_upper_bound(model) or 0
+    next_lower = (highest // partitioning.range_interval + 1) * partitioning.range_interval
+    ahead = (range_upper_bounds[table_id] - next_lower) // partitioning.range_interval
+    if ahead >= max(partitioning.premake // 2, 1):
+        return
+    upto = next_lower + partitioning.premake * partitioning.range_interval
+    transaction.on_commit(lambda: premake_range_partitions(table_id, model, partitioning, upto))
+
+
+def premake_range_partitions(table_id: int, model: models.Model, partitioning: Partitioning, upto: int):
+    try:
+        ensure_range_partitions(model, partitioning, upto)
+    except DatabaseError:
+        # Most likely another worker created the same partitions, the bound is read again on the next write.
+        range_upper_bounds.pop(table_id, None)
+        return
+    range_upper_bounds[table_id] = max(range_upper_bounds.get(table_id, 0), upto)
+
+
+def forget_range_upper_bound(table_id: int):
+    range_upper_bounds.pop(table_id, None)
@@ -1,51 +1,164 @@
-from typing import Dict, List, Tuple, Set
+import logging
+import threading
+
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Set
 from abc import ABC, abstractmethod
 from functools import lru_cache
-from django.db import connection, models
-from django.db.utils import DataError
+from django.apps.registry import Apps
+from django.conf import settings
+from django.core.cache import caches
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
+from django.db import connection, models, transaction
+from django.db.backends.utils import names_digest
+from django.db.models import F
+from django.db.utils import DatabaseError, DataError
 
-from .models import DynamicTable, Field, FieldType
+from datalex.instrumentation import metrics, timed
+from .changes import get_change_tracking_sql, is_change_tracking_supported
+from .models import DynamicTable, Field, FieldType, IndexType, Partitioning, SchemaMigrationJob
 from .exceptions import DynamicTableRepositoryException
+from .partitions import check_partitioning, create_partitioned_model
+from .signals import dynamic_table_changed, dynamic_table_evicted
+
 
+logger = logging.getLogger(__name__)
 
 CHARFIELD_MAX_LENGHT = 255
 USER_TABLES_PREFIX = "user_tables_"
+USER_INDEX_PREFIX = "dlx_"
+NATURAL_KEY_INDEX_PREFIX = f"{USER_INDEX_PREFIX}nk_"
+SEARCH_INDEX_PREFIX = f"{USER_INDEX_PREFIX}fts_"
+SCHEMA_VERSION_CACHE_KEY = "datalex:schema_version:{table_id}"
+CREATE_TABLE_STATEMENTS_PER_QUERY = 100
+ACTIVE_MIGRATION_JOB_STATUSES = (SchemaMigrationJob.Status.pending, SchemaMigrationJob.Status.running)
 
 
 class DynamicTableRepositoryInterface(ABC):
+    versions: Dict[int, int]
+
     @abstractmethod
     def add(self, new_schema_model: DynamicTable) -> models.Model:
         raise NotImplementedError()
 
     @abstractmethod
-    def update(self, new_schema_model: DynamicTable) -> models.Model:
+    def add_many(self, new_schema_models: List[DynamicTable]) -> List[models.Model]:
+        raise NotImplementedError()
+
+    @abstractmethod
+    def update(
+        self,
+        new_schema_model: DynamicTable,
+        old_fields: List[dict],
+        online: bool = False,
+        index_errors: Optional[List[str]] = None,
+    ) -> models.Model:
+        raise NotImplementedError()
+
+    @abstractmethod
+    def get_by_id(self, table_id: int) -> models.Model:
+        raise NotImplementedError()
+
+    @abstractmethod
+    def refresh_from_db(self, table_id: int) -> models.Model:
         raise NotImplementedError()
 
 
 class DynamicTableRepository(DynamicTableRepositoryInterface):
-    def __init__(self):
-        self.tables = self.init_repo()
+    """
+    Models are built lazily on the first ``get_by_id`` of a table and kept in an LRU of at most
+    ``max_tables`` entries (``DATALEX_MODEL_CACHE_SIZE``), so neither start up time nor memory grows
+    with the number of tables. ``init_repo`` warms the cache up front if that is ever wanted.
+    The LRU is shared by the request threads and the background ones (ingest flusher, migration jobs), ``lock``
+    guards it.
+    """
+
+    def __init__(self, max_tables: Optional[int] = None):
+        self.max_tables = max_tables or settings.DATALEX_MODEL_CACHE_SIZE
+        self.versions: Dict[int, int] = {}
+        self.tables: OrderedDict[int, models.Model] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
 
     def init_repo(self) -> Dict[int, models.Model]:
-        tables: Dict[int, models.Model] = {}
-        existing_schemas = DynamicTable.objects.all().order_by("pk")
-        for schema in existing_schemas:
-            tables[schema.pk] = get_dynamic_table_model(schema.name, schema.fields)
-        return tables
+        existing_schemas = DynamicTable.objects.all().order_by("-pk")[: self.max_tables]
+        for schema in reversed(existing_schemas):
+            self.cache_model(schema.pk, get_dynamic_table_model(schema.name, schema.fields), schema.version)
+        return self.tables
 
     def add(self, new_schema_model: DynamicTable) -> models.Model:
-        new_dynamic_table = get_dynamic_table_model(new_schema_model.name, new_schema_model.fields)
+        return self.add_many([new_schema_model])[0]
+
+    def add_many(self, new_schema_models: List[DynamicTable]) -> List[models.Model]:
+        """Creates the tables in a single schema editor session, i.e. in one transaction."""
+        new_dynamic_tables = [get_dynamic_table_model(s.name, s.fields) for s in new_schema_models]
 
         with connection.schema_editor() as schema_editor:
-            schema_editor.create_model(new_dynamic_table)
-        self.tables[new_schema_model.pk] = new_dynamic_table
-        return new_dynamic_table
+            ensure_index_extensions(
+                schema_editor, [index for model in new_dynamic_tables for index in get_user_indexes(model).values()]
+            )
+            statements = []
+            for schema_model, new_dynamic_table in zip(new_schema_models, new_dynamic_tables):
+                if schema_model.partitioning:
+                    create_partitioned_model(
+                        schema_editor, new_dynamic_table, Partitioning(**schema_model.partitioning)
+                    )
+                else:
+                    statements.append(get_create_table_sql(schema_editor, new_dynamic_table))
+                if is_change_tracking_supported():
+                    statements.extend(get_change_tracking_sql(new_dynamic_table._meta.db_table, schema_model.pk))
+            # Sent a chunk at a time: creating many tables is dominated by round trips otherwise.
+            for i in range(0, len(statements), CREATE_TABLE_STATEMENTS_PER_QUERY):
+                schema_editor.execute("; ".join(statements[i : i + CREATE_TABLE_STATEMENTS_PER_QUERY]), None)
+        versions = {}
+        for schema_model, new_dynamic_table in zip(new_schema_models, new_dynamic_tables):
+            self.cache_model(schema_model.pk, new_dynamic_table, schema_model.version)
+            versions[schema_model.pk] = schema_model.version
+        transaction.on_commit(lambda: publish_schema_versions(versions))
+        for schema_model, new_dynamic_table in zip(new_schema_models, new_dynamic_tables):
+            dynamic_table_changed.send(sender=self.__class__, table_id=schema_model.pk, model=new_dynamic_table)
+        return new_dynamic_tables
 
-    def update(self, updated_schema_model: DynamicTable) -> models.Model:
-        old_dynamic_table = self.get_by_id(updated_schema_model.pk)
+    def update(
+        self,
+        updated_schema_model: DynamicTable,
+        old_fields: List[dict],
+        online: bool = False,
+        index_errors: Optional[List[str]] = None,
+    ) -> models.Model:
+        """
+        With ``online`` set, column type changes which rewrite the table are not run in the request. The schema
+        keeps the old type and a ``SchemaMigrationJob`` is queued for each of them, see ``online_migrations``.
+        New indexes are built after commit. The schema change is kept when one of them cannot be built: the error
+        is logged and appended to ``index_errors``, and the index is retried by the next update.
+        """
+        if updated_schema_model.migration_jobs.filter(status__in=ACTIVE_MIGRATION_JOB_STATUSES).exists():
+            raise DynamicTableRepositoryException("A column migration is still in progress on this table.")
+        if updated_schema_model.partitioning:
+            check_partitioning(Partitioning(**updated_schema_model.partitioning), updated_schema_model.fields)
+        with self.lock:
+            old_dynamic_table = self.tables.get(updated_schema_model.pk)
+            cached_version = self.versions.get(updated_schema_model.pk)
+        if old_dynamic_table is None or cached_version != updated_schema_model.version:
+            old_dynamic_table = get_dynamic_table_model(updated_schema_model.name, old_fields)
         to_create, to_alter, to_delete = compare_existing_table_to_new_schema(old_dynamic_table, updated_schema_model)
+        if online and connection.vendor == "postgresql":
+            to_rewrite = [(old, new) for old, new in to_alter if requires_table_rewrite(old, new)]
+            to_alter = [(old, new) for old, new in to_alter if not requires_table_rewrite(old, new)]
+            defer_field_rewrites(updated_schema_model, to_rewrite)
+        existing_indexes = get_existing_user_index_names(old_dynamic_table)
+        wanted_indexes = get_user_indexes(
+            get_dynamic_table_model(updated_schema_model.name, updated_schema_model.fields)
+        )
 
         with connection.schema_editor() as schema_editor:
+            # Dropping an index is a quick catalog change, and it has to happen before a column type change
+            # the index would not support (e.g. trigram on a column becoming a number).
+            for index_name, is_constraint in existing_indexes.items():
+                if index_name not in wanted_indexes:
+                    drop_user_index(schema_editor, old_dynamic_table, index_name, is_constraint)
             for field_to_add in to_create:
                 schema_editor.add_field(old_dynamic_table, field_to_add)
             for field_to_delete in to_delete:
@@ -55,26 +168,245 @@ class DynamicTableRepository(DynamicTableRepositoryInterface):
                     schema_editor.alter_field(old_dynamic_table, old_field, new_field)
                 except DataError as exc:
                     raise DynamicTableRepositoryException(str(exc))
-        self.refresh_from_db(updated_schema_model.pk)
+        DynamicTable.objects.filter(pk=updated_schema_model.pk).update(version=F("version") + 1)
+        new_dynamic_table = self.refresh_from_db(updated_schema_model.pk)
+        version = self.versions[updated_schema_model.pk]
+        transaction.on_commit(lambda: publish_schema_version(updated_schema_model.pk, version))
+
+        indexes_to_build = [index for name, index in wanted_indexes.items() if name not in existing_indexes]
+        if indexes_to_build:
+
+            def build_indexes():
+                try:
+                    build_user_indexes(new_dynamic_table, indexes_to_build)
+                except DynamicTableRepositoryException as exc:
+                    logger.warning("Table %s: %s", updated_schema_model.pk, exc)
+                    if index_errors is not None:
+                        index_errors.append(str(exc))
+
+            # Robust, so that a failure never keeps the callbacks registered after it (migration jobs) from running.
+            transaction.on_commit(build_indexes, robust=True)
         return old_dynamic_table
 
     def get_by_id(self, table_id: int) -> models.Model:
-        return self.tables[table_id]
+        # Another worker may have created or altered the table: rebuild whenever the published version is ahead.
+        published_version = get_published_schema_version(table_id)
+        if published_version is None:
+            raise KeyError(table_id)
+        with self.lock:
+            if self.versions.get(table_id, 0) >= published_version:
+                self.hits += 1
+                self.tables.move_to_end(table_id)
+                return self.tables[table_id]
+            self.misses += 1
+        try:
+            return self.refresh_from_db(table_id)
+        except DynamicTable.DoesNotExist:
+            raise KeyError(table_id)
 
     def refresh_from_db(self, table_id: int) -> models.Model:
         table_from_db = DynamicTable.objects.get(pk=table_id)
-        self.tables[table_id] = get_dynamic_table_model(table_from_db.name, table_from_db.fields)
-        return self.tables[table_id]
+        with timed("model_build"):
+            model = get_dynamic_table_model(table_from_db.name, table_from_db.fields)
+        self.cache_model(table_id, model, table_from_db.version)
+        dynamic_table_changed.send(sender=self.__class__, table_id=table_id, model=model)
+        return model
+
+    def cache_model(self, table_id: int, model: models.Model, version: int):
+        evicted = []
+        with self.lock:
+            self.tables[table_id] = model
+            self.tables.move_to_end(table_id)
+            self.versions[table_id] = version
+            while len(self.tables) > self.max_tables:
+                evicted_table_id, evicted_model = self.tables.popitem(last=False)
+                del self.versions[evicted_table_id]
+                evicted.append((evicted_table_id, evicted_model))
+        for evicted_table_id, evicted_model in evicted:
+            dynamic_table_evicted.send(sender=self.__class__, table_id=evicted_table_id, model=evicted_model)
+
+
+def get_published_schema_version(table_id: int) -> Optional[int]:
+    """
+    Schema versions are shared between worker processes through the cache, so that the steady state check
+    costs a cache lookup instead of a DB query. The DB is only consulted when the key is missing.
+    """
+    cache = caches[settings.DATALEX_SCHEMA_CACHE]
+    key = SCHEMA_VERSION_CACHE_KEY.format(table_id=table_id)
+    version = cache.get(key)
+    if version is None:
+        version = DynamicTable.objects.filter(pk=table_id).values_list("version", flat=True).first()
+        if version is not None:
+            cache.add(key, version, timeout=None)
+    return version
+
+
+def publish_schema_version(table_id: int, version: int):
+    caches[settings.DATALEX_SCHEMA_CACHE].set(SCHEMA_VERSION_CACHE_KEY.format(table_id=table_id), version, timeout=None)
+
+
+def publish_schema_versions(versions: Dict[int, int]):
+    caches[settings.DATALEX_SCHEMA_CACHE].set_many(
+        {SCHEMA_VERSION_CACHE_KEY.format(table_id=table_id): version for table_id, version in versions.items()},
+        timeout=None,
+    )
 
 
 def get_dynamic_table_model(model_name: str, fields: List[dict]) -> models.Model:
     typed_fields = [Field(**f) for f in fields]
     model_fields = get_model_fields_from_typed_fields(typed_fields)
+    model_fields["Meta"] = get_dynamic_table_model_meta(model_name, typed_fields)
     model = type(model_name, (models.Model,), model_fields)
     model._meta.db_table = get_model_db_table_name(model)  # type: ignore[attr-defined]
     return model
 
 
+def get_dynamic_table_model_meta(model_name: str, typed_fields: List[Field]) -> type:
+    """
+    Every dynamic model is registered in an app registry of its own instead of the global one. A rebuilt model
+    then never collides with its previous class (no "already registered" reloads and global cache flushes),
+    and a class dropped by the repository is garbage collected rather than kept alive by ``apps.all_models``.
+    """
+    indexes, constraints = get_model_indexes_from_typed_fields(model_name, typed_fields)
+    return type(
+        "Meta",
+        (),
+        {"app_label": DynamicTable._meta.app_label, "apps": Apps(), "indexes": indexes, "constraints": constraints},
+    )
+
+
+def get_model_indexes_from_typed_fields(
+    model_name: str, typed_fields: List[Field]
+) -> Tuple[List[models.Index], List[models.UniqueConstraint]]:
+    indexes: List[models.Index] = []
+    constraints: List[models.UniqueConstraint] = []
+    for field in typed_fields:
+        if field.index is None:
+            continue
+        name = get_user_index_name(model_name, [field.name], field.index)
+        match field.index:
+            case IndexType.btree:
+                indexes.append(models.Index(fields=[field.name], name=name))
+            case IndexType.trigram:
+                indexes.append(GinIndex(fields=[field.name], name=name, opclasses=["gin_trgm_ops"]))
+            case IndexType.unique:
+                constraints.append(models.UniqueConstraint(fields=[field.name], name=name))
+    natural_key = [field.name for field in typed_fields if field.natural_key]
+    if natural_key:
+        name = f"{NATURAL_KEY_INDEX_PREFIX}{names_digest(model_name, *natural_key, length=16)}"
+        constraints.append(models.UniqueConstraint(fields=natural_key, name=name))
+    search_fields = [field.name for field in typed_fields if field.search]
+    if search_fields:
+        # The config is part of the name, changing it rebuilds the index.
+        config = settings.DATALEX_SEARCH_CONFIG
+        name = f"{SEARCH_INDEX_PREFIX}{names_digest(model_name, config, *search_fields, length=16)}"
+        indexes.append(GinIndex(SearchVector(*search_fields, config=config), name=name))
+    return indexes, constraints
+
+
+def get_create_table_sql(schema_editor, model: models.Model) -> str:
+    """``schema_editor.create_model`` of a dynamic model (no relations, comments or defaults), as a statement."""
+    sql, params = schema_editor.table_sql(model)
+    if params:
+        raise DynamicTableRepositoryException(f"Table '{model._meta.db_table}' cannot be created in a batch.")
+    schema_editor.deferred_sql.extend(schema_editor._model_indexes_sql(model))
+    return sql
+
+
+def get_user_index_name(model_name: str, field_names: List[str], index_type: IndexType) -> str:
+    return f"{USER_INDEX_PREFIX}{index_type.value[:2]}_{names_digest(model_name, *field_names, length=16)}"
+
+
+def get_natural_key(model: models.Model) -> List[str]:
+    for constraint in model._meta.constraints:
+        if constraint.name.startswith(NATURAL_KEY_INDEX_PREFIX):
+            return list(constraint.fields)
+    return []
+
+
+def get_search_vector(model: models.Model) -> Optional[SearchVector]:
+    """The ``to_tsvector`` expression of the search index, which queries have to repeat as is to use the index."""
+    for index in model._meta.indexes:
+        if index.name.startswith(SEARCH_INDEX_PREFIX):
+            return index.expressions[0]
+    return None
+
+
+def get_user_indexes(model: models.Model) -> Dict[str, models.Index | models.UniqueConstraint]:
+    return {index.name: index for index in [*model._meta.indexes, *model._meta.constraints]}
+
+
+def get_existing_user_index_names(model: models.Model) -> Dict[str, bool]:
+    """
+    Maps the names of the user declared indexes which actually exist on the table to whether they are
+    constraints. Comparing against the database rather than the previous schema lets a failed build be retried.
+    """
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+    return {name: not info["index"] for name, info in constraints.items() if name.startswith(USER_INDEX_PREFIX)}
+
+
+def ensure_index_extensions(schema_editor, indexes):
+    gin_indexes = [index for index in indexes if isinstance(index, GinIndex)]
+    if gin_indexes and schema_editor.connection.vendor != "postgresql":
+        raise DynamicTableRepositoryException("Trigram and full-text search indexes are only supported on PostgreSQL.")
+    if any("gin_trgm_ops" in index.opclasses for index in gin_indexes):
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+
+def drop_user_index(schema_editor, model: models.Model, index_name: str, is_constraint: bool):
+    quote_name = schema_editor.quote_name
+    if is_constraint:
+        schema_editor.execute(
+            f"ALTER TABLE {quote_name(model._meta.db_table)} DROP CONSTRAINT {quote_name(index_name)}"
+        )
+    else:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {quote_name(index_name)}")
+
+
+def build_user_indexes(model: models.Model, indexes: List[models.Index | models.UniqueConstraint]):
+    """
+    Builds indexes on an existing table. On PostgreSQL, outside of a transaction, they are built CONCURRENTLY
+    so that reads and writes to a large table are not blocked while the index is being built. Indexes of
+    partitioned tables cannot be built concurrently.
+    """
+    concurrently = connection.vendor == "postgresql" and not connection.in_atomic_block and not is_partitioned(model)
+    for index in indexes:
+        try:
+            with connection.schema_editor(atomic=not concurrently) as schema_editor:
+                ensure_index_extensions(schema_editor, [index])
+                if isinstance(index, models.UniqueConstraint):
+                    add_unique_constraint(schema_editor, model, index, concurrently)
+                else:
+                    schema_editor.add_index(model, index, concurrently=concurrently)
+        except DatabaseError as exc:
+            if concurrently:
+                # A failed concurrent build leaves an INVALID index behind.
+                with connection.schema_editor(atomic=False) as schema_editor:
+                    schema_editor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {schema_editor.quote_name(index.name)}")
+            raise DynamicTableRepositoryException(f"Index '{index.name}' could not be built: {exc}")
+
+
+def is_partitioned(model: models.Model) -> bool:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT relkind = 'p' FROM pg_class WHERE oid = %s::regclass",
+            [connection.ops.quote_name(model._meta.db_table)],
+        )
+        return cursor.fetchone()[0]
+
+
+def add_unique_constraint(schema_editor, model: models.Model, constraint: models.UniqueConstraint, concurrently: bool):
+    if not concurrently:
+        schema_editor.add_constraint(model, constraint)
+        return
+    quote_name = schema_editor.quote_name
+    table, name = quote_name(model._meta.db_table), quote_name(constraint.name)
+    columns = ", ".join(quote_name(model._meta.get_field(f).column) for f in constraint.fields)
+    schema_editor.execute(f"CREATE UNIQUE INDEX CONCURRENTLY {name} ON {table} ({columns})")
+    schema_editor.execute(f"ALTER TABLE {table} ADD CONSTRAINT {name} UNIQUE USING INDEX {name}")
+
+
 def get_model_fields_from_typed_fields(typed_fields: List[Field]) -> Dict[str, models.Field]:
     db_fields = {"__module__": __name__}
     for field in typed_fields:
@@ -94,6 +426,18 @@ def get_model_field_for_field_type(field_type: FieldType) -> models.Field:
             raise DynamicTableRepositoryException(f"Field type '{field_type}' is not supported.")
 
 
+def get_field_type_for_model_field(model_field: models.Field) -> FieldType:
+    match model_field:
+        case models.BooleanField():
+            return FieldType.boolean
+        case models.IntegerField():
+            return FieldType.number
+        case models.CharField():
+            return FieldType.string
+        case _:
+            raise DynamicTableRepositoryException(f"Model field '{model_field.name}' has no matching field type.")
+
+
 def get_model_db_table_name(model: models.Model) -> str:
     return USER_TABLES_PREFIX + model._meta.db_table.replace(model._meta.app_label, "")
 
@@ -135,6 +479,42 @@ def compare_existing_table_to_new_schema(
     return list(to_create.values()), list(to_alter.values()), to_delete
 
 
+def requires_table_rewrite(old_field: models.Field, new_field: models.Field) -> bool:
+    """
+    Adding a nullable column and dropping one are catalog only changes. Changing the column type rewrites
+    every row under an ACCESS EXCLUSIVE lock, unless the database type stays the same.
+    """
+    return old_field.db_type(connection) != new_field.db_type(connection)
+
+
+def defer_field_rewrites(schema_model: DynamicTable, to_rewrite: List[Tuple[models.Field, models.Field]]):
+    old_types = {old.name: get_field_type_for_model_field(old) for old, _ in to_rewrite}
+    new_types = {new.name: get_field_type_for_model_field(new) for _, new in to_rewrite}
+    schema_model.fields = [
+        {**f, "field_type": old_types[f["name"]].value} if f["name"] in old_types else f for f in schema_model.fields
+    ]
+    schema_model.save(update_fields=["fields"])
+    SchemaMigrationJob.objects.bulk_create(
+        [
+            SchemaMigrationJob(
+                table=schema_model,
+                field_name=name,
+                old_field_type=old_types[name].value,
+                new_field_type=new_types[name].value,
+            )
+            for name in old_types
+        ]
+    )
+
+
+@metrics.register_collector
+def collect_model_cache_metrics():
+    repo = dynamic_table_repo_factory()
+    yield "datalex_model_cache_hits_total", "counter", "Table model lookups served from the cache.", (), repo.hits
+    yield "datalex_model_cache_misses_total", "counter", "Table model lookups which built the model.", (), repo.misses
+    yield "datalex_model_cache_size", "gauge", "Table models in the cache.", (), len(repo.tables)
+
+
 @lru_cache
 def dynamic_table_repo_factory() -> DynamicTableRepositoryInterface:
     return DynamicTableRepository()
@@ -1,9 +1,12 @@
 import re
 
-from typing import List
+from typing import List, Set
+from django.conf import settings
 from pydantic import ValidationError
 from rest_framework import serializers
-from .models import DynamicTable, Field
+from .exceptions import DynamicTableRepositoryException
+from .models import DynamicTable, Field, Partitioning, SchemaMigrationJob
+from .partitions import check_partitioning
 
 
 def validate_fields(fields: List[dict]):
@@ -13,6 +16,13 @@ def validate_fields(fields: List[dict]):
         raise serializers.ValidationError(str(exc))
 
 
+def validate_partitioning(partitioning: dict):
+    try:
+        Partitioning(**partitioning)
+    except ValidationError as exc:
+        raise serializers.ValidationError(str(exc))
+
+
 def validate_table_name(new_name: str):
     if not re.match(r"^\w+$", new_name):
         raise serializers.ValidationError("Please use only alphanumeric and underscore symbols for table name.")
@@ -21,16 +31,50 @@ def validate_table_name(new_name: str):
 class DynamicTableCreateSerializer(serializers.ModelSerializer):
     name = serializers.CharField(validators=[validate_table_name])
     fields = serializers.ListField(child=serializers.DictField(), validators=[validate_fields])
+    partitioning = serializers.DictField(required=False, allow_null=True, validators=[validate_partitioning])
 
     class Meta:
         model = DynamicTable
-        fields = ["id", "name", "fields"]
+        fields = ["id", "name", "fields", "partitioning"]
 
     def to_internal_value(self, data):
         if data.get("fields"):
             data["fields"] = merge_same_named_fields(data["fields"])
         return super().to_internal_value(data)
 
+    def validate(self, attrs):
+        if attrs.get("partitioning"):
+            partitioning = Partitioning(**attrs["partitioning"])
+            try:
+                check_partitioning(partitioning, attrs["fields"])
+            except DynamicTableRepositoryException as exc:
+                raise serializers.ValidationError({"partitioning": str(exc)})
+            attrs["partitioning"] = partitioning.model_dump(mode="json", exclude_none=True)
+        return attrs
+
+
+class DynamicTableBulkCreateSerializer(serializers.ListSerializer):
+    child = DynamicTableCreateSerializer()
+
+    def to_internal_value(self, data):
+        if isinstance(data, list) and len(data) > settings.DATALEX_TABLE_BULK_MAX_SIZE:
+            raise serializers.ValidationError(f"At most {settings.DATALEX_TABLE_BULK_MAX_SIZE} tables at once.")
+        attrs = super().to_internal_value(data)
+        # Errors per table, in the same shape as the ones of the tables themselves.
+        names = [item["name"] for item in attrs]
+        taken = set(DynamicTable.objects.filter(name__in=names).values_list("name", flat=True))
+        seen: Set[str] = set()
+        errors = []
+        for name in names:
+            errors.append({"name": ["A table with this name already exists."]} if name in taken or name in seen else {})
+            seen.add(name)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return attrs
+
+    def create(self, validated_data):
+        return DynamicTable.objects.bulk_create([DynamicTable(**item) for item in validated_data])
+
 
 class DynamicTableUpdateSerializer(serializers.ModelSerializer):
     fields = serializers.ListField(child=serializers.DictField(), validators=[validate_fields])
@@ -44,6 +88,28 @@ class DynamicTableUpdateSerializer(serializers.ModelSerializer):
             data["fields"] = merge_same_named_fields(data["fields"])
         return super().to_internal_value(data)
 
+    def update(self, instance, validated_data):
+        # Only "fields" is written so that a concurrent version bump by the repository is never overwritten.
+        instance.fields = validated_data["fields"]
+        instance.save(update_fields=["fields"])
+        return instance
+
+
+class SchemaMigrationJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SchemaMigrationJob
+        fields = [
+            "id",
+            "field_name",
+            "old_field_type",
+            "new_field_type",
+            "status",
+            "rows_done",
+            "error",
+            "created_at",
+            "updated_at",
+        ]
+
 
 def merge_same_named_fields(fields: list):
     fields_without_dupes = {f["name"]: f for f in fields}
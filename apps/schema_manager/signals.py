@@ -0,0 +1,10 @@
+from django.dispatch import Signal
+
+# Sent with ``table_id`` and ``model`` whenever the repository (re)builds a dynamic table model.
+dynamic_table_changed = Signal()
+
+# Sent with ``table_id`` and ``model`` when the repository drops a model from its bounded cache.
+dynamic_table_evicted = Signal()
+
+# Sent with ``table_id`` when rows of a table are changed by the schema manager, e.g. by dropping a partition.
+dynamic_table_rows_changed = Signal()
@@ -1,9 +1,40 @@
+import gc
+import warnings
+import weakref
+
+from io import StringIO
+from unittest import skipUnless
+
+from django.apps import apps
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
 from django.utils.crypto import get_random_string
 from django.urls import reverse
-from apps.schema_manager.repositores import get_dynamic_table_model
+from apps.schema_manager.repositores import (
+    DynamicTableRepository,
+    dynamic_table_repo_factory,
+    get_dynamic_table_model,
+    get_existing_user_index_names,
+    get_natural_key,
+    get_search_vector,
+    get_user_index_name,
+    requires_table_rewrite,
+)
+from apps.schema_manager.online_migrations import prepare_shadow_column, run_schema_migration_job
+from rest_framework.test import APIClient
+
+from datalex.test_utils import ApiTestCase, dynamic_table_factory, get_table_index_names
+from .models import CHANGE_COLUMN, DynamicTable, IndexType, Partitioning, SchemaMigrationJob
+from .partitions import ensure_range_partitions
+
 
-from datalex.test_utils import ApiTestCase
-from .models import DynamicTable
+def trigram_available() -> bool:
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        return cursor.fetchone() is not None
 
 
 def valid_payload_factory() -> dict:
@@ -67,6 +98,10 @@ class TestDynamicTableCreate(ApiTestCase):
         resp = self.api_client.post(reverse("table-create"), payload, format="json")
         self.assertEqual(resp.status_code, 400)
 
+        payload["fields"][1]["name"] = CHANGE_COLUMN
+        resp = self.api_client.post(reverse("table-create"), payload, format="json")
+        self.assertEqual(resp.status_code, 400)
+
     def test_bad_field_type(self):
         payload = {
             "name": "schema_with_underscores",
@@ -94,6 +129,39 @@ class TestDynamicTableCreate(ApiTestCase):
         self.assertIn({"name": "field2", "field_type": "string"}, created_table.fields)
 
 
+class TestDynamicTableBulkCreate(ApiTestCase):
+    def test_normal_post(self):
+        payloads = [valid_payload_factory() for _ in range(20)]
+        payloads[0]["fields"][0]["index"] = "unique"
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.api_client.post(reverse("table-bulk-create"), payloads, format="json")
+        self.assertEqual(resp.status_code, 201, resp.data)
+        self.assertEqual([table["name"] for table in resp.data], [p["name"] for p in payloads])
+        self.assertEqual(DynamicTable.objects.count(), 20)
+
+        for table in resp.data:
+            model = dynamic_table_repo_factory().get_by_id(table["id"])
+            self.assertEqual(model.objects.count(), 0)
+        model = dynamic_table_repo_factory().get_by_id(resp.data[0]["id"])
+        self.assertEqual(len(get_existing_user_index_names(model)), 1)
+
+    def test_all_or_nothing(self):
+        existing = valid_payload_factory()
+        self.api_client.post(reverse("table-create"), existing, format="json")
+        payloads = [valid_payload_factory(), valid_payload_factory()]
+        for bad_payloads, errors in (
+            (payloads + [{"name": "bad name", "fields": []}], [{}, {}, {"name": [...]}]),
+            (payloads + [payloads[0]], [{}, {}, {"name": [...]}]),
+            (payloads + [existing], [{}, {}, {"name": [...]}]),
+        ):
+            resp = self.api_client.post(reverse("table-bulk-create"), bad_payloads, format="json")
+            self.assertEqual(resp.status_code, 400)
+            self.assertEqual([list(e) for e in resp.data], [list(e) for e in errors])
+        resp = self.api_client.post(reverse("table-bulk-create"), existing, format="json")
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(DynamicTable.objects.count(), 1)
+
+
 class TestDynamicTableUpdate(ApiTestCase):
     def test_add_alter_delete(self):
         test_table_name = "master_table"
@@ -133,3 +201,536 @@ class TestDynamicTableUpdate(ApiTestCase):
         # check the rollback happened and we did not store any data
         payload["fields"][1]["field_type"] = "string"
         self.assertEqual(DynamicTable.objects.first().fields, payload["fields"])
+
+
+class TestSchemaVersionCoherence(ApiTestCase):
+    def test_other_worker_picks_up_changes(self):
+        payload = valid_payload_factory()
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.api_client.post(reverse("table-create"), payload, format="json")
+        table_id = resp.data["id"]
+        other_worker_repo = DynamicTableRepository()
+        other_worker_repo.get_by_id(table_id)
+        self.assertEqual(other_worker_repo.versions[table_id], 1)
+
+        payload["fields"].append({"name": "added_field", "field_type": "boolean"})
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.api_client.put(reverse("table-update", kwargs={"pk": table_id}), payload, format="json")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(DynamicTable.objects.get(pk=table_id).version, 2)
+        self.assertEqual(dynamic_table_repo_factory().versions[table_id], 2)
+
+        stale_model = other_worker_repo.tables[table_id]
+        model = other_worker_repo.get_by_id(table_id)
+        self.assertIsNot(model, stale_model)
+        self.assertIn("added_field", [f.name for f in model._meta.get_fields()])
+        self.assertIs(other_worker_repo.get_by_id(table_id), model)
+
+    def test_table_created_by_other_worker(self):
+        repo = DynamicTableRepository()
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.api_client.post(reverse("table-create"), valid_payload_factory(), format="json")
+        self.assertNotIn(resp.data["id"], repo.tables)
+        self.assertEqual(repo.get_by_id(resp.data["id"])._meta.object_name, resp.data["name"])
+        with self.assertRaises(KeyError):
+            repo.get_by_id(resp.data["id"] + 1000)
+
+
+class TestDynamicTableRepositoryCache(ApiTestCase):
+    def test_lazy_bounded_lru(self):
+        table_ids = []
+        for _ in range(3):
+            resp = self.api_client.post(reverse("table-create"), valid_payload_factory(), format="json")
+            table_ids.append(resp.data["id"])
+
+        repo = DynamicTableRepository(max_tables=2)
+        self.assertEqual(len(repo.tables), 0)
+        repo.get_by_id(table_ids[0])
+        repo.get_by_id(table_ids[1])
+        repo.get_by_id(table_ids[0])
+        repo.get_by_id(table_ids[2])
+        self.assertEqual(list(repo.tables), [table_ids[0], table_ids[2]])
+        self.assertEqual(set(repo.versions), {table_ids[0], table_ids[2]})
+
+        repo.get_by_id(table_ids[1])
+        self.assertEqual(list(repo.tables), [table_ids[2], table_ids[1]])
+
+    def test_warm_up(self):
+        for _ in range(3):
+            self.api_client.post(reverse("table-create"), valid_payload_factory(), format="json")
+        repo = DynamicTableRepository(max_tables=2)
+        tables = repo.init_repo()
+        self.assertEqual(list(tables), list(DynamicTable.objects.order_by("pk").values_list("pk", flat=True))[1:])
+
+    def test_update_of_table_not_in_cache(self):
+        payload = valid_payload_factory()
+        resp = self.api_client.post(reverse("table-create"), payload, format="json")
+        table_id = resp.data["id"]
+        dynamic_table_repo_factory().tables.pop(table_id)
+        dynamic_table_repo_factory().versions.pop(table_id)
+
+        payload["fields"][0]["field_type"] = "boolean"
+        resp = self.api_client.put(reverse("table-update", kwargs={"pk": table_id}), payload, format="json")
+        self.assertEqual(resp.status_code, 200)
+        table_model = dynamic_table_repo_factory().get_by_id(table_id)
+        table_model.objects.create(**{payload["fields"][0]["name"]: True, payload["fields"][1]["name"]: "x"})
+        self.assertEqual(table_model.objects.count(), 1)
+
+
+class TestDynamicTableModelFactory(SimpleTestCase):
+    def test_rebuilt_models_are_released(self):
+        fields = [{"name": "f1", "field_type": "number"}]
+        registered_models = dict(apps.all_models[DynamicTable._meta.app_label])
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            first_model = weakref.ref(get_dynamic_table_model("rebuilt_table", fields))
+            other_models = [weakref.ref(get_dynamic_table_model(f"table_{i}", fields)) for i in range(100)]
+            model = get_dynamic_table_model("rebuilt_table", fields)
+        gc.collect()
+
+        self.assertIsNone(first_model())
+        self.assertTrue(all(other_model() is None for other_model in other_models))
+        self.assertEqual(apps.all_models[DynamicTable._meta.app_label], registered_models)
+        self.assertEqual(model._meta.db_table, "user_tables__rebuilt_table")
+        self.assertEqual(model._meta.app_label, DynamicTable._meta.app_label)
+
+
+class TestDynamicTableIndexes(ApiTestCase):
+    def create_table(self, fields: list) -> int:
+        resp = self.api_client.post(reverse("table-create"), {"name": "indexed", "fields": fields}, format="json")
+        self.assertEqual(resp.status_code, 201, resp.data)
+        return resp.data["id"]
+
+    def put_fields(self, table_id: int, fields: list):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.api_client.put(
+                reverse("table-update", kwargs={"pk": table_id}), {"fields": fields}, format="json"
+            )
+
+    def test_indexes_on_create(self):
+        table_id = self.create_table(
+            [
+                {"name": "f1", "field_type": "number", "index": "btree"},
+                {"name": "f2", "field_type": "string", "index": "unique"},
+                {"name": "f3", "field_type": "boolean"},
+            ]
+        )
+        model = dynamic_table_repo_factory().get_by_id(table_id)
+        self.assertEqual(
+            get_existing_user_index_names(model),
+            {
+                get_user_index_name("indexed", ["f1"], IndexType.btree): False,
+                get_user_index_name("indexed", ["f2"], IndexType.unique): True,
+            },
+        )
+        resp = self.api_client.post(
+            reverse("row-create", kwargs={"table_id": table_id}), {"f1": 1, "f2": "a", "f3": True}
+        )
+        self.assertEqual(resp.status_code, 201)
+        resp = self.api_client.post(
+            reverse("row-create", kwargs={"table_id": table_id}), {"f1": 2, "f2": "a", "f3": True}
+        )
+        self.assertEqual(resp.status_code, 400)
+
+    def test_add_and_drop_indexes(self):
+        table_id = self.create_table([{"name": "f1", "field_type": "number"}, {"name": "f2", "field_type": "string"}])
+        model = dynamic_table_repo_factory().get_by_id(table_id)
+        model.objects.bulk_create([model(f1=i, f2=str(i)) for i in range(10)])
+
+        resp = self.put_fields(
+            table_id,
+            [
+                {"name": "f1", "field_type": "number", "index": "btree"},
+                {"name": "f2", "field_type": "string", "index": "unique"},
+            ],
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(get_existing_user_index_names(model)), 2)
+
+        resp = self.put_fields(
+            table_id, [{"name": "f1", "field_type": "boolean"}, {"name": "f2", "field_type": "string"}]
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(get_existing_user_index_names(model), {})
+
+    def test_natural_key(self):
+        table_id = self.create_table(
+            [{"name": "f1", "field_type": "string", "natural_key": True}, {"name": "f2", "field_type": "number"}]
+        )
+        model = dynamic_table_repo_factory().get_by_id(table_id)
+        self.assertEqual(get_natural_key(model), ["f1"])
+        self.assertEqual(len(get_existing_user_index_names(model)), 1)
+
+        resp = self.put_fields(
+            table_id,
+            [
+                {"name": "f1", "field_type": "string", "natural_key": True},
+                {"name": "f2", "field_type": "number", "natural_key": True},
+            ],
+        )
+        self.assertEqual(resp.status_code, 200, resp.data)
+        model = dynamic_table_repo_factory().get_by_id(table_id)
+        self.assertEqual(get_natural_key(model), ["f1", "f2"])
+        self.assertEqual(len(get_existing_user_index_names(model)), 1)
+
+        resp = self.put_fields(table_id, [{"name": "f1", "field_type": "string"}])
+        self.assertEqual(resp.status_code, 200, resp.data)
+        self.assertEqual(get_existing_user_index_names(model), {})
+
+    def test_bad_index(self):
+        for field in (
+            {"name": "f1", "field_type": "number", "index": "trigram"},
+            {"name": "f1", "field_type": "number", "index": "hash"},
+        ):
+            resp = self.api_client.post(
+                reverse("table-create"), {"name": "bad_index", "fields": [field]}, format="json"
+            )
+            self.assertEqual(resp.status_code, 400)
+
+    def test_search_index(self):
+        table_id = self.create_table([{"name": "f1", "field_type": "string"}, {"name": "f2", "field_type": "number"}])
+        model = dynamic_table_repo_factory().get_by_id(table_id)
+        self.assertIsNone(get_search_vector(model))
+
+        resp = self.put_fields(
+            table_id, [{"name": "f1", "field_type": "string", "search": True}, {"name": "f2", "field_type": "number"}]
+        )
+        self.assertEqual(resp.status_code, 200, resp.data)
+        model = dynamic_table_repo_factory().get_by_id(table_id)
+        self.assertIsNotNone(get_search_vector(model))
+        self.assertEqual(len(get_existing_user_index_names(model)), 1)
+
+        resp = self.put_fields(table_id, [{"name": "f1", "field_type": "string"}])
+        self.assertEqual(resp.status_code, 200, resp.data)
+        self.assertEqual(get_existing_user_index_names(model), {})
+
+    def test_bad_search_field(self):
+        for field in (
+            {"name": "f1", "field_type": "number", "search": True},
+            {"name": "_dlx_f1", "field_type": "string"},
+        ):
+            resp = self.api_client.post(
+                reverse("table-create"), {"name": "bad_search", "fields": [field]}, format="json"
+            )
+            self.assertEqual(resp.status_code, 400, field)
+
+    def test_trigram_index(self):
+        if not trigram_available():
+            self.skipTest("pg_trgm extension is not available")
+        table_id = self.create_table([{"name": "f1", "field_type": "string", "index": "trigram"}])
+        model = dynamic_table_repo_factory().get_by_id(table_id)
+        self.assertEqual(len(get_existing_user_index_names(model)), 1)
+
+
+class TestConcurrentIndexBuild(TransactionTestCase):
+    def setUp(self):
+        self.api_client = APIClient()
+        self.name = f"concurrent_{get_random_string(10)}"
+        resp = self.api_client.post(
+            reverse("table-create"),
+            {"name": self.name, "fields": [{"name": "f1", "field_type": "number"}]},
+            format="json",
+        )
+        self.table_id = resp.data["id"]
+        self.model = dynamic_table_repo_factory().get_by_id(self.table_id)
+
+    def add_unique_index(self):
+        return self.api_client.put(
+            reverse("table-update", kwargs={"pk": self.table_id}),
+            {"fields": [{"name": "f1", "field_type": "number", "index": "unique"}]},
+            format="json",
+        )
+
+    def test_index_built_outside_of_transaction(self):
+        self.model.objects.bulk_create([self.model(f1=i) for i in range(10)])
+        resp = self.add_unique_index()
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn(get_user_index_name(self.name, ["f1"], IndexType.unique), get_table_index_names(self.model))
+
+    def test_failed_build_is_cleaned_up_and_retried(self):
+        self.model.objects.bulk_create([self.model(f1=1), self.model(f1=1)])
+        with self.assertLogs("apps.schema_manager.repositores", "WARNING"):
+            resp = self.add_unique_index()
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.data["index_errors"]), 1)
+        self.assertEqual(DynamicTable.objects.get(pk=self.table_id).fields[0]["index"], "unique")
+        self.assertEqual(get_existing_user_index_names(self.model), {})
+
+        self.model.objects.filter(pk=self.model.objects.order_by("pk").last().pk).delete()
+        resp = self.add_unique_index()
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(get_existing_user_index_names(self.model)), 1)
+
+    @override_settings(DATALEX_SCHEMA_JOBS_IN_BACKGROUND=False)
+    def test_failed_build_does_not_hold_migration_jobs(self):
+        url = reverse("table-update", kwargs={"pk": self.table_id})
+        fields = [{"name": "f1", "field_type": "number"}, {"name": "f2", "field_type": "number"}]
+        self.api_client.put(url, {"fields": fields}, format="json")
+        model = dynamic_table_repo_factory().get_by_id(self.table_id)
+        model.objects.bulk_create([model(f1=1, f2=1), model(f1=2, f2=1)])
+
+        fields = [{"name": "f1", "field_type": "string"}, {"name": "f2", "field_type": "number", "index": "unique"}]
+        with self.assertLogs("apps.schema_manager.repositores", "WARNING"):
+            resp = self.api_client.put(url + "?online=1", {"fields": fields}, format="json")
+        self.assertEqual(resp.status_code, 202, resp.data)
+        self.assertEqual(len(resp.data["index_errors"]), 1)
+        self.assertEqual(SchemaMigrationJob.objects.get(table_id=self.table_id).status, SchemaMigrationJob.Status.done)
+
+
+@override_settings(DATALEX_SCHEMA_JOBS_IN_BACKGROUND=False)
+class TestOnlineSchemaMigration(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.table_id, self.model = dynamic_table_factory(
+            "online", [{"name": "f1", "field_type": "number", "index": "btree"}, {"name": "f2", "field_type": "string"}]
+        )
+
+    def put_fields(self, fields: list, execute: bool = True):
+        with self.captureOnCommitCallbacks(execute=execute):
+            return self.api_client.put(
+                reverse("table-update", kwargs={"pk": self.table_id}) + "?online=1", {"fields": fields}, format="json"
+            )
+
+    def test_requires_table_rewrite(self):
+        old_model = get_dynamic_table_model("rewrite", [{"name": "f1", "field_type": "number"}])
+        for field_type, expected in (("number", False), ("string", True), ("boolean", True)):
+            new_model = get_dynamic_table_model("rewrite", [{"name": "f1", "field_type": field_type}])
+            self.assertEqual(
+                requires_table_rewrite(old_model._meta.get_field("f1"), new_model._meta.get_field("f1")), expected
+            )
+
+    def test_type_change_runs_as_job(self):
+        self.model.objects.bulk_create([self.model(f1=i, f2=str(i)) for i in range(10)])
+        resp = self.put_fields(
+            [{"name": "f1", "field_type": "string", "index": "btree"}, {"name": "f2", "field_type": "number"}],
+            execute=False,
+        )
+        self.assertEqual(resp.status_code, 202, resp.data)
+        self.assertEqual(len(resp.data["migrations"]), 2)
+        self.assertEqual(
+            [f["field_type"] for f in DynamicTable.objects.get(pk=self.table_id).fields], ["number", "string"]
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            jobs = [run_schema_migration_job(job["id"]) for job in resp.data["migrations"]]
+        self.assertEqual([job.status for job in jobs], [SchemaMigrationJob.Status.done] * 2)
+        self.assertEqual([job.rows_done for job in jobs], [10, 10])
+
+        schema_model = DynamicTable.objects.get(pk=self.table_id)
+        self.assertEqual([f["field_type"] for f in schema_model.fields], ["string", "number"])
+        self.assertEqual(schema_model.version, 4)
+        model = dynamic_table_repo_factory().get_by_id(self.table_id)
+        self.assertEqual(sorted(model.objects.values_list("f1", "f2")), sorted((str(i), i) for i in range(10)))
+        self.assertIn(get_user_index_name("online", ["f1"], IndexType.btree), get_existing_user_index_names(model))
+
+    def test_rows_written_during_job_are_synced(self):
+        self.model.objects.create(f1=1, f2="1")
+        resp = self.put_fields([{"name": "f1", "field_type": "number"}, {"name": "f2", "field_type": "number"}], False)
+        job = SchemaMigrationJob.objects.get(pk=resp.data["migrations"][0]["id"])
+        prepare_shadow_column(self.model, job)
+        self.model.objects.create(f1=2, f2="2")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            job = run_schema_migration_job(job.pk)
+        self.assertEqual(job.status, SchemaMigrationJob.Status.done)
+        model = dynamic_table_repo_factory().get_by_id(self.table_id)
+        self.assertEqual(sorted(model.objects.values_list("f2", flat=True)), [1, 2])
+
+    def test_failed_cast_leaves_schema_unchanged(self):
+        self.model.objects.bulk_create([self.model(f1=1, f2="1"), self.model(f1=2, f2="two")])
+        resp = self.put_fields([{"name": "f1", "field_type": "number"}, {"name": "f2", "field_type": "number"}])
+        self.assertEqual(resp.status_code, 202)
+
+        job = SchemaMigrationJob.objects.get(pk=resp.data["migrations"][0]["id"])
+        self.assertEqual(job.status, SchemaMigrationJob.Status.failed)
+        self.assertTrue(job.error)
+        self.assertEqual(DynamicTable.objects.get(pk=self.table_id).fields[1]["field_type"], "string")
+        columns = [
+            c.name
+            for c in connection.introspection.get_table_description(connection.cursor(), self.model._meta.db_table)
+        ]
+        self.assertEqual(columns, ["id", "f1", "f2", CHANGE_COLUMN])
+        self.assertEqual(sorted(self.model.objects.values_list("f2", flat=True)), ["1", "two"])
+
+    def test_update_rejected_while_job_is_active(self):
+        fields = [{"name": "f1", "field_type": "string"}, {"name": "f2", "field_type": "string"}]
+        resp = self.put_fields(fields, execute=False)
+        self.assertEqual(resp.status_code, 202)
+        resp = self.put_fields(fields, execute=False)
+        self.assertEqual(resp.status_code, 400)
+
+    def test_migration_status(self):
+        resp = self.put_fields([{"name": "f1", "field_type": "string"}, {"name": "f2", "field_type": "string"}])
+        job_id = resp.data["migrations"][0]["id"]
+        resp = self.api_client.get(reverse("table-migration", kwargs={"table_id": self.table_id, "pk": job_id}))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data["status"], "done")
+        self.assertEqual(resp.data["new_field_type"], "string")
+        resp = self.api_client.get(reverse("table-migration", kwargs={"table_id": self.table_id + 1, "pk": job_id}))
+        self.assertEqual(resp.status_code, 404)
+
+    def test_changes_without_rewrite_stay_synchronous(self):
+        resp = self.put_fields([{"name": "f1", "field_type": "number"}, {"name": "f3", "field_type": "boolean"}])
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotIn("migrations", resp.data)
+
+
+@skipUnless(connection.vendor == "postgresql", "partitioning is only supported on PostgreSQL")
+class TestPartitioning(ApiTestCase):
+    def create_table(self, name: str, fields: list, partitioning: dict):
+        resp = self.api_client.post(
+            reverse("table-create"), {"name": name, "fields": fields, "partitioning": partitioning}, format="json"
+        )
+        self.assertEqual(resp.status_code, 201, resp.data)
+        return resp.data["id"], dynamic_table_repo_factory().get_by_id(resp.data["id"])
+
+    def get_partitions(self, table_id: int) -> list:
+        resp = self.api_client.get(reverse("table-partitions", kwargs={"pk": table_id}))
+        self.assertEqual(resp.status_code, 200, resp.data)
+        return resp.data["partitions"]
+
+    def get_partition_of_rows(self, model) -> dict:
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT id, tableoid::regclass::text FROM {model._meta.db_table}")
+            return dict(cursor.fetchall())
+
+    def test_range_partitions_follow_writes_and_are_dropped(self):
+        table_id, model = self.create_table(
+            "ranged", [{"name": "f1", "field_type": "number"}], {"strategy": "range", "interval": 10, "premake": 2}
+        )
+        self.assertEqual(
+            [(p.get("from"), p.get("to"), p.get("default", False)) for p in self.get_partitions(table_id)],
+            [(None, None, True), (0, 10, False), (10, 20, False)],
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.api_client.post(
+                reverse("row-bulk-create", kwargs={"table_id": table_id}),
+                [{"f1": i} for i in range(15)],
+                format="json",
+            )
+        self.assertEqual(resp.status_code, 201, resp.data)
+        self.assertEqual([p.get("to") for p in self.get_partitions(table_id)][1:], [10, 20, 30, 40])
+        partition_of_rows = self.get_partition_of_rows(model)
+        self.assertEqual(len(partition_of_rows), 15)
+        self.assertNotIn(f"{model._meta.db_table}_default", partition_of_rows.values())
+
+        resp = self.api_client.delete(reverse("table-partitions", kwargs={"pk": table_id}) + "?before=10")
+        self.assertEqual(resp.status_code, 200, resp.data)
+        self.assertEqual(resp.data["dropped"], [f"{model._meta.db_table}_p0"])
+        self.assertEqual(sorted(model.objects.values_list("id", flat=True)), list(range(10, 16)))
+
+    def test_rows_are_moved_out_of_the_default_partition(self):
+        table_id, model = self.create_table(
+            "ranged_by_column",
+            [{"name": "f1", "field_type": "number", "index": "unique"}, {"name": "f2", "field_type": "string"}],
+            {"strategy": "range", "column": "f1", "interval": 100, "premake": 1},
+        )
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            resp = self.api_client.post(reverse("row-create", kwargs={"table_id": table_id}), {"f1": 550, "f2": "a"})
+        self.assertEqual(resp.status_code, 201, resp.data)
+        self.assertTrue(callbacks)
+        self.assertEqual([p.get("from") for p in self.get_partitions(table_id)][1:], list(range(0, 700, 100)))
+        self.assertEqual(self.get_partition_of_rows(model), {resp.data["id"]: f"{model._meta.db_table}_p5"})
+
+        resp = self.api_client.post(reverse("row-create", kwargs={"table_id": table_id}), {"f1": 550, "f2": "b"})
+        self.assertEqual(resp.status_code, 400)
+        resp = self.api_client.post(
+            reverse("row-create", kwargs={"table_id": table_id}), {"f1": None, "f2": "c"}, format="json"
+        )
+        self.assertEqual(resp.status_code, 400)
+
+    def test_range_partitions_recreated_from_the_lowest_stored_value(self):
+        partitioning = {"strategy": "range", "column": "f1", "interval": 10, "premake": 2}
+        table_id, model = self.create_table("recreated", [{"name": "f1", "field_type": "number"}], partitioning)
+        resp = self.api_client.delete(reverse("table-partitions", kwargs={"pk": table_id}) + "?before=20")
+        self.assertEqual(len(resp.data["dropped"]), 2)
+        created = ensure_range_partitions(model, Partitioning(**partitioning), 20)
+        self.assertEqual(created, [f"{model._meta.db_table}_p0", f"{model._meta.db_table}_p1"])
+
+        self.api_client.delete(reverse("table-partitions", kwargs={"pk": table_id}) + "?before=20")
+        model.objects.bulk_create([model(f1=35), model(f1=37)])
+        created = ensure_range_partitions(model, Partitioning(**partitioning), 60)
+        self.assertEqual([p.get("from") for p in self.get_partitions(table_id)][1:], [30, 40, 50])
+        self.assertEqual(len(created), 3)
+        self.assertEqual(set(self.get_partition_of_rows(model).values()), {f"{model._meta.db_table}_p3"})
+
+    def test_hash_partitions(self):
+        table_id, model = self.create_table(
+            "hashed", [{"name": "f1", "field_type": "string"}], {"strategy": "hash", "partitions": 4}
+        )
+        model.objects.bulk_create([model(f1=str(i)) for i in range(100)])
+        partitions = self.get_partitions(table_id)
+        self.assertEqual([(p["modulus"], p["remainder"]) for p in partitions], [(4, r) for r in range(4)])
+        self.assertEqual(len(set(self.get_partition_of_rows(model).values())), 4)
+        resp = self.api_client.delete(reverse("table-partitions", kwargs={"pk": table_id}) + "?before=10")
+        self.assertEqual(resp.status_code, 400)
+
+    def test_bad_partitioning(self):
+        fields = [
+            {"name": "f1", "field_type": "string"},
+            {"name": "f2", "field_type": "number"},
+            {"name": "f3", "field_type": "number", "index": "unique"},
+        ]
+        for partitioning in (
+            {"strategy": "list"},
+            {"strategy": "range"},
+            {"strategy": "hash", "partitions": 1},
+            {"strategy": "range", "column": "f1", "interval": 10},
+            {"strategy": "range", "column": "missing", "interval": 10},
+            {"strategy": "range", "column": "f2", "interval": 10},
+        ):
+            resp = self.api_client.post(
+                reverse("table-create"),
+                {"name": "bad_partitioning", "fields": fields, "partitioning": partitioning},
+                format="json",
+            )
+            self.assertEqual(resp.status_code, 400, partitioning)
+        fields = [{"name": "f1", "field_type": "string", "natural_key": True}, {"name": "f2", "field_type": "number"}]
+        for partitioning in (
+            {"strategy": "range", "interval": 10},
+            {"strategy": "range", "column": "f2", "interval": 10},
+        ):
+            resp = self.api_client.post(
+                reverse("table-create"),
+                {"name": "bad_partitioning", "fields": fields, "partitioning": partitioning},
+                format="json",
+            )
+            self.assertEqual(resp.status_code, 400, partitioning)
+        self.assertFalse(DynamicTable.objects.exists())
+
+    def test_partitioning_column_cannot_change(self):
+        table_id, _ = self.create_table(
+            "ranged_update",
+            [{"name": "f1", "field_type": "number"}],
+            {"strategy": "range", "column": "f1", "interval": 10},
+        )
+        for fields in ([{"name": "f1", "field_type": "string"}], [{"name": "f2", "field_type": "number"}]):
+            resp = self.api_client.put(
+                reverse("table-update", kwargs={"pk": table_id}), {"fields": fields}, format="json"
+            )
+            self.assertEqual(resp.status_code, 400)
+        resp = self.api_client.put(
+            reverse("table-update", kwargs={"pk": table_id}),
+            {
+                "fields": [
+                    {"name": "f1", "field_type": "number", "index": "btree"},
+                    {"name": "f2", "field_type": "boolean"},
+                ]
+            },
+            format="json",
+        )
+        self.assertEqual(resp.status_code, 200, resp.data)
+        self.assertEqual(DynamicTable.objects.get(pk=table_id).fields[0]["field_type"], "number")
+
+    def test_premake_command(self):
+        table_id, model = self.create_table(
+            "ranged_command",
+            [{"name": "f1", "field_type": "number"}],
+            {"strategy": "range", "interval": 10, "premake": 1},
+        )
+        model.objects.bulk_create([model(f1=i) for i in range(25)])
+        out = StringIO()
+        call_command("manage_partitions", table=table_id, stdout=out)
+        self.assertIn("3 partition(s) created", out.getvalue())
+        self.assertEqual(self.get_partitions(table_id)[-1]["to"], 40)
@@ -1,3 +1,4 @@
+from typing import List
 from rest_framework import generics, mixins, status
 from rest_framework.response import Response
 from rest_framework.exceptions import ValidationError
@@ -5,9 +6,17 @@ from django.db import transaction
 from django.db.utils import IntegrityError
 
 from .exceptions import DynamicTableRepositoryException
-from .serializers import DynamicTableCreateSerializer, DynamicTableUpdateSerializer
+from .serializers import (
+    DynamicTableBulkCreateSerializer,
+    DynamicTableCreateSerializer,
+    DynamicTableUpdateSerializer,
+    SchemaMigrationJobSerializer,
+)
 from .repositores import dynamic_table_repo_factory
-from .models import DynamicTable
+from .models import DynamicTable, PartitionStrategy, Partitioning, SchemaMigrationJob
+from .online_migrations import start_schema_migration_jobs
+from .partitions import drop_range_partitions, forget_range_upper_bound, get_partitions
+from .signals import dynamic_table_rows_changed
 
 
 class DynamicTableCreateView(mixins.CreateModelMixin, generics.GenericAPIView):
@@ -30,25 +39,101 @@ class DynamicTableCreateView(mixins.CreateModelMixin, generics.GenericAPIView):
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
 
+class DynamicTableBulkCreateView(generics.GenericAPIView):
+    """Creates many tables in a single transaction, all of them or none."""
+
+    serializer_class = DynamicTableBulkCreateSerializer
+    queryset = DynamicTable.objects.all()
+
+    @transaction.atomic
+    def post(self, request, *args, **kwargs):
+        if not isinstance(request.data, list):
+            raise ValidationError("Expected a JSON array of tables.")
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            serializer.save()
+        except IntegrityError as exc:
+            raise ValidationError(str(exc))
+        try:
+            dynamic_table_repo_factory().add_many(serializer.instance)
+        except DynamicTableRepositoryException as exc:
+            raise ValidationError(exc)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
 class DynamicTableUpdateView(mixins.UpdateModelMixin, generics.GenericAPIView):
     serializer_class = DynamicTableUpdateSerializer
     queryset = DynamicTable.objects.all()
 
     def put(self, request, *args, **kwargs):
-        return self.update(request, *args, **kwargs)
+        # Filled after commit with the new indexes which could not be built, the schema change itself is kept.
+        self.index_errors: List[str] = []
+        response = self.update(request, *args, **kwargs)
+        if self.index_errors:
+            response.data = {**response.data, "index_errors": self.index_errors}
+        return response
 
     @transaction.atomic
     def update(self, request, *args, **kwargs):
         instance = self.get_object()
+        old_fields = instance.fields
         serializer = self.get_serializer(instance, data=request.data, partial=False)
         serializer.is_valid(raise_exception=True)
         self.perform_update(serializer)
+        online = request.query_params.get("online") in ("1", "true")
         try:
-            dynamic_table_repo_factory().update(serializer.instance)
+            dynamic_table_repo_factory().update(
+                serializer.instance, old_fields, online=online, index_errors=self.index_errors
+            )
         except DynamicTableRepositoryException as exc:
             raise ValidationError(exc)
 
         if getattr(instance, "_prefetched_objects_cache", None):
             instance._prefetched_objects_cache = {}
 
+        jobs = list(instance.migration_jobs.filter(status=SchemaMigrationJob.Status.pending))
+        if jobs:
+            job_ids = [job.pk for job in jobs]
+            transaction.on_commit(lambda: start_schema_migration_jobs(job_ids))
+            data = {**serializer.data, "migrations": SchemaMigrationJobSerializer(jobs, many=True).data}
+            return Response(data, status=status.HTTP_202_ACCEPTED)
         return Response(serializer.data)
+
+
+class SchemaMigrationJobView(generics.RetrieveAPIView):
+    serializer_class = SchemaMigrationJobSerializer
+
+    def get_queryset(self):
+        return SchemaMigrationJob.objects.filter(table_id=self.kwargs["table_id"])
+
+
+class DynamicTablePartitionsView(generics.GenericAPIView):
+    queryset = DynamicTable.objects.all()
+
+    def get(self, request, *args, **kwargs):
+        instance = self.get_partitioned_table()
+        model = dynamic_table_repo_factory().get_by_id(instance.pk)
+        return Response({"partitioning": instance.partitioning, "partitions": get_partitions(model)})
+
+    @transaction.atomic
+    def delete(self, request, *args, **kwargs):
+        instance = self.get_partitioned_table()
+        if Partitioning(**instance.partitioning).strategy != PartitionStrategy.range:
+            raise ValidationError("Only range partitions can be dropped.")
+        try:
+            before = int(request.query_params["before"])
+        except (KeyError, ValueError):
+            raise ValidationError({"before": "A valid integer is required."})
+        model = dynamic_table_repo_factory().get_by_id(instance.pk)
+        dropped = drop_range_partitions(model, before)
+        forget_range_upper_bound(instance.pk)
+        if dropped:
+            dynamic_table_rows_changed.send(sender=self.__class__, table_id=instance.pk)
+        return Response({"dropped": dropped})
+
+    def get_partitioned_table(self) -> DynamicTable:
+        instance = self.get_object()
+        if not instance.partitioning:
+            raise ValidationError("The table is not partitioned.")
+        return instance
@@ -0,0 +1,130 @@
+"""
+Response compression negotiated by ``Accept-Encoding``: zstd when the ``zstandard`` package is installed, gzip
+otherwise. Responses smaller than ``DATALEX_COMPRESSION_MIN_SIZE`` are sent as is, compressing them costs more than
+it saves. Streamed responses (exports) are compressed chunk by chunk, flushing every chunk so that they still stream.
+"""
+import re
+
+from gzip import GzipFile
+from typing import AsyncIterable, AsyncIterator, Callable, Iterable, Iterator, List, Optional, Set, Tuple
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.text import StreamingBuffer, compress_string
+
+from .instrumentation import timed
+
+try:
+    import zstandard
+except ImportError:  # Optional, only gzip is offered without it.
+    zstandard = None  # type: ignore[assignment]
+
+ZSTD_LEVEL = 3
+
+
+def get_available_encodings() -> List[str]:
+    return ["zstd", "gzip"] if zstandard is not None else ["gzip"]
+
+
+def get_accepted_encodings(header: str) -> Set[str]:
+    accepted = set()
+    for item in header.split(","):
+        coding, _, params = item.partition(";")
+        match = re.search(r"q=(\d+(?:\.\d*)?)", params)
+        if match is None or float(match[1]) > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def compress(content: bytes, encoding: str) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(content)
+    return compress_string(content)
+
+
+def get_stream_compressor(encoding: str) -> Tuple[Callable[[bytes], bytes], Callable[[], bytes]]:
+    """Returns functions compressing a chunk, flushed so that it can be sent right away, and ending the stream."""
+    if encoding == "zstd":
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        return (
+            lambda chunk: compressor.compress(chunk) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK),
+            compressor.flush,
+        )
+    buffer = StreamingBuffer()
+    gzip_file = GzipFile(mode="wb", compresslevel=6, fileobj=buffer, mtime=0)
+
+    def compress_chunk(chunk: bytes) -> bytes:
+        gzip_file.write(chunk)
+        gzip_file.flush()
+        return buffer.read()
+
+    def finish() -> bytes:
+        gzip_file.close()
+        return buffer.read()
+
+    return compress_chunk, finish
+
+
+def compress_stream(chunks: Iterable[bytes], encoding: str) -> Iterator[bytes]:
+    compress_chunk, finish = get_stream_compressor(encoding)
+    for chunk in chunks:
+        if data := compress_chunk(chunk):
+            yield data
+    yield finish()
+
+
+async def acompress_stream(chunks: AsyncIterable[bytes], encoding: str) -> AsyncIterator[bytes]:
+    compress_chunk, finish = get_stream_compressor(encoding)
+    async for chunk in chunks:
+        if data := compress_chunk(chunk):
+            yield data
+    yield finish()
+
+
+class CompressionMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(request, await self.get_response(request))
+
+    def process_response(self, request, response):
+        if response.has_header("Content-Encoding"):
+            return response
+        if not response.streaming and len(response.content) < settings.DATALEX_COMPRESSION_MIN_SIZE:
+            return response
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = self.get_encoding(request)
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = acompress_stream(response.streaming_content, encoding)
+            else:
+                response.streaming_content = compress_stream(response.streaming_content, encoding)
+            del response.headers["Content-Length"]
+        else:
+            with timed("compression"):
+                response.content = compress(response.content, encoding)
+            response.headers["Content-Length"] = str(len(response.content))
+        # The compressed bytes differ from the ones the ETag was computed for.
+        etag = response.headers.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+    def get_encoding(self, request) -> Optional[str]:
+        accepted = get_accepted_encodings(request.headers.get("Accept-Encoding", ""))
+        return next((e for e in get_available_encodings() if e in accepted), None)
@@ -0,0 +1,225 @@
+"""
+Per-request hot path instrumentation. ``InstrumentationMiddleware`` times every request, counts its SQL queries and
+collects the stage timings recorded with ``timed(stage)`` by the repository and the views. Everything is aggregated
+in process, labeled by endpoint (URL name) and table id, and exposed in the Prometheus text format at ``/metrics``.
+Stages may overlap, e.g. the ``sql`` time is also part of ``schema_lookup``.
+"""
+import threading
+import time
+
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse
+
+Labels = Tuple[Tuple[str, str], ...]
+Sample = Tuple[str, str, str, Labels, float]  # name, type, help, labels, value
+
+DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class RequestTimings:
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.sql_queries = 0
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+
+current_timings: ContextVar[Optional[RequestTimings]] = ContextVar("current_timings", default=None)
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """Adds the time spent in the block to ``stage`` of the request being served, if any."""
+    timings = current_timings.get()
+    if timings is None:
+        yield
+        return
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(stage, time.perf_counter() - started_at)
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        index = bisect_left(DURATION_BUCKETS, value)
+        if index < len(self.buckets):
+            self.buckets[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.help: Dict[str, Tuple[str, str]] = {}
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self.collectors: List[Callable[[], Iterable[Sample]]] = []
+
+    def describe(self, name: str, metric_type: str, help_text: str):
+        self.help[name] = (metric_type, help_text)
+
+    def inc(self, name: str, labels: Labels, value: float = 1.0):
+        with self.lock:
+            self.counters[(name, labels)] = self.counters.get((name, labels), 0.0) + value
+
+    def observe(self, name: str, labels: Labels, value: float):
+        with self.lock:
+            self.histograms.setdefault((name, labels), Histogram()).observe(value)
+
+    def register_collector(self, collector: Callable[[], Iterable[Sample]]):
+        """``collector`` is called on every scrape and yields samples computed at that time, e.g. cache sizes."""
+        self.collectors.append(collector)
+        return collector
+
+    def render(self) -> str:
+        lines: Dict[str, List[str]] = {}
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.setdefault(name, []).append(f"{name}{format_labels(labels)} {value:g}")
+            for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+                cumulative = 0
+                for bound, count in zip(DURATION_BUCKETS, histogram.buckets):
+                    cumulative += count
+                    bucket_labels = labels + (("le", f"{bound:g}"),)
+                    lines.setdefault(name, []).append(f"{name}_bucket{format_labels(bucket_labels)} {cumulative}")
+                lines[name].append(f'{name}_bucket{format_labels(labels + (("le", "+Inf"),))} {histogram.count}')
+                lines[name].append(f"{name}_sum{format_labels(labels)} {histogram.sum:g}")
+                lines[name].append(f"{name}_count{format_labels(labels)} {histogram.count}")
+        for collector in self.collectors:
+            for name, metric_type, help_text, labels, value in collector():
+                self.help.setdefault(name, (metric_type, help_text))
+                lines.setdefault(name, []).append(f"{name}{format_labels(labels)} {value:g}")
+
+        output = []
+        for name, metric_lines in lines.items():
+            metric_type, help_text = self.help.get(name, ("untyped", ""))
+            output += [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}", *metric_lines]
+        return "\n".join(output) + "\n"
+
+
+def format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (f'{k}="{escape_label_value(v)}"' for k, v in labels)
+    return "{" + ",".join(escaped) + "}"
+
+
+def escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+metrics = MetricsRegistry()
+metrics.describe("datalex_requests_total", "counter", "Requests served.")
+metrics.describe("datalex_request_duration_seconds", "histogram", "Time spent serving a request.")
+metrics.describe("datalex_stage_duration_seconds", "histogram", "Time spent in a stage of a request.")
+metrics.describe("datalex_sql_queries_total", "counter", "SQL queries run while serving requests.")
+
+
+class InstrumentationMiddleware:
+    # Async capable so that the async views are not pushed to a thread by an adapted middleware chain under ASGI.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        started_at = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        return self.record(request, response, timings, started_at)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        started_at = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        return self.record(request, response, timings, started_at)
+
+    def record(self, request, response, timings: RequestTimings, started_at: float):
+        if hasattr(request, "_render_started_at"):
+            timings.add("render", time.perf_counter() - request._render_started_at)
+        total = time.perf_counter() - started_at
+
+        match = request.resolver_match
+        endpoint = match.url_name if match and match.url_name else "unmatched"
+        # Not for a 404: every unknown id would add series that are never freed.
+        table_id = ""
+        if match and response.status_code != 404:
+            table_id = str(match.kwargs.get("table_id", match.kwargs.get("pk", "")))
+        labels: Labels = (("endpoint", endpoint), ("table_id", table_id))
+        metrics.inc(
+            "datalex_requests_total", labels + (("method", request.method), ("status", str(response.status_code)))
+        )
+        metrics.observe("datalex_request_duration_seconds", labels, total)
+        for stage, seconds in timings.stages.items():
+            metrics.observe("datalex_stage_duration_seconds", labels + (("stage", stage),), seconds)
+        metrics.inc("datalex_sql_queries_total", labels, timings.sql_queries)
+
+        if settings.DATALEX_SERVER_TIMING:
+            response["Server-Timing"] = get_server_timing(timings, total)
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered once the view has returned, right after this hook.
+        request._render_started_at = time.perf_counter()
+        return response
+
+
+def time_query(execute, sql, params, many, context):
+    timings = current_timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started_at = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.sql_queries += 1
+        timings.add("sql", time.perf_counter() - started_at)
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    # On every connection rather than the one of the request: async views query from sync_to_async threads,
+    # each with a connection of its own. The timings of the request follow them there through the context.
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+def get_server_timing(timings: RequestTimings, total: float) -> str:
+    entries = [f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in timings.stages.items()]
+    entries.append(f'sql_queries;desc="{timings.sql_queries}"')
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries)
+
+
+def metrics_view(request):
+    return HttpResponse(metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE)
@@ -25,6 +25,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "datalex.instrumentation.InstrumentationMiddleware",
+    "datalex.compression.CompressionMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -62,6 +64,12 @@ DATABASES = {
         "PASSWORD": os.environ["DB_PASSWORD"],
         "HOST": os.environ.get("DB_HOST", "localhost"),
         "PORT": os.environ.get("DB_PORT", 5432),
+        # Keep connections open between requests instead of reconnecting every time. Leave it at 0 under ASGI
+        # and point DB_HOST/DB_PORT at a transaction pooler (pgbouncer) instead, see README.
+        "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", 0)),
+        "CONN_HEALTH_CHECKS": True,
+        # Server side cursors do not survive transaction pooling.
+        "DISABLE_SERVER_SIDE_CURSORS": os.environ.get("DB_DISABLE_SERVER_SIDE_CURSORS") == "1",
         "OPTIONS": {
             "server_side_binding": False,
         },
@@ -72,6 +80,14 @@ DATABASES = {
     },
 }
 
+# Must be shared between worker processes (e.g. file based, Redis or Memcached) when running more than one worker.
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.environ.get("CACHE_LOCATION", ""),
+    },
+}
+
 AUTH_PASSWORD_VALIDATORS: List[str] = []
 
 
@@ -94,3 +110,49 @@ REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [],
     "DEFAULT_PERMISSION_CLASSES": ["rest_framework.permissions.AllowAny"],
 }
+
+DATALEX_BULK_BATCH_SIZE = int(os.environ.get("DATALEX_BULK_BATCH_SIZE", 1000))
+DATALEX_BULK_MAX_BATCH_SIZE = 10000
+
+DATALEX_TABLE_BULK_MAX_SIZE = 1000
+
+DATALEX_CURSOR_PAGE_SIZE = 100
+DATALEX_CURSOR_MAX_PAGE_SIZE = 10000
+
+DATALEX_AGGREGATE_MAX_GROUPS = 10000
+# Rows changed per statement (and transaction) by the row update and delete endpoints.
+DATALEX_ROW_CHANGE_CHUNK_SIZE = int(os.environ.get("DATALEX_ROW_CHANGE_CHUNK_SIZE", 10000))
+
+# Rows sent with "Prefer: respond-async" are queued and inserted in batches of up to DATALEX_INGEST_BATCH_SIZE rows,
+# at most DATALEX_INGEST_FLUSH_INTERVAL seconds after they were queued. Inserts are refused past
+# DATALEX_INGEST_QUEUE_SIZE queued rows per table. The ingest statuses are kept in DATALEX_INGEST_CACHE, which has to be
+# shared by the workers for any of them to answer.
+DATALEX_INGEST_BATCH_SIZE = int(os.environ.get("DATALEX_INGEST_BATCH_SIZE", 1000))
+DATALEX_INGEST_FLUSH_INTERVAL = float(os.environ.get("DATALEX_INGEST_FLUSH_INTERVAL", 0.05))
+DATALEX_INGEST_QUEUE_SIZE = int(os.environ.get("DATALEX_INGEST_QUEUE_SIZE", 10000))
+DATALEX_INGEST_CACHE = "default"
+DATALEX_INGEST_STATUS_TIMEOUT = 86400
+DATALEX_INGEST_IN_BACKGROUND = True
+
+# Text search configuration of the full-text search indexes and queries, e.g. "english" to stem English words.
+DATALEX_SEARCH_CONFIG = os.environ.get("DATALEX_SEARCH_CONFIG", "simple")
+
+DATALEX_EXPORT_CHUNK_SIZE = 2000
+# Rows per Arrow record batch (Parquet row group) of exports and Parquet imports.
+DATALEX_RECORD_BATCH_SIZE = 10000
+
+# Alias of the cache holding row listings (e.g. "default"), the listing cache is off when unset.
+DATALEX_ROW_LIST_CACHE = os.environ.get("DATALEX_ROW_LIST_CACHE")
+DATALEX_ROW_LIST_CACHE_TIMEOUT = 300
+
+DATALEX_SCHEMA_CACHE = "default"
+DATALEX_MODEL_CACHE_SIZE = int(os.environ.get("DATALEX_MODEL_CACHE_SIZE", 1000))
+
+DATALEX_ONLINE_MIGRATION_BATCH_SIZE = int(os.environ.get("DATALEX_ONLINE_MIGRATION_BATCH_SIZE", 10000))
+DATALEX_SCHEMA_JOBS_IN_BACKGROUND = True
+
+# Responses smaller than this are not compressed, see datalex.compression.
+DATALEX_COMPRESSION_MIN_SIZE = int(os.environ.get("DATALEX_COMPRESSION_MIN_SIZE", 8192))
+
+# Adds a Server-Timing header with the stage timings of each request, for debugging only.
+DATALEX_SERVER_TIMING = os.environ.get("DATALEX_SERVER_TIMING") == "1"
@@ -1,11 +1,11 @@
 from typing import List, Tuple
 from django.db import models
+from django.db import connection
 from django.test import TestCase
 from django.urls import reverse
 from rest_framework.test import APIClient
 
-from apps.schema_manager.models import DynamicTable
-from apps.schema_manager.repositores import get_dynamic_table_model
+from apps.schema_manager.repositores import dynamic_table_repo_factory
 
 
 class ApiTestCase(TestCase):
@@ -16,5 +16,11 @@ class ApiTestCase(TestCase):
 
 def dynamic_table_factory(name: str, fields: List[dict]) -> Tuple[int, models.Model]:
     resp = APIClient().post(reverse("table-create"), {"name": name, "fields": fields}, format="json")
-    dynamic_table = get_dynamic_table_model(resp.data["name"], resp.data["fields"])
-    return DynamicTable.objects.get(name=name).pk, dynamic_table
+    assert resp.status_code == 201, resp.data
+    table_id = resp.data["id"]
+    return table_id, dynamic_table_repo_factory().get_by_id(table_id)
+
+
+def get_table_index_names(model: models.Model) -> List[str]:
+    with connection.cursor() as cursor:
+        return list(connection.introspection.get_constraints(cursor, model._meta.db_table))
@@ -1,11 +1,27 @@
 from django.urls import path
 from apps.schema_manager import views as schema_views
-from apps.data_manager import views as data_views
+from apps.data_manager import async_views as data_async_views, views as data_views
+from datalex.instrumentation import metrics_view
 
 
 urlpatterns = [
+    path("api/async/table/<int:table_id>/rows", data_async_views.AsyncRowListView.as_view(), name="row-list-async"),
+    path("api/async/table/<int:table_id>/row", data_async_views.AsyncRowCreateView.as_view(), name="row-create-async"),
     path("api/table/<int:table_id>/rows", data_views.RowListView.as_view(), name="row-list"),
+    path("api/table/<int:table_id>/aggregate", data_views.RowAggregateView.as_view(), name="row-aggregate"),
+    path("api/table/<int:table_id>/changes", data_views.RowChangesView.as_view(), name="row-changes"),
+    path("api/table/<int:table_id>/rows/export", data_views.RowExportView.as_view(), name="row-export"),
+    path("api/table/<int:table_id>/rows:bulk", data_views.RowBulkCreateView.as_view(), name="row-bulk-create"),
     path("api/table/<int:table_id>/row", data_views.RowCreateView.as_view(), name="row-create"),
+    path("api/table/<int:table_id>/ingest/<str:ingest_id>", data_views.RowIngestView.as_view(), name="row-ingest"),
+    path(
+        "api/table/<int:table_id>/migrations/<int:pk>",
+        schema_views.SchemaMigrationJobView.as_view(),
+        name="table-migration",
+    ),
+    path("api/table/<int:pk>/partitions", schema_views.DynamicTablePartitionsView.as_view(), name="table-partitions"),
     path("api/table/<int:pk>", schema_views.DynamicTableUpdateView.as_view(), name="table-update"),
+    path("api/table:bulk", schema_views.DynamicTableBulkCreateView.as_view(), name="table-bulk-create"),
     path("api/table", schema_views.DynamicTableCreateView.as_view(), name="table-create"),
+    path("metrics", metrics_view, name="metrics"),
 ]